@@ -0,0 +1,297 @@
+"""
+QuadTree concurrente con escritura copy-on-write
+Los lectores consultan una instantánea inmutable sin bloqueos; los escritores
+copian el camino desde la raíz hasta la hoja modificada y publican la nueva
+raíz con una sola asignación (atómica en CPython).
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from quadtree import QuadTree, QuadTreeNode, Point, Rectangle, _same_point
+
+
+def _clone_node(node: QuadTreeNode) -> QuadTreeNode:
+    """Copia superficial de un nodo: lista de puntos propia, hijos compartidos"""
+    clone = QuadTreeNode(node.boundary, node.capacity, node.indexed_attributes)
+    clone.points = list(node.points)
+    clone.maxima = dict(node.maxima)
+    clone.divided = node.divided
+    clone.size = node.size
+    clone.sum_x = node.sum_x
+    clone.sum_y = node.sum_y
+    clone.categories = dict(node.categories)
+    clone.min_time = node.min_time
+    clone.max_time = node.max_time
+    clone.northwest = node.northwest
+    clone.northeast = node.northeast
+    clone.southwest = node.southwest
+    clone.southeast = node.southeast
+    return clone
+
+
+def _insert_copy(node: QuadTreeNode, point: Point) -> Optional[QuadTreeNode]:
+    """
+    Inserta el punto sin modificar node. Retorna la copia del nodo con el
+    punto insertado, o None si el punto no pertenece a su boundary.
+    """
+    if not node.boundary.contains(point):
+        return None
+
+    clone = _clone_node(node)
+    if clone.indexed_attributes:
+        clone._update_maxima(point)
+
+    clone._summarize(point, 1)
+
+    if not clone.divided and clone.keeps(point):
+        clone.points.append(point)
+        return clone
+
+    if not clone.divided:
+        # Los hijos nuevos aún no son visibles para ningún lector,
+        # así que se pueden llenar con la inserción normal
+        clone.push_down()
+        if not clone._insert_to_children(point):
+            clone.points.append(point)
+        return clone
+
+    for attr in ('northwest', 'northeast', 'southwest', 'southeast'):
+        new_child = _insert_copy(getattr(clone, attr), point)
+        if new_child is not None:
+            setattr(clone, attr, new_child)
+            return clone
+    # Ningún hijo lo acepta (por redondeo en los bordes): queda en este nodo
+    clone.points.append(point)
+    return clone
+
+
+def _remove_copy(node: QuadTreeNode, point: Point) -> Optional[QuadTreeNode]:
+    """
+    Elimina el punto sin modificar node. Retorna la copia del nodo sin el
+    punto, o None si el punto no estaba en este subárbol.
+    """
+    if not node.boundary.contains(point):
+        return None
+
+    for i, p in enumerate(node.points):
+        if _same_point(p, point):
+            clone = _clone_node(node)
+            del clone.points[i]
+            clone._summarize(p, -1)
+            return clone
+
+    if not node.divided:
+        return None
+
+    for attr in ('northwest', 'northeast', 'southwest', 'southeast'):
+        new_child = _remove_copy(getattr(node, attr), point)
+        if new_child is not None:
+            clone = _clone_node(node)
+            setattr(clone, attr, new_child)
+            clone._summarize(point, -1)
+            # La copia es privada: se puede colapsar en el lugar
+            clone._try_merge()
+            return clone
+    return None
+
+
+def _tighten_copy(node: QuadTreeNode, older_than: float) -> QuadTreeNode:
+    """
+    Como QuadTreeNode.tighten_time_bounds, pero sin modificar nodos ya
+    publicados: retorna node si sus cotas no cambian o una copia ajustada
+    """
+    if node.min_time is None or node.min_time >= older_than:
+        return node
+    low = high = None
+    for point in node.points:
+        ts = point.timestamp
+        if ts is not None:
+            if low is None or ts < low:
+                low = ts
+            if high is None or ts > high:
+                high = ts
+    children = ()
+    if node.divided:
+        children = tuple(_tighten_copy(child, older_than) for child in
+                         (node.northwest, node.northeast, node.southwest, node.southeast))
+        for child in children:
+            if child.min_time is not None and (low is None or child.min_time < low):
+                low = child.min_time
+            if child.max_time is not None and (high is None or child.max_time > high):
+                high = child.max_time
+    unchanged = all(new is old for new, old in zip(children, (
+        node.northwest, node.northeast, node.southwest, node.southeast)))
+    if unchanged and (low, high) == (node.min_time, node.max_time):
+        return node
+    clone = _clone_node(node)
+    if children:
+        clone.northwest, clone.northeast, clone.southwest, clone.southeast = children
+    clone.min_time, clone.max_time = low, high
+    return clone
+
+
+class QuadTreeSnapshot(QuadTree):
+    """Vista de solo lectura sobre una versión publicada del árbol"""
+
+    def __init__(self, root: QuadTreeNode, boundary: Rectangle, version: int,
+                 id_attribute: Optional[str] = None):
+        self.root = root
+        self.boundary = boundary
+        self.version = version
+        self.listeners = []
+        self.id_attribute = id_attribute
+        self._by_id: Optional[Dict[Any, Point]] = None
+
+    @property
+    def by_id(self) -> Dict[Any, Point]:
+        # Se arma a demanda desde la raíz de esta versión: copiar el índice
+        # vivo en cada instantánea costaría O(n) y podría no coincidir con ella
+        if self._by_id is None:
+            self.rebuild_id_index()
+        return self._by_id
+
+    @by_id.setter
+    def by_id(self, value: Dict[Any, Point]):
+        self._by_id = value
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Las instantáneas son de solo lectura")
+
+    # Toda operación que modifica el árbol (los nodos son compartidos con el
+    # árbol vivo)
+    insert = remove = move = expire = update_attributes = _read_only
+    upsert = sync = insert_many = _read_only
+
+
+class ConcurrentQuadTree(QuadTree):
+    """
+    QuadTree seguro para hilos: consultas sin bloqueo sobre la versión
+    publicada y escritores serializados que publican copias de camino.
+    """
+
+    def __init__(self, boundary: Rectangle, capacity: int = 4,
+                 indexed_attributes: Tuple[str, ...] = (),
+                 id_attribute: Optional[str] = None):
+        super().__init__(boundary, capacity, indexed_attributes, id_attribute)
+        self._write_lock = threading.Lock()
+        self.version = 0
+
+    def snapshot(self) -> QuadTreeSnapshot:
+        """Retorna una instantánea consistente para varias consultas seguidas"""
+        # Raíz y versión se publican juntas en una tupla
+        root, version = self._state
+        return QuadTreeSnapshot(root, self.boundary, version, self.id_attribute)
+
+    @property
+    def root(self) -> QuadTreeNode:
+        return self._state[0]
+
+    @root.setter
+    def root(self, node: QuadTreeNode):
+        # Usado por QuadTree.__init__ para la raíz inicial
+        self._state = (node, 0)
+
+    def _publish(self, root: QuadTreeNode):
+        """Publica una nueva raíz (llamar con el lock de escritura tomado)"""
+        self.version += 1
+        self._state = (root, self.version)
+
+    def insert(self, point: Point) -> bool:
+        """Inserta un punto publicando una nueva versión del árbol"""
+        with self._write_lock:
+            new_root = _insert_copy(self.root, point)
+            if new_root is None:
+                return False
+            self._publish(new_root)
+        if self.listeners:
+            self._notify('insert', point)
+        return True
+
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto publicando una nueva versión del árbol"""
+        with self._write_lock:
+            new_root = _remove_copy(self.root, point)
+            if new_root is None:
+                return False
+            self._publish(new_root)
+        if self.listeners:
+            self._notify('remove', point)
+        return True
+
+    def move(self, point: Point, new_x: float, new_y: float,
+             timestamp: Optional[float] = None) -> bool:
+        """
+        Mueve un punto en una sola versión. El Point original no se modifica
+        (puede seguir visible en instantáneas anteriores); en su lugar se
+        inserta un Point nuevo con los mismos atributos.
+        """
+        with self._write_lock:
+            root = _remove_copy(self.root, point)
+            if root is None:
+                return False
+            moved = Point(new_x, new_y, point.attributes,
+                          point.timestamp if timestamp is None else timestamp)
+            root = _insert_copy(root, moved)
+            if root is None:
+                return False
+            self._publish(root)
+        if self.listeners:
+            # Un solo evento, como QuadTree.move; el punto avisado es el nuevo
+            self._notify('move', moved, (point.x, point.y))
+        return True
+
+    def update_attributes(self, point: Point, attributes: Dict[str, Any]) -> Point:
+        """
+        Los puntos publicados no se modifican: siempre se reemplaza el punto.
+        Se avisa un solo evento 'update' con el punto nuevo.
+        """
+        replacement = Point(point.x, point.y, attributes, point.timestamp)
+        with self._write_lock:
+            root = _remove_copy(self.root, point)
+            if root is None:
+                return point
+            root = _insert_copy(root, replacement)
+            self._publish(root)
+            self._drop_old_id(point, attributes)
+        if self.listeners:
+            self._notify('update', replacement)
+        return replacement
+
+    def expire(self, older_than: float, max_points: Optional[int] = None) -> int:
+        """Elimina los puntos más antiguos que older_than publicando una sola versión"""
+        expired = self._expired_points(older_than, max_points)
+        removed = []
+        with self._write_lock:
+            root = self.root
+            for point in expired:
+                new_root = _remove_copy(root, point)
+                if new_root is not None:
+                    root = new_root
+                    removed.append(point)
+            # Las cotas se ajustan sobre copias antes de publicar: los nodos
+            # visibles para los lectores no cambian
+            root = _tighten_copy(root, older_than)
+            if root is not self.root:
+                self._publish(root)
+        if self.listeners:
+            for point in removed:
+                self._notify('remove', point)
+        return len(removed)
+
+    def insert_many(self, points: List[Point]) -> int:
+        """Inserta varios puntos y publica una sola versión al final"""
+        with self._write_lock:
+            root = self.root
+            inserted = 0
+            for point in points:
+                new_root = _insert_copy(root, point)
+                if new_root is not None:
+                    root = new_root
+                    inserted += 1
+            if inserted:
+                self._publish(root)
+        if self.listeners:
+            for point in points:
+                if self.root.boundary.contains(point):
+                    self._notify('insert', point)
+        return inserted
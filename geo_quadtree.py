@@ -0,0 +1,172 @@
+"""
+QuadTree geográfico: puntos en longitud/latitud (WGS84) y distancias de
+círculo máximo (haversine), en metros.
+
+Los puntos se guardan como Point(lon, lat) y los nodos son cajas lon/lat. Para
+podar se usa la distancia mínima exacta desde el punto de consulta a la caja:
+  - si la longitud del punto cae dentro de la caja, basta la diferencia de
+    latitud hasta la caja (la diferencia de latitud nunca supera la distancia
+    angular);
+  - si no, el punto más cercano está sobre uno de los dos meridianos borde
+    (sobre un paralelo la distancia crece con la diferencia de longitud) y a lo
+    largo de un meridiano la distancia es unimodal, así que alcanza con evaluar
+    el mínimo sin restricciones recortado al tramo y los dos extremos.
+Las diferencias de longitud se toman módulo 360, de modo que las búsquedas
+cruzan el antimeridiano sin tratamiento especial.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from quadtree import QuadTree, Point, Rectangle
+
+EARTH_RADIUS = 6371008.8  # Radio medio de la Tierra en metros
+
+WORLD = Rectangle(0, 0, 360, 180)
+
+
+def normalize_lon(lon: float) -> float:
+    """Lleva una longitud al intervalo [-180, 180]"""
+    if -180 <= lon <= 180:
+        return lon
+    return (lon + 180) % 360 - 180
+
+
+def _central_angle(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Ángulo central (radianes) entre dos posiciones en grados"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(h)))
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Distancia de círculo máximo en metros"""
+    return EARTH_RADIUS * _central_angle(lon1, lat1, lon2, lat2)
+
+
+def geo_distance(a: Point, b: Point) -> float:
+    """Distancia en metros entre dos Point(lon, lat)"""
+    return EARTH_RADIUS * _central_angle(a.x, a.y, b.x, b.y)
+
+
+def _lon_delta(lon: float, edge: float) -> float:
+    """Diferencia de longitud en grados, en [0, 180]"""
+    d = abs(lon - edge) % 360
+    return 360 - d if d > 180 else d
+
+
+def _meridian_distance(lon: float, lat: float, edge_lon: float,
+                       lat1: float, lat2: float) -> float:
+    """Ángulo mínimo desde (lon, lat) al tramo [lat1, lat2] del meridiano edge_lon"""
+    dlon = math.radians(_lon_delta(lon, edge_lon))
+    # Latitud del punto más cercano sobre el círculo máximo del meridiano
+    best = math.degrees(math.atan2(math.tan(math.radians(lat)), math.cos(dlon)))
+    candidates = (min(max(best, lat1), lat2), lat1, lat2)
+    return min(_central_angle(lon, lat, edge_lon, c) for c in candidates)
+
+
+def box_angle(rect: Rectangle, lon: float, lat: float) -> float:
+    """Ángulo central mínimo desde (lon, lat) a una caja lon/lat (cota inferior exacta)"""
+    lat1, lat2 = rect.min_y, rect.max_y
+    # Ante la duda (redondeo en el borde) se toma como dentro: la diferencia
+    # de latitud sigue siendo una cota inferior válida
+    if rect.width >= 360 or _lon_delta(lon, rect.x) <= rect.half_width + 1e-9:
+        # La longitud del punto está dentro de la caja
+        if lat1 <= lat <= lat2:
+            return 0.0
+        return math.radians(lat1 - lat if lat < lat1 else lat - lat2)
+    return min(_meridian_distance(lon, lat, rect.min_x, lat1, lat2),
+               _meridian_distance(lon, lat, rect.max_x, lat1, lat2))
+
+
+class GeoQuadTree(QuadTree):
+    """
+    QuadTree sobre longitud/latitud con vecino más cercano y radios en metros.
+    x es la longitud y y la latitud; el boundary por defecto es el mundo.
+    """
+
+    def __init__(self, boundary: Rectangle = WORLD, capacity: int = 4,
+                 indexed_attributes: Tuple[str, ...] = (),
+                 id_attribute: Optional[str] = None):
+        super().__init__(boundary, capacity, indexed_attributes, id_attribute)
+
+    @staticmethod
+    def _point_distance(a: Point, b: Point) -> float:
+        return geo_distance(a, b)
+
+    @staticmethod
+    def _box_distance(rect: Rectangle, point: Point) -> float:
+        return EARTH_RADIUS * box_angle(rect, point.x, point.y)
+
+    @staticmethod
+    def _normalized(point: Point) -> Point:
+        """El mismo punto si su longitud ya está en [-180, 180]; si no, una copia normalizada"""
+        lon = normalize_lon(point.x)
+        if lon == point.x:
+            return point
+        return Point(lon, point.y, point.attributes, point.timestamp)
+
+    def insert(self, point: Point) -> bool:
+        """
+        Inserta un Point(lon, lat). Una longitud fuera de [-180, 180] no se
+        modifica en el punto recibido: se inserta una copia normalizada
+        """
+        if not -90 <= point.y <= 90:
+            return False
+        return super().insert(self._normalized(point))
+
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto (con la longitud normalizada igual que en insert)"""
+        return super().remove(self._normalized(point))
+
+    def move(self, point: Point, new_x: float, new_y: float,
+             timestamp: Optional[float] = None) -> bool:
+        """Mueve un punto; la nueva longitud se normaliza igual que en insert"""
+        if not -90 <= new_y <= 90:
+            return False
+        return super().move(self._normalized(point), normalize_lon(new_x), new_y, timestamp)
+
+    def nearest_neighbor(self, query_point: Point, where: Dict[str, Any] = None,
+                         since: Optional[float] = None, until: Optional[float] = None) -> Optional[Point]:
+        """Vecino más cercano por distancia de círculo máximo"""
+        return next(self.iter_nearest(query_point, None, since, until, where), None)
+
+    def k_nearest(self, query_point: Point, k: int, where: Dict[str, Any] = None) -> List[Point]:
+        """Los k vecinos más cercanos, del más cercano al más lejano"""
+        found: List[Point] = []
+        for point in self.iter_nearest(query_point, where=where):
+            if len(found) >= k:
+                break
+            found.append(point)
+        return found
+
+    def query_radius(self, center: Point, radius: float,
+                     where: Dict[str, Any] = None) -> List[Point]:
+        """Puntos a no más de radius metros del centro, ordenados por distancia"""
+        found: List[Point] = []
+        for point in self.iter_nearest(center, where=where):
+            if geo_distance(center, point) > radius:
+                break
+            found.append(point)
+        return found
+
+    def query_box(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> List[Point]:
+        """
+        Puntos dentro de una caja lon/lat. Si min_lon > max_lon la caja cruza
+        el antimeridiano (por ejemplo, de 170 a -170) y se parte en dos.
+        """
+        min_lon, max_lon = normalize_lon(min_lon), normalize_lon(max_lon)
+        if min_lon <= max_lon:
+            spans = [(min_lon, max_lon)]
+        else:
+            spans = [(min_lon, 180.0), (-180.0, max_lon)]
+        found: List[Point] = []
+        for lo, hi in spans:
+            rect = Rectangle((lo + hi) / 2, (min_lat + max_lat) / 2, hi - lo, max_lat - min_lat)
+            found.extend(self.query_range(rect))
+        if len(spans) == 2:
+            # Un punto exactamente en ±180 podría aparecer en ambas mitades
+            found = list({id(p): p for p in found}.values())
+        return found
@@ -0,0 +1,203 @@
+"""
+Geocercas: consultas de rango o radio permanentes sobre un QuadTree
+Las regiones de las suscripciones se guardan en un LooseQuadTree. En cada
+insert, remove o move solo se evalúan las suscripciones cuya región puede
+contener el punto modificado, y se emiten eventos de entrada ('enter') y
+salida ('exit').
+
+Un remove o move puede recibir una copia igual al punto guardado (al
+reproducir un registro o desde otro proceso), y un árbol copy-on-write avisa
+un move o update con un Point nuevo. El monitor reconoce el punto seguido en
+la posición anterior: en un remove, el igual según _same_point; en un move o
+update, el que ya no está en el árbol.
+"""
+import asyncio
+from itertools import count
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from loose_quadtree import Extent, LooseQuadTree
+from quadtree import QuadTree, Point, Rectangle, _same_point
+
+# callback(evento, id_suscripción, punto)
+GeofenceCallback = Callable[[str, int, Point], None]
+
+
+class Subscription:
+    """Región vigilada (rectángulo o círculo) y sus puntos dentro"""
+
+    def __init__(self, sub_id: int, rect: Optional[Rectangle] = None,
+                 center: Optional[Point] = None, radius: float = 0.0,
+                 callback: Optional[GeofenceCallback] = None,
+                 queue: Optional[asyncio.Queue] = None):
+        self.id = sub_id
+        self.rect = rect
+        self.center = center
+        self.radius = radius
+        self.callback = callback
+        self.queue = queue
+        self.members: Set[Point] = set()
+
+        if rect is None:
+            # Bounding box del círculo
+            self.bounds = Rectangle(center.x, center.y, 2 * radius, 2 * radius)
+        else:
+            self.bounds = rect
+        self.extent = Extent(self.bounds, {'subscription': sub_id})
+
+    def contains(self, point: Point) -> bool:
+        """Verifica si el punto está dentro de la región"""
+        if self.rect is not None:
+            return self.rect.contains(point)
+        return self.center.distance_to(point) <= self.radius
+
+    def emit(self, event: str, point: Point):
+        """Entrega el evento por callback y/o cola asyncio"""
+        if self.callback is not None:
+            self.callback(event, self.id, point)
+        if self.queue is not None:
+            # La cola debe pertenecer al hilo que modifica el árbol
+            self.queue.put_nowait((event, self.id, point))
+
+
+class GeofenceMonitor:
+    """Evalúa suscripciones de forma incremental a partir de los cambios del árbol"""
+
+    def __init__(self, quadtree: QuadTree, max_depth: int = 10):
+        self.quadtree = quadtree
+        self.subscriptions: Dict[int, Subscription] = {}
+        self._ids = count(1)
+
+        # Índice espacial de las regiones
+        self._regions = LooseQuadTree(quadtree.boundary, max_depth)
+        self._outside: List[Subscription] = []  # regiones que el índice no acepta
+
+        # Suscripciones que contienen cada punto, y los puntos seguidos por
+        # posición para reconocer copias iguales
+        self._memberships: Dict[Point, Set[int]] = {}
+        self._positions: Dict[Tuple[float, float], List[Point]] = {}
+
+        quadtree.add_listener(self._on_change)
+
+    def subscribe_range(self, rect: Rectangle, callback: Optional[GeofenceCallback] = None,
+                        queue: Optional[asyncio.Queue] = None) -> int:
+        """Vigila un rectángulo. Retorna el id de la suscripción"""
+        sub = Subscription(next(self._ids), rect=rect, callback=callback, queue=queue)
+        self._register(sub, self.quadtree.query_range(rect))
+        return sub.id
+
+    def subscribe_radius(self, center: Point, radius: float,
+                         callback: Optional[GeofenceCallback] = None,
+                         queue: Optional[asyncio.Queue] = None) -> int:
+        """Vigila un círculo. Retorna el id de la suscripción"""
+        sub = Subscription(next(self._ids), center=center, radius=radius,
+                           callback=callback, queue=queue)
+        candidates = self.quadtree.query_range(sub.bounds)
+        self._register(sub, [p for p in candidates if sub.contains(p)])
+        return sub.id
+
+    def _register(self, sub: Subscription, initial: List[Point]):
+        self.subscriptions[sub.id] = sub
+        if not self._regions.insert(sub.extent):
+            self._outside.append(sub)
+
+        # Los puntos que ya estaban dentro no generan eventos
+        for point in initial:
+            sub.members.add(point)
+            self._add_membership(point, sub.id)
+
+    def unsubscribe(self, sub_id: int) -> bool:
+        """Elimina una suscripción"""
+        sub = self.subscriptions.pop(sub_id, None)
+        if sub is None:
+            return False
+        if not self._regions.remove(sub.extent):
+            self._outside.remove(sub)
+        for point in sub.members:
+            subs = self._memberships.get(point)
+            if subs is not None:
+                subs.discard(sub_id)
+                if not subs:
+                    self._drop_point(point, (point.x, point.y))
+        return True
+
+    def members(self, sub_id: int) -> List[Point]:
+        """Puntos actualmente dentro de la región"""
+        return list(self.subscriptions[sub_id].members)
+
+    def close(self):
+        """Deja de escuchar los cambios del árbol"""
+        self.quadtree.remove_listener(self._on_change)
+
+    def _candidates(self, point: Point) -> List[Subscription]:
+        """Suscripciones cuya región puede contener el punto"""
+        found = [self.subscriptions[e.attributes['subscription']]
+                 for e in self._regions.query_containing(point)]
+        found.extend(self._outside)
+        return [sub for sub in found if sub.contains(point)]
+
+    def _add_membership(self, point: Point, sub_id: int):
+        subs = self._memberships.get(point)
+        if subs is None:
+            subs = self._memberships[point] = set()
+            self._positions.setdefault((point.x, point.y), []).append(point)
+        subs.add(sub_id)
+
+    def _drop_point(self, point: Point, position: Tuple[float, float]) -> Set[int]:
+        """Deja de seguir un punto guardado en position; retorna sus suscripciones"""
+        subs = self._memberships.pop(point, None)
+        if subs is None:
+            return set()
+        tracked = self._positions.get(position, [])
+        for i, p in enumerate(tracked):
+            if p is point:
+                del tracked[i]
+                break
+        if not tracked:
+            self._positions.pop(position, None)
+        return subs
+
+    def _resolve(self, point: Point, position: Tuple[float, float], replaced: bool) -> Point:
+        """Punto seguido al que se refiere el evento (o point mismo)"""
+        if point in self._memberships:
+            return point
+        tracked_here = self._positions.get(position, ())
+        if not tracked_here:
+            return point
+        if not replaced:
+            for tracked in tracked_here:
+                if _same_point(tracked, point):
+                    return tracked
+            return point
+        # Tras un move o update el punto anterior ya no está en el árbol (sus
+        # coordenadas o atributos pueden no coincidir con los del nuevo)
+        probe = Rectangle(position[0], position[1], 0, 0)
+        stored = {id(p) for p in self.quadtree.query_range(probe)}
+        for tracked in tracked_here:
+            if id(tracked) not in stored:
+                return tracked
+        return point
+
+    def _on_change(self, event: str, point: Point, old_position: Optional[Tuple[float, float]]):
+        position = old_position if old_position is not None else (point.x, point.y)
+        if event == 'insert':
+            # Un insert nuevo no es el punto igual que ya estaba
+            tracked = point
+        else:
+            tracked = self._resolve(point, position, event != 'remove')
+        before = self._drop_point(tracked, position)
+        if event == 'remove':
+            after: Set[int] = set()
+        else:
+            after = {sub.id for sub in self._candidates(point)}
+
+        for sub_id in before:
+            self.subscriptions[sub_id].members.discard(tracked)
+        for sub_id in before - after:
+            self.subscriptions[sub_id].emit('exit', point)
+        for sub_id in after:
+            self.subscriptions[sub_id].members.add(point)
+        for sub_id in after - before:
+            self.subscriptions[sub_id].emit('enter', point)
+
+        for sub_id in after:
+            self._add_membership(point, sub_id)
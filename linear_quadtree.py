@@ -0,0 +1,188 @@
+"""
+QuadTree lineal basado en claves de Morton (orden Z)
+Cada punto se codifica como una clave de Morton y las claves se guardan
+ordenadas en un arreglo de NumPy. Las consultas de rango se descomponen en
+intervalos de claves que se resuelven con searchsorted.
+"""
+from typing import List, Tuple, Any
+
+import numpy as np
+
+from quadtree import Point, Rectangle
+
+
+def _part1by1(v: np.ndarray) -> np.ndarray:
+    """Separa los bits de v intercalando un cero entre cada uno"""
+    v = v.astype(np.uint64) & np.uint64(0x00000000FFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def morton_encode(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+    """Calcula las claves de Morton de las celdas (ix, iy)"""
+    return _part1by1(ix) | (_part1by1(iy) << np.uint64(1))
+
+
+class LinearQuadTree:
+    """QuadTree lineal: claves de Morton ordenadas en lugar de nodos enlazados"""
+
+    def __init__(self, boundary: Rectangle, bits: int = 16, max_intervals: int = 64):
+        if not 1 <= bits <= 32:
+            raise ValueError("bits debe estar entre 1 y 32")
+        self.boundary = boundary
+        self.bits = bits
+        self.max_intervals = max_intervals
+        self.cells = 1 << bits
+
+        self.min_x = boundary.x - boundary.half_width
+        self.min_y = boundary.y - boundary.half_height
+
+        # Arreglos paralelos ordenados por clave
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.xs = np.empty(0, dtype=np.float64)
+        self.ys = np.empty(0, dtype=np.float64)
+        self.points: List[Point] = []
+
+    def _cell_x(self, x):
+        """Convierte coordenadas x a índices de celda"""
+        scale = self.cells / self.boundary.width if self.boundary.width else 0
+        ix = np.floor((np.asarray(x, dtype=np.float64) - self.min_x) * scale)
+        return np.clip(ix, 0, self.cells - 1).astype(np.uint64)
+
+    def _cell_y(self, y):
+        """Convierte coordenadas y a índices de celda"""
+        scale = self.cells / self.boundary.height if self.boundary.height else 0
+        iy = np.floor((np.asarray(y, dtype=np.float64) - self.min_y) * scale)
+        return np.clip(iy, 0, self.cells - 1).astype(np.uint64)
+
+    def _keys_for(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Calcula las claves de Morton de un conjunto de coordenadas"""
+        return morton_encode(self._cell_x(xs), self._cell_y(ys))
+
+    def bulk_load(self, points: List[Point]) -> int:
+        """Carga masiva: descarta puntos fuera del boundary y ordena una sola vez"""
+        inside = [p for p in points if self.boundary.contains(p)]
+        if not inside:
+            return 0
+
+        xs = np.fromiter((p.x for p in inside), dtype=np.float64, count=len(inside))
+        ys = np.fromiter((p.y for p in inside), dtype=np.float64, count=len(inside))
+
+        xs = np.concatenate([self.xs, xs])
+        ys = np.concatenate([self.ys, ys])
+        keys = np.concatenate([self.keys, self._keys_for(xs[len(self.xs):], ys[len(self.ys):])])
+        all_points = self.points + inside
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.xs = xs[order]
+        self.ys = ys[order]
+        self.points = [all_points[i] for i in order]
+        return len(inside)
+
+    def insert(self, point: Point) -> bool:
+        """Inserta un punto manteniendo el orden (O(n); preferir bulk_load)"""
+        if not self.boundary.contains(point):
+            return False
+
+        key = self._keys_for(np.array([point.x]), np.array([point.y]))[0]
+        idx = int(np.searchsorted(self.keys, key, side='right'))
+        self.keys = np.insert(self.keys, idx, key)
+        self.xs = np.insert(self.xs, idx, point.x)
+        self.ys = np.insert(self.ys, idx, point.y)
+        self.points.insert(idx, point)
+        return True
+
+    def _key_intervals(self, ix0: int, ix1: int, iy0: int, iy1: int) -> List[Tuple[int, int]]:
+        """
+        Descompone el rango de celdas [ix0, ix1] x [iy0, iy1] en intervalos de
+        claves. Los bloques parcialmente cubiertos se refinan nivel a nivel
+        mientras no se supere max_intervals; el resto se acepta completo y se
+        depura luego con el filtro exacto.
+        """
+        full: List[Tuple[int, int]] = []
+        # Bloques parciales: (celda x inicial, celda y inicial, tamaño, clave base)
+        partial = [(0, 0, self.cells, 0)]
+
+        while partial:
+            size = partial[0][2]
+            if size == 1 or len(full) + 4 * len(partial) > self.max_intervals:
+                for _, _, s, base in partial:
+                    full.append((base, base + s * s - 1))
+                break
+
+            half = size // 2
+            next_partial = []
+            for bx, by, _, base in partial:
+                # Orden Z: (0,0), (1,0), (0,1), (1,1)
+                for q, (dx, dy) in enumerate(((0, 0), (1, 0), (0, 1), (1, 1))):
+                    cx0 = bx + dx * half
+                    cy0 = by + dy * half
+                    cx1 = cx0 + half - 1
+                    cy1 = cy0 + half - 1
+                    if cx0 > ix1 or cx1 < ix0 or cy0 > iy1 or cy1 < iy0:
+                        continue
+                    child_base = base + q * half * half
+                    if ix0 <= cx0 and cx1 <= ix1 and iy0 <= cy0 and cy1 <= iy1:
+                        full.append((child_base, child_base + half * half - 1))
+                    else:
+                        next_partial.append((cx0, cy0, half, child_base))
+            partial = next_partial
+
+        # Unir intervalos contiguos
+        full.sort()
+        merged: List[Tuple[int, int]] = []
+        for lo, hi in full:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+            else:
+                merged.append((lo, hi))
+        return merged
+
+    def query_range(self, range_rect: Rectangle) -> List[Point]:
+        """Consulta de rango rectangular mediante intervalos de claves"""
+        if len(self.keys) == 0 or not self.boundary.intersects(range_rect):
+            return []
+
+        left = range_rect.x - range_rect.half_width
+        right = range_rect.x + range_rect.half_width
+        top = range_rect.y - range_rect.half_height
+        bottom = range_rect.y + range_rect.half_height
+
+        ix0, ix1 = (int(v) for v in self._cell_x([left, right]))
+        iy0, iy1 = (int(v) for v in self._cell_y([top, bottom]))
+
+        intervals = self._key_intervals(ix0, ix1, iy0, iy1)
+        lows = np.array([lo for lo, _ in intervals], dtype=np.uint64)
+        highs = np.array([hi for _, hi in intervals], dtype=np.uint64)
+        starts = np.searchsorted(self.keys, lows, side='left')
+        ends = np.searchsorted(self.keys, highs, side='right')
+
+        slices = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return []
+        idx = np.concatenate(slices)
+
+        # Filtro exacto (las celdas del borde pueden sobresalir del rango)
+        xs = self.xs[idx]
+        ys = self.ys[idx]
+        mask = (xs >= left) & (xs <= right) & (ys >= top) & (ys <= bottom)
+        return [self.points[i] for i in idx[mask]]
+
+    def filter_by_attribute(self, attribute_name: str, attribute_value: Any) -> List[Point]:
+        """Filtra puntos por un atributo específico"""
+        return [p for p in self.points
+                if attribute_name in p.attributes
+                and p.attributes[attribute_name] == attribute_value]
+
+    def count_points(self) -> int:
+        """Cuenta el total de puntos"""
+        return len(self.points)
+
+    def get_all_points(self) -> List[Point]:
+        """Obtiene todos los puntos en orden Z"""
+        return list(self.points)
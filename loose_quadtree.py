@@ -0,0 +1,208 @@
+"""
+QuadTree "suelto" (loose quadtree) para objetos con extensión: rectángulos
+como huellas de edificios o zonas de reparto.
+
+Cada nodo tiene su cuadrante de siempre (boundary) y una caja suelta (loose):
+el mismo centro con los lados multiplicados por looseness (2 por defecto). Un
+objeto se guarda en el nodo más profundo cuya caja suelta lo contiene por
+completo, bajando siempre hacia el cuadrante que contiene su centro. Así cada
+objeto está en un único nodo (no se duplica al cruzar bordes) y, con
+looseness=2, un objeto de lado s baja hasta nodos de lado >= s.
+
+Las consultas podan por la caja suelta: un nodo cuya caja no toca la región
+consultada no puede tener objetos que la toquen. Los bordes son inclusivos,
+igual que en Rectangle.intersects: dos rectángulos que se tocan se intersectan.
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+from quadtree import Point, Rectangle
+
+
+class Extent:
+    """Objeto con extensión: un rectángulo y sus atributos"""
+    __slots__ = ('rect', 'attributes')
+
+    def __init__(self, rect: Rectangle, attributes: Dict[str, Any] = None):
+        self.rect = rect
+        self.attributes = attributes or {}
+
+    def __repr__(self):
+        r = self.rect
+        return f"Extent(({r.min_x}, {r.min_y})-({r.max_x}, {r.max_y}), {self.attributes})"
+
+
+def _same_extent(a: Extent, b: Extent) -> bool:
+    """Mismo objeto, o mismos bordes y atributos"""
+    if a is b:
+        return True
+    ra, rb = a.rect, b.rect
+    return (ra.min_x == rb.min_x and ra.max_x == rb.max_x and
+            ra.min_y == rb.min_y and ra.max_y == rb.max_y and
+            a.attributes == b.attributes)
+
+
+class LooseNode:
+    """Nodo del QuadTree suelto"""
+    __slots__ = ('boundary', 'loose', 'depth', 'extents', 'children', 'size')
+
+    def __init__(self, boundary: Rectangle, looseness: float, depth: int):
+        self.boundary = boundary
+        self.loose = Rectangle(boundary.x, boundary.y,
+                               boundary.width * looseness, boundary.height * looseness)
+        self.depth = depth
+        self.extents: List[Extent] = []
+        # Hijos NW, NE, SW, SE (se crean al primer objeto que baja)
+        self.children: Optional[List['LooseNode']] = None
+        self.size = 0  # Objetos en todo el subárbol
+
+    def child_index(self, x: float, y: float) -> int:
+        """Índice del cuadrante (NW, NE, SW, SE) que contiene (x, y)"""
+        return (x >= self.boundary.x) + 2 * (y >= self.boundary.y)
+
+    def subdivide(self, looseness: float):
+        """Crea los cuatro hijos"""
+        b = self.boundary
+        w = b.half_width
+        h = b.half_height
+        self.children = [
+            LooseNode(Rectangle(b.x - w/2, b.y - h/2, w, h), looseness, self.depth + 1),
+            LooseNode(Rectangle(b.x + w/2, b.y - h/2, w, h), looseness, self.depth + 1),
+            LooseNode(Rectangle(b.x - w/2, b.y + h/2, w, h), looseness, self.depth + 1),
+            LooseNode(Rectangle(b.x + w/2, b.y + h/2, w, h), looseness, self.depth + 1),
+        ]
+
+
+class LooseQuadTree:
+    """Índice de rectángulos con consultas de intersección, contención y distancia"""
+
+    def __init__(self, boundary: Rectangle, max_depth: int = 10, looseness: float = 2.0):
+        if looseness < 1:
+            raise ValueError("looseness debe ser al menos 1")
+        self.boundary = boundary
+        self.max_depth = max_depth
+        self.looseness = looseness
+        self.root = LooseNode(boundary, looseness, 0)
+
+    # ---- Modificación ----
+
+    def _fits_child(self, node: LooseNode, rect: Rectangle) -> bool:
+        """Verifica si rect cabe en la caja suelta del hijo que contiene su centro"""
+        b = node.boundary
+        cx = b.x + (b.half_width / 2 if rect.x >= b.x else -b.half_width / 2)
+        cy = b.y + (b.half_height / 2 if rect.y >= b.y else -b.half_height / 2)
+        lw = b.half_width * self.looseness / 2
+        lh = b.half_height * self.looseness / 2
+        return (cx - lw <= rect.min_x and rect.max_x <= cx + lw and
+                cy - lh <= rect.min_y and rect.max_y <= cy + lh)
+
+    def _path(self, rect: Rectangle, create: bool) -> List[LooseNode]:
+        """Nodos desde la raíz hasta el que corresponde a rect"""
+        node = self.root
+        path = [node]
+        while node.depth < self.max_depth and self._fits_child(node, rect):
+            if node.children is None:
+                if not create:
+                    break
+                node.subdivide(self.looseness)
+            node = node.children[node.child_index(rect.x, rect.y)]
+            path.append(node)
+        return path
+
+    def insert(self, extent: Extent) -> bool:
+        """Inserta un objeto; se rechaza si su centro queda fuera del boundary"""
+        rect = extent.rect
+        if not self.boundary.contains(Point(rect.x, rect.y)) or not self.root.loose.contains_rect(rect):
+            return False
+        path = self._path(rect, create=True)
+        for node in path:
+            node.size += 1
+        path[-1].extents.append(extent)
+        return True
+
+    def remove(self, extent: Extent) -> bool:
+        """Elimina un objeto (por identidad, o por bordes y atributos)"""
+        rect = extent.rect
+        if not self.boundary.contains(Point(rect.x, rect.y)):
+            return False
+        path = self._path(rect, create=False)
+        extents = path[-1].extents
+        for i, e in enumerate(extents):
+            if _same_extent(e, extent):
+                del extents[i]
+                break
+        else:
+            return False
+
+        for node in path:
+            node.size -= 1
+        # Liberar hijos que quedaron vacíos
+        for node in reversed(path):
+            if node.children is not None and node.size == len(node.extents):
+                node.children = None
+        return True
+
+    # ---- Consultas ----
+
+    def _collect(self, node: LooseNode, found: List[Extent]):
+        """Agrega todos los objetos del subárbol"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            found.extend(node.extents)
+            if node.children is not None:
+                stack.extend(c for c in node.children if c.size)
+
+    def _search(self, visit: Callable[[Rectangle], bool], accept: Callable[[Rectangle], bool],
+                take_all: Optional[Callable[[Rectangle], bool]] = None) -> List[Extent]:
+        """
+        Recorre los nodos cuya caja suelta cumple visit y devuelve los objetos
+        que cumplen accept. Si take_all(caja suelta) se cumple, todo el
+        subárbol es resultado sin revisar cada objeto.
+        """
+        found: List[Extent] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.size == 0 or not visit(node.loose):
+                continue
+            if take_all is not None and take_all(node.loose):
+                self._collect(node, found)
+                continue
+            found.extend(e for e in node.extents if accept(e.rect))
+            if node.children is not None:
+                stack.extend(node.children)
+        return found
+
+    def query_intersects(self, rect: Rectangle) -> List[Extent]:
+        """Objetos que intersectan el rectángulo"""
+        return self._search(rect.intersects, rect.intersects, rect.contains_rect)
+
+    def query_within(self, rect: Rectangle) -> List[Extent]:
+        """Objetos completamente dentro del rectángulo"""
+        return self._search(rect.intersects, rect.contains_rect, rect.contains_rect)
+
+    def query_containing(self, target) -> List[Extent]:
+        """Objetos que contienen por completo un Point o un Rectangle"""
+        if isinstance(target, Point):
+            target = Rectangle(target.x, target.y, 0, 0)
+        return self._search(lambda loose: loose.contains_rect(target),
+                            lambda r: r.contains_rect(target))
+
+    def query_radius(self, center: Point, radius: float) -> List[Extent]:
+        """Objetos a distancia <= radius del centro (0 si el centro está dentro)"""
+        return self._search(lambda loose: loose.distance_to_point(center) <= radius,
+                            lambda r: r.distance_to_point(center) <= radius)
+
+    def overlapping(self, extent: Extent) -> List[Extent]:
+        """Otros objetos que se superponen con el dado"""
+        return [e for e in self.query_intersects(extent.rect) if e is not extent]
+
+    def count_extents(self) -> int:
+        """Total de objetos"""
+        return self.root.size
+
+    def get_all_extents(self) -> List[Extent]:
+        """Todos los objetos"""
+        found: List[Extent] = []
+        self._collect(self.root, found)
+        return found
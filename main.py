@@ -4,6 +4,7 @@ Script principal para ejecutar diferentes modos del QuadTree
 import argparse
 import json
 from quadtree import QuadTree, Point, Rectangle
+from profiling import Profiler, stage
 
 
 def load_data_from_json(filename):
@@ -71,43 +72,54 @@ def demo_basic_operations():
     print("\n" + "=" * 60)
 
 
-def demo_with_file(filename):
-    """Demostración usando datos de un archivo"""
+def demo_with_file(filename, processes=None):
+    """Demostración usando datos de un archivo (con processes, construcción en paralelo)"""
     print("=" * 60)
     print(f"DEMOSTRACIÓN: Cargando datos desde {filename}")
     print("=" * 60)
     
     # Cargar datos
-    data = load_data_from_json(filename)
+    with stage('carga_json'):
+        data = load_data_from_json(filename)
     
-    # Crear QuadTree
     boundary = Rectangle(500, 500, 1000, 1000)
-    qt = QuadTree(boundary, capacity=4)
     
     # Insertar puntos
     print(f"\nInsertando {len(data)} puntos...")
-    for item in data:
-        point = Point(
-            item['x'],
-            item['y'],
-            {k: v for k, v in item.items() if k not in ['x', 'y']}
-        )
-        qt.insert(point)
+    with stage('creacion_puntos'):
+        points = [
+            Point(
+                item['x'],
+                item['y'],
+                {k: v for k, v in item.items() if k not in ['x', 'y']}
+            )
+            for item in data
+        ]
+    with stage('construccion_arbol'):
+        if processes is None:
+            qt = QuadTree(boundary, capacity=4)
+            for point in points:
+                qt.insert(point)
+        else:
+            from parallel_build import build_parallel
+            qt = build_parallel(points, boundary, capacity=4, processes=processes)
     
     print(f"✓ {qt.count_points()} puntos insertados exitosamente")
     
     # Estadísticas por categoría
     if 'category' in data[0]:
         print("\nEstadísticas por categoría:")
-        categories = set(item['category'] for item in data)
-        for category in sorted(categories):
-            count = qt.count_by_attribute('category', category)
+        with stage('conteo_categorias'):
+            categories = set(item['category'] for item in data)
+            counts = {c: qt.count_by_attribute('category', c) for c in sorted(categories)}
+        for category, count in counts.items():
             print(f"   {category}: {count}")
     
     # Ejemplo de consulta de rango
     print("\nEjemplo de consulta de rango (centro de la ciudad):")
     query_rect = Rectangle(500, 500, 300, 300)
-    results = qt.query_range(query_rect)
+    with stage('consulta_rango'):
+        results = qt.query_range(query_rect)
     print(f"   Puntos encontrados en el centro: {len(results)}")
     
     # Mostrar algunos resultados
@@ -200,6 +212,42 @@ def interactive_mode():
             print(f"Error: {e}")
 
 
+def serve_mode(filename=None, host='127.0.0.1', port=8765, unix_path=None, ttl=None):
+    """Modo servidor: un índice compartido por varios clientes"""
+    import asyncio
+    from server import QuadTreeServer, build_tree_from_records
+    
+    with stage('carga_json'):
+        data = load_data_from_json(filename) if filename else []
+    with stage('construccion_arbol'):
+        qt = build_tree_from_records(data)
+    print(f"Índice construido con {qt.count_points()} puntos")
+    
+    address = unix_path if unix_path else f"{host}:{port}"
+    print(f"Servidor escuchando en {address} (Ctrl+C para salir)")
+    
+    try:
+        asyncio.run(QuadTreeServer(qt, ttl=ttl).serve_forever(host, port, unix_path))
+    except KeyboardInterrupt:
+        print("\nServidor detenido")
+
+
+def export_tiles_mode(filename, directory, max_zoom=12, processes=None):
+    """Exporta la pirámide de teselas de los datos a un directorio"""
+    from server import build_tree_from_records
+    from tile_export import export_tiles
+    
+    with stage('carga_json'):
+        data = load_data_from_json(filename) if filename else []
+    with stage('construccion_arbol'):
+        qt = build_tree_from_records(data)
+    print(f"Exportando teselas de zoom 0 a {max_zoom} en {directory}...")
+    with stage('exportacion_teselas'):
+        stats = export_tiles(qt, directory, max_zoom=max_zoom, processes=processes)
+    print(f"{stats['tiles']} teselas: {stats['written']} escritas, "
+          f"{stats['unchanged']} sin cambios, {stats['removed']} borradas")
+
+
 def main():
     """Función principal"""
     parser = argparse.ArgumentParser(
@@ -211,6 +259,11 @@ Ejemplos de uso:
   python main.py --file input_data/city_locations.json
   python main.py --interactive       # Modo interactivo
   python main.py --gui              # Interfaz gráfica (ejecuta visualization.py)
+  python main.py --gui --file input_data/city_locations.json
+  python main.py --serve --file input_data/city_locations.json --port 8765
+  python main.py --file input_data/city_locations.json --profile
+  python main.py --file input_data/city_locations.json --processes 8
+  python main.py --file input_data/city_locations.json --export-tiles output_data/tiles
         """
     )
     
@@ -222,18 +275,60 @@ Ejemplos de uso:
                        help='Modo interactivo de consola')
     parser.add_argument('--gui', action='store_true',
                        help='Iniciar interfaz gráfica')
+    parser.add_argument('--serve', action='store_true',
+                       help='Iniciar servidor de consultas (usa --file como datos iniciales)')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                       help='Host del servidor TCP')
+    parser.add_argument('--port', type=int, default=8765,
+                       help='Puerto del servidor TCP')
+    parser.add_argument('--socket', type=str,
+                       help='Ruta de socket Unix (en lugar de TCP)')
+    parser.add_argument('--ttl', type=float,
+                       help='Segundos de vida de los puntos insertados en el servidor')
+    parser.add_argument('--export-tiles', type=str, metavar='DIR',
+                       help='Exportar la pirámide de teselas de --file al directorio')
+    parser.add_argument('--max-zoom', type=int, default=12,
+                       help='Zoom máximo de la exportación de teselas')
+    parser.add_argument('--processes', type=int,
+                       help='Procesos para construir el árbol con --file o exportar teselas (0: sin procesos extra)')
+    parser.add_argument('--profile', action='store_true',
+                       help='Perfilar la ejecución (tiempos, memoria y llamadas por etapa)')
+    parser.add_argument('--profile-output', type=str, default='output_data/perfil',
+                       help='Prefijo de los reportes de perfil (.json y .folded)')
+    parser.add_argument('--profile-allocations', action='store_true',
+                       help='Con --profile, reportar los sitios de asignación de cada etapa (más lento)')
     
     args = parser.parse_args()
     
+    profiler = Profiler(stage_allocation_sites=args.profile_allocations) if args.profile else None
+    if profiler:
+        profiler.start()
+    
+    try:
+        run_mode(parser, args)
+    finally:
+        if profiler:
+            profiler.stop()
+            profiler.print_summary()
+            for path in profiler.write_report(args.profile_output):
+                print(f"Reporte de perfil: {path}")
+
+
+def run_mode(parser, args):
+    """Ejecuta el modo elegido en la línea de comandos"""
     if args.gui:
         print("Iniciando interfaz gráfica...")
         from visualization import QuadTreeVisualizer
-        visualizer = QuadTreeVisualizer()
+        visualizer = QuadTreeVisualizer(data_file=args.file)
         visualizer.run()
+    elif args.serve:
+        serve_mode(args.file, args.host, args.port, args.socket, args.ttl)
+    elif args.export_tiles:
+        export_tiles_mode(args.file, args.export_tiles, args.max_zoom, args.processes)
     elif args.demo:
         demo_basic_operations()
     elif args.file:
-        demo_with_file(args.file)
+        demo_with_file(args.file, args.processes)
     elif args.interactive:
         interactive_mode()
     else:
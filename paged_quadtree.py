@@ -0,0 +1,323 @@
+"""
+QuadTree paginado en disco con caché LRU de páginas
+El árbol se guarda en un archivo de páginas de tamaño fijo. Cada página
+contiene un fragmento del árbol (nodos anidados en JSON); los subárboles que no
+caben se guardan en páginas propias y se referencian por número. Durante las
+consultas las páginas se cargan bajo demanda y se mantienen en una caché LRU
+acotada, así que la memoria residente no depende del tamaño del conjunto.
+
+La construcción también es externa: los registros se reparten por cuadrantes
+en archivos temporales hasta que cada parte cabe en memoria.
+
+Formato de nodo:  {'b': [x, y, w, h], 'n': cantidad, 'p': [[x, y, atributos], ...]}
+                  {'b': [...], 'n': cantidad, 'c': [hijo NW, NE, SW, SE]}
+Referencia:       {'b': [...], 'n': cantidad, 'r': número de página}
+Un nodo con 'c' también puede tener 'p' con los puntos que ningún hijo
+contiene (solo por redondeo en los bordes), igual que QuadTreeNode.
+"""
+import heapq
+import json
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from quadtree import Point, Rectangle, can_split
+
+HEADER = struct.Struct('>I')
+DEFAULT_PAGE_SIZE = 64 * 1024
+
+
+def _encode(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _rect(b: List[float]) -> Rectangle:
+    return Rectangle(b[0], b[1], b[2], b[3])
+
+
+def _quadrants(b: List[float]) -> List[List[float]]:
+    """Boundaries de los hijos con la misma geometría que QuadTreeNode.subdivide"""
+    x, y, w, h = b[0], b[1], b[2] / 2, b[3] / 2
+    return [[x - w/2, y - h/2, w, h], [x + w/2, y - h/2, w, h],
+            [x - w/2, y + h/2, w, h], [x + w/2, y + h/2, w, h]]
+
+
+def _quadrant_of(quadrants: List[Rectangle], record: list) -> Optional[int]:
+    """Primer cuadrante que contiene el registro (mismo orden que la inserción)"""
+    probe = Point(record[0], record[1])
+    for i, rect in enumerate(quadrants):
+        if rect.contains(probe):
+            return i
+    return None
+
+
+class _PageWriter:
+    """Escribe páginas de tamaño fijo y empaqueta subárboles en ellas"""
+
+    def __init__(self, f, page_size: int):
+        self.f = f
+        self.page_size = page_size
+        self.next_page = 1  # la página 0 es la cabecera
+
+    def write_page(self, data: Dict[str, Any]) -> int:
+        payload = _encode(data)
+        if HEADER.size + len(payload) > self.page_size:
+            raise ValueError(
+                f"Un nodo ocupa {len(payload)} bytes y no cabe en una página de "
+                f"{self.page_size}; aumente page_size o reduzca leaf_capacity")
+        page_id = self.next_page
+        self.next_page += 1
+        self.f.seek(page_id * self.page_size)
+        self.f.write(HEADER.pack(len(payload)) + payload)
+        return page_id
+
+    def pack(self, node: Dict[str, Any], children: List[Tuple[Dict[str, Any], int]]) -> Tuple[Dict[str, Any], int]:
+        """
+        Arma un nodo interno con sus hijos inline. Mientras no quepa en una
+        página, el hijo inline más grande se mueve a su propia página.
+        Retorna (nodo, tamaño serializado).
+        """
+        children = list(children)
+        limit = self.page_size - HEADER.size
+        overhead = len(_encode(dict(node, c=[]))) + 3
+        while overhead + sum(size for _, size in children) > limit:
+            i = max(range(len(children)), key=lambda j: children[j][1])
+            child, _ = children[i]
+            ref = {'b': child['b'], 'n': child['n'], 'r': self.write_page(child)}
+            children[i] = (ref, len(_encode(ref)))
+        node['c'] = [child for child, _ in children]
+        return node, overhead + sum(size for _, size in children)
+
+
+def _build_in_memory(records: List[list], bounds: List[float], leaf_capacity: int,
+                     writer: _PageWriter) -> Tuple[Dict[str, Any], int]:
+    """Construye un subárbol a partir de registros en memoria"""
+    first = records[0] if records else None
+    if (len(records) <= leaf_capacity or not can_split(_rect(bounds)) or
+            all(r[0] == first[0] and r[1] == first[1] for r in records)):
+        # Con puntos duplicados dividir no los separaría
+        node = {'b': bounds, 'n': len(records), 'p': records}
+        return node, len(_encode(node))
+
+    quadrants = _quadrants(bounds)
+    rects = [_rect(q) for q in quadrants]
+    parts: List[List[list]] = [[], [], [], []]
+    kept: List[list] = []
+    for record in records:
+        i = _quadrant_of(rects, record)
+        if i is None:
+            kept.append(record)
+        else:
+            parts[i].append(record)
+
+    children = [_build_in_memory(part, q, leaf_capacity, writer)
+                for part, q in zip(parts, quadrants)]
+    return writer.pack(_inner_node(bounds, children, kept), children)
+
+
+def _inner_node(bounds: List[float], children: List[Tuple[Dict[str, Any], int]],
+                kept: List[list]) -> Dict[str, Any]:
+    """Nodo interno, con los puntos que ningún hijo contiene si los hay"""
+    node = {'b': bounds, 'n': len(kept) + sum(c['n'] for c, _ in children)}
+    if kept:
+        node['p'] = kept
+    return node
+
+
+def _build_external(path: str, n: int, bounds: List[float], leaf_capacity: int,
+                    memory_records: int, writer: _PageWriter, tmp_dir: str) -> Tuple[Dict[str, Any], int]:
+    """Construye un subárbol desde un archivo temporal de registros (uno por línea)"""
+    if n <= memory_records or not can_split(_rect(bounds)):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        os.remove(path)
+        return _build_in_memory(records, bounds, leaf_capacity, writer)
+
+    quadrants = _quadrants(bounds)
+    rects = [_rect(q) for q in quadrants]
+    part_paths = []
+    part_files = []
+    for _ in range(4):
+        fd, part_path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+        part_paths.append(part_path)
+        part_files.append(os.fdopen(fd, 'w', encoding='utf-8'))
+    counts = [0, 0, 0, 0]
+    kept: List[list] = []
+    first = None
+    duplicates = True
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if first is None:
+                first = record
+            elif record[0] != first[0] or record[1] != first[1]:
+                duplicates = False
+            i = _quadrant_of(rects, record)
+            if i is None:
+                kept.append(record)
+            else:
+                part_files[i].write(line)
+                counts[i] += 1
+    for part_file in part_files:
+        part_file.close()
+    os.remove(path)
+
+    if duplicates:
+        # Todos en la misma posición: una sola hoja (están todos en una parte)
+        for part_path, c in zip(part_paths, counts):
+            if c:
+                with open(part_path, 'r', encoding='utf-8') as f:
+                    kept.extend(json.loads(line) for line in f)
+            os.remove(part_path)
+        node = {'b': bounds, 'n': len(kept), 'p': kept}
+        return node, len(_encode(node))
+
+    children = [_build_external(p, c, q, leaf_capacity, memory_records, writer, tmp_dir)
+                for p, c, q in zip(part_paths, counts, quadrants)]
+    return writer.pack(_inner_node(bounds, children, kept), children)
+
+
+def build_paged_quadtree(path: str, records: Iterable[dict], boundary: Rectangle,
+                         page_size: int = DEFAULT_PAGE_SIZE, leaf_capacity: int = 32,
+                         memory_records: int = 100000) -> int:
+    """
+    Construye el archivo de páginas a partir de registros con x, y (por
+    ejemplo, los de city_locations.json). Nunca mantiene en memoria más de
+    memory_records registros. Retorna la cantidad de puntos escritos.
+    """
+    bounds = [boundary.x, boundary.y, boundary.width, boundary.height]
+    tmp_dir = os.path.dirname(os.path.abspath(path))
+
+    fd, input_path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+    n = 0
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for item in records:
+            if 'x' in item and 'y' in item and boundary.contains(Point(item['x'], item['y'])):
+                attributes = {k: v for k, v in item.items() if k not in ['x', 'y']}
+                f.write(json.dumps([item['x'], item['y'], attributes], ensure_ascii=False) + '\n')
+                n += 1
+
+    with open(path, 'wb') as f:
+        writer = _PageWriter(f, page_size)
+        root, _ = _build_external(input_path, n, bounds, leaf_capacity, memory_records,
+                                  writer, tmp_dir)
+        root_page = writer.write_page(root)
+
+        header = _encode({'page_size': page_size, 'root': root_page, 'count': root['n'],
+                          'boundary': bounds, 'pages': writer.next_page})
+        if HEADER.size + len(header) > page_size:
+            raise ValueError("page_size demasiado pequeño para la cabecera")
+        f.seek(0)
+        f.write(HEADER.pack(len(header)) + header)
+        # Completar la última página para que el archivo tenga tamaño fijo
+        f.truncate(writer.next_page * page_size)
+    return n
+
+
+class PagedQuadTree:
+    """QuadTree de solo lectura en disco con caché LRU de páginas"""
+
+    def __init__(self, path: str, cache_pages: int = 64):
+        self.path = path
+        self.cache_pages = cache_pages
+        self._file = open(path, 'rb')
+
+        self._file.seek(0)
+        (length,) = HEADER.unpack(self._file.read(HEADER.size))
+        meta = json.loads(self._file.read(length))
+        self.page_size = meta['page_size']
+        self.root_page = meta['root']
+        self.total = meta['count']
+        self.pages = meta['pages']
+        self.boundary = _rect(meta['boundary'])
+
+        self._cache: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Estadísticas de la caché de páginas"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'resident_pages': len(self._cache), 'total_pages': self.pages}
+
+    def _page(self, page_id: int) -> Dict[str, Any]:
+        """Retorna una página, cargándola del disco si no está en caché"""
+        node = self._cache.get(page_id)
+        if node is not None:
+            self.hits += 1
+            self._cache.move_to_end(page_id)
+            return node
+
+        self.misses += 1
+        self._file.seek(page_id * self.page_size)
+        raw = self._file.read(self.page_size)
+        (length,) = HEADER.unpack(raw[:HEADER.size])
+        node = json.loads(raw[HEADER.size:HEADER.size + length])
+
+        self._cache[page_id] = node
+        if len(self._cache) > self.cache_pages:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return node
+
+    def _resolve(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        return self._page(node['r']) if 'r' in node else node
+
+    def query_range(self, range_rect: Rectangle) -> List[Point]:
+        """Consulta de rango; solo carga las páginas que intersectan"""
+        found: List[Point] = []
+        stack = [self._page(self.root_page)]
+        while stack:
+            node = stack.pop()
+            if node['n'] == 0 or not _rect(node['b']).intersects(range_rect):
+                continue
+            node = self._resolve(node)
+            stack.extend(node.get('c', ()))
+            for x, y, attributes in node.get('p', ()):
+                point = Point(x, y, attributes)
+                if range_rect.contains(point):
+                    found.append(point)
+        return found
+
+    def nearest_neighbor(self, query_point: Point) -> Optional[Point]:
+        """Vecino más cercano con búsqueda best-first; las páginas lejanas no se cargan"""
+        tiebreak = count()
+        root = self._page(self.root_page)
+        heap = [(_rect(root['b']).distance_to_point(query_point), next(tiebreak), root)]
+        best: Optional[Tuple[float, Point]] = None
+
+        while heap:
+            dist, _, node = heapq.heappop(heap)
+            if best is not None and dist > best[0]:
+                break
+            if node['n'] == 0:
+                continue
+            node = self._resolve(node)
+            for child in node.get('c', ()):
+                if child['n']:
+                    d = _rect(child['b']).distance_to_point(query_point)
+                    heapq.heappush(heap, (d, next(tiebreak), child))
+            for x, y, attributes in node.get('p', ()):
+                point = Point(x, y, attributes)
+                d = query_point.distance_to(point)
+                if best is None or d < best[0]:
+                    best = (d, point)
+        return best[1] if best else None
+
+    def count_points(self) -> int:
+        """Total de puntos (desde la cabecera, sin leer páginas)"""
+        return self.total
@@ -0,0 +1,200 @@
+"""
+Construcción paralela de un QuadTree por partición espacial
+
+Los puntos se reparten por cuadrante desde la raíz (con NumPy, igual que los
+repartiría insert: cada punto va al primer cuadrante NW, NE, SW, SE que lo
+contiene, bordes incluidos, y el que ninguno contiene por redondeo queda en el
+nodo) hasta split_depth niveles. Cada cuadrante de ese
+nivel con más puntos que la capacidad es una tarea: un proceso arma la forma
+de su subárbol solo con las coordenadas y devuelve dos arreglos compactos
+(forma en preorden y orden de los puntos en las hojas). El proceso principal
+cuelga cada subárbol bajo su nodo con los Point originales, sin volver a
+insertar nada, y recalcula los datos agregados con refresh_stats.
+
+La forma de un QuadTree no depende del orden de inserción (un nodo está
+dividido si y solo si recibió más puntos que su capacidad, no todos en la
+misma posición, y su boundary todavía se puede dividir), así que el árbol
+resultante es el mismo que el de insertar los puntos uno por uno.
+
+Uso:
+    qt = build_parallel(points, Rectangle(500, 500, 1000, 1000), capacity=4,
+                        indexed_attributes=('rating',), id_attribute='id')
+"""
+import multiprocessing
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from quadtree import QuadTree, QuadTreeNode, Point, Rectangle, can_split, quadrants
+
+# Grupos con menos puntos que esto se reparten con listas de Python (el costo
+# fijo de cada operación de NumPy supera su ventaja)
+SMALL_GROUP = 64
+
+# Forma de un subárbol en preorden: -(k + 1) para un nodo dividido que guarda
+# k puntos propios, n >= 0 para una hoja con n puntos; y los índices de los
+# puntos en ese mismo orden
+Layout = Tuple[np.ndarray, np.ndarray]
+
+
+def _is_leaf(rect: Rectangle, capacity: int, xs, ys) -> bool:
+    """Mismo criterio que QuadTreeNode.keeps para el grupo completo"""
+    if len(xs) <= capacity or not can_split(rect):
+        return True
+    if isinstance(xs, np.ndarray):
+        return bool((xs == xs[0]).all() and (ys == ys[0]).all())
+    return all(x == xs[0] for x in xs) and all(y == ys[0] for y in ys)
+
+
+def _split(rect: Rectangle, xs, ys) -> List:
+    """
+    Posiciones de los puntos que van a cada cuadrante NW, NE, SW, SE, y al
+    final las de los que no caben en ninguno (solo por redondeo), que como en
+    insert quedan en el nodo.
+    """
+    parts = []
+    if isinstance(xs, np.ndarray):
+        remaining = np.ones(len(xs), dtype=bool)
+        for q in quadrants(rect):
+            inside = remaining & (xs >= q.min_x) & (xs <= q.max_x) & (ys >= q.min_y) & (ys <= q.max_y)
+            remaining &= ~inside
+            parts.append(np.flatnonzero(inside))
+        parts.append(np.flatnonzero(remaining))
+        return parts
+
+    taken = [False] * len(xs)
+    for q in quadrants(rect):
+        part = []
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            if not taken[i] and q.min_x <= x <= q.max_x and q.min_y <= y <= q.max_y:
+                taken[i] = True
+                part.append(i)
+        parts.append(part)
+    parts.append([i for i, done in enumerate(taken) if not done])
+    return parts
+
+
+def _take(values, positions):
+    if isinstance(values, np.ndarray):
+        return values[positions]
+    return [values[i] for i in positions]
+
+
+def build_layout(boundary: Rectangle, capacity: int, xs: np.ndarray, ys: np.ndarray,
+                 ids: np.ndarray) -> Layout:
+    """Forma del subárbol que armaría insert con estos puntos, sin crear nodos"""
+    shape: List[int] = []
+    order: List[int] = []
+    stack = [(boundary, xs, ys, ids)]
+    while stack:
+        rect, gx, gy, gid = stack.pop()
+        m = len(gid)
+        if _is_leaf(rect, capacity, gx, gy):
+            shape.append(m)
+            order.extend(gid.tolist() if isinstance(gid, np.ndarray) else gid)
+            continue
+        if m <= SMALL_GROUP and isinstance(gx, np.ndarray):
+            gx, gy, gid = gx.tolist(), gy.tolist(), gid.tolist()
+        *parts, kept = _split(rect, gx, gy)
+        kept = _take(gid, kept)
+        shape.append(-len(kept) - 1)
+        order.extend(kept.tolist() if isinstance(kept, np.ndarray) else kept)
+        children = list(zip(quadrants(rect), parts))
+        for q, part in reversed(children):
+            stack.append((q, _take(gx, part), _take(gy, part), _take(gid, part)))
+    return np.array(shape, dtype=np.int64), np.array(order, dtype=np.int64)
+
+
+def _build_task(task) -> Tuple[int, np.ndarray, np.ndarray]:
+    index, boundary, capacity, xs, ys, ids = task
+    shape, order = build_layout(boundary, capacity, xs, ys, ids)
+    return index, shape, order
+
+
+def attach_layout(node: QuadTreeNode, layout: Layout, points: List[Point]):
+    """Arma bajo node el subárbol descrito por layout (sin datos agregados)"""
+    shape, order = layout[0].tolist(), layout[1].tolist()
+    stack = [node]
+    offset = 0
+    for count in shape:
+        current = stack.pop()
+        if count < 0:
+            current.subdivide()
+            stack.extend((current.southeast, current.southwest, current.northeast, current.northwest))
+            count = -count - 1  # Puntos que ningún hijo acepta
+        current.points = [points[i] for i in order[offset:offset + count]]
+        offset += count
+
+
+def default_split_depth(processes: int) -> int:
+    """Niveles a repartir para tener al menos 4 tareas por proceso"""
+    depth = 0
+    while 4 ** depth < 4 * processes:
+        depth += 1
+    return depth
+
+
+def build_parallel(points: List[Point], boundary: Rectangle, capacity: int = 4,
+                   indexed_attributes: Tuple[str, ...] = (), id_attribute: Optional[str] = None,
+                   processes: Optional[int] = None, split_depth: Optional[int] = None,
+                   tree_class=QuadTree) -> QuadTree:
+    """
+    Construye un QuadTree (o una subclase con el mismo constructor, como
+    ConcurrentQuadTree) repartiendo los subárboles entre processes procesos
+    (por defecto, uno por CPU; 0 arma todo en este proceso). Los puntos fuera
+    del boundary se descartan; qt.count_points() dice cuántos entraron. No se
+    avisa a los listeners.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if split_depth is None:
+        split_depth = default_split_depth(max(processes, 1))
+
+    qt = tree_class(boundary, capacity, indexed_attributes, id_attribute)
+    root = QuadTreeNode(boundary, capacity, tuple(indexed_attributes))
+
+    xs = np.fromiter((p.x for p in points), dtype=np.float64, count=len(points))
+    ys = np.fromiter((p.y for p in points), dtype=np.float64, count=len(points))
+    ids = np.flatnonzero((xs >= boundary.min_x) & (xs <= boundary.max_x) &
+                         (ys >= boundary.min_y) & (ys <= boundary.max_y))
+
+    # Niveles superiores: se reparten aquí; lo que queda grande es una tarea
+    frontier = [(root, ids)]
+    for _ in range(split_depth):
+        next_frontier = []
+        for node, idx in frontier:
+            if _is_leaf(node.boundary, capacity, xs[idx], ys[idx]):
+                node.points = [points[i] for i in idx.tolist()]
+                continue
+            node.subdivide()
+            children = (node.northwest, node.northeast, node.southwest, node.southeast)
+            *parts, kept = _split(node.boundary, xs[idx], ys[idx])
+            node.points = [points[i] for i in idx[kept].tolist()]
+            for child, part in zip(children, parts):
+                next_frontier.append((child, idx[part]))
+        frontier = next_frontier
+
+    nodes: List[QuadTreeNode] = []
+    tasks = []
+    for node, idx in frontier:
+        if _is_leaf(node.boundary, capacity, xs[idx], ys[idx]):
+            node.points = [points[i] for i in idx.tolist()]
+            continue
+        tasks.append((len(nodes), node.boundary, capacity, xs[idx], ys[idx], idx))
+        nodes.append(node)
+    # Las tareas grandes primero, para repartir mejor la carga
+    tasks.sort(key=lambda task: len(task[5]), reverse=True)
+
+    if processes <= 0 or len(tasks) <= 1:
+        for index, shape, order in map(_build_task, tasks):
+            attach_layout(nodes[index], (shape, order), points)
+    else:
+        with multiprocessing.get_context().Pool(min(processes, len(tasks))) as pool:
+            for index, shape, order in pool.imap_unordered(_build_task, tasks):
+                attach_layout(nodes[index], (shape, order), points)
+
+    root.refresh_stats()
+    qt.root = root
+    qt.rebuild_id_index()
+    return qt
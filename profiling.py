@@ -0,0 +1,252 @@
+"""
+Perfilado del pipeline carga -> construcción -> consultas -> guardado
+Registra por etapa el tiempo real, el tiempo de CPU y la memoria asignada
+(contadores de tracemalloc; los sitios de asignación por etapa requieren una
+instantánea al entrar y otra al salir, así que solo se toman con
+stage_allocation_sites=True), cuenta llamadas a las funciones del proyecto (cProfile) y
+muestrea pilas de llamadas para generar un archivo "collapsed stacks"
+compatible con flamegraph.pl / speedscope.
+
+Uso:
+    profiler = Profiler()
+    profiler.start()
+    with stage('carga'):
+        ...
+    profiler.stop()
+    profiler.write_report('output_data/perfil')
+
+Fuera de un perfilado activo, stage() no hace nada.
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_active: Optional['Profiler'] = None
+
+# Las asignaciones del propio perfilador no se reportan
+_OWN_ALLOCATIONS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, cProfile.__file__),
+                    tracemalloc.Filter(False, __file__))
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+
+
+# Marcos del propio perfilado que no se incluyen en las pilas muestreadas
+_OWN_FRAMES = frozenset(os.path.abspath(f) for f in (__file__, tracemalloc.__file__))
+
+
+def stage(name: str):
+    """Context manager que mide una etapa del profiler activo (o no hace nada)"""
+    if _active is None:
+        return nullcontext()
+    return _active.stage(name)
+
+
+class _StackSampler(threading.Thread):
+    """Hilo que muestrea periódicamente la pila del hilo perfilado"""
+
+    def __init__(self, profiler: 'Profiler', thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                if os.path.abspath(code.co_filename) not in _OWN_FRAMES:
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            names.reverse()
+            prefix = [f"etapa:{s}" for s in self.profiler.stage_path()]
+            self.samples[';'.join(prefix + names)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """Mide etapas del pipeline y genera un reporte JSON y un archivo collapsed"""
+
+    def __init__(self, trace_allocations: bool = True, count_calls: bool = True,
+                 sample_interval: float = 0.005, top_sites: int = 10,
+                 stage_allocation_sites: bool = False):
+        self.trace_allocations = trace_allocations
+        self.stage_allocation_sites = stage_allocation_sites
+        self.count_calls = count_calls
+        self.sample_interval = sample_interval
+        self.top_sites = top_sites
+
+        self.stages: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._started_tracemalloc = False
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+        self.total_wall = 0.0
+        self.total_cpu = 0.0
+        self.top_allocations: List[Dict[str, Any]] = []
+        self.call_counts: List[Dict[str, Any]] = []
+
+    def stage_path(self) -> List[str]:
+        return [s['name'] for s in self._stack]
+
+    def start(self):
+        """Activa el perfilado (tracemalloc, cProfile y muestreo de pilas)"""
+        global _active
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.sample_interval:
+            self._sampler = _StackSampler(self, threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self.count_calls:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        _active = self
+
+    def stop(self):
+        """Detiene el perfilado y junta los resultados"""
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self.call_counts = self._collect_call_counts()
+        self.total_wall = time.perf_counter() - self._start_wall
+        self.total_cpu = time.process_time() - self._start_cpu
+        if self._sampler is not None:
+            self._sampler.stop()
+        if tracemalloc.is_tracing():
+            snapshot = _take_snapshot()
+            self.top_allocations = [self._site(stat) for stat in
+                                    snapshot.statistics('lineno')[:self.top_sites]]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        _active = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mide una etapa; las etapas anidadas se reportan como 'padre/hija'"""
+        record = {'name': name, 'path': '/'.join(self.stage_path() + [name])}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent['_peak'] = max(parent['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_start_mem'] = current
+            record['_peak'] = current
+            if self.stage_allocation_sites:
+                record['_snapshot'] = _take_snapshot()
+
+        self._stack.append(record)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(time.process_time() - cpu, 6)
+            self._stack.pop()
+
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(record.pop('_peak'), peak)
+                start_mem = record.pop('_start_mem')
+                record['alloc_peak_bytes'] = peak - start_mem
+                record['alloc_net_bytes'] = current - start_mem
+                before = record.pop('_snapshot', None)
+                if before is not None:
+                    diff = _take_snapshot().compare_to(before, 'lineno')
+                    record['top_allocations'] = [self._site(stat) for stat in diff[:5]]
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent['_peak'] = max(parent['_peak'], peak)
+            self.stages.append(record)
+
+    @staticmethod
+    def _site(stat) -> Dict[str, Any]:
+        frame = stat.traceback[0]
+        return {
+            'site': f"{os.path.relpath(frame.filename, PROJECT_DIR)}:{frame.lineno}",
+            'size_bytes': getattr(stat, 'size_diff', stat.size),
+            'count': getattr(stat, 'count_diff', stat.count),
+        }
+
+    def _collect_call_counts(self) -> List[Dict[str, Any]]:
+        """Llamadas a funciones del proyecto, de más a menos llamadas"""
+        stats = pstats.Stats(self._cprofile)
+        counts = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            path = os.path.abspath(filename)
+            if not os.path.isfile(path) or not path.startswith(PROJECT_DIR):
+                continue
+            if path == os.path.abspath(__file__):
+                continue
+            counts.append({
+                'function': f"{os.path.basename(filename)}:{line}:{func}",
+                'calls': ncalls,
+                'own_s': round(tottime, 6),
+                'cumulative_s': round(cumtime, 6),
+            })
+        counts.sort(key=lambda c: c['calls'], reverse=True)
+        return counts
+
+    def report(self) -> Dict[str, Any]:
+        """Reporte legible por máquina"""
+        return {
+            'total_wall_s': round(self.total_wall, 6),
+            'total_cpu_s': round(self.total_cpu, 6),
+            'stages': self.stages,
+            'top_allocations': self.top_allocations,
+            'call_counts': self.call_counts,
+            'stack_samples': sum(self._sampler.samples.values()) if self._sampler else 0,
+        }
+
+    def write_report(self, prefix: str) -> List[str]:
+        """Escribe <prefix>.json y <prefix>.folded. Retorna las rutas escritas"""
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        written = [prefix + '.json']
+        with open(written[0], 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+        if self._sampler is not None:
+            written.append(prefix + '.folded')
+            with open(written[1], 'w', encoding='utf-8') as f:
+                for stack, n in self._sampler.samples.most_common():
+                    f.write(f"{stack} {n}\n")
+        return written
+
+    def print_summary(self):
+        """Resumen por consola de las etapas"""
+        print(f"Perfil: {self.total_wall:.3f} s reales, {self.total_cpu:.3f} s de CPU")
+        for record in self.stages:
+            mem = record.get('alloc_peak_bytes')
+            mem_text = f", pico {mem / 1024:.1f} KiB" if mem is not None else ""
+            print(f"   {record['path']}: {record['wall_s']:.4f} s (CPU {record['cpu_s']:.4f} s{mem_text})")
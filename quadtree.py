@@ -2,28 +2,112 @@
 Implementación de QuadTree para búsqueda espacial
 Soporta: inserción, consultas de rango, vecino más cercano, filtrado por atributos
 """
+import bisect
+import heapq
 import math
-from typing import List, Tuple, Optional, Dict, Any
+import random
+from itertools import count
+from typing import List, Tuple, Optional, Dict, Any, Callable, Iterable, Iterator
+
+# Tope de valores distintos en la tabla de internado (evita crecer sin límite
+# con valores únicos como nombres o ids)
+_INTERN_LIMIT = 1 << 16
+_interned: Dict[str, str] = {}
+
+
+def _intern(value: Any) -> Any:
+    """Comparte una sola instancia de cada string repetido"""
+    if type(value) is not str:
+        return value
+    shared = _interned.get(value)
+    if shared is not None:
+        return shared
+    if len(_interned) < _INTERN_LIMIT:
+        _interned[value] = value
+    return value
+
+
+class _Schema:
+    """Claves de atributos compartidas por todos los puntos con la misma forma"""
+    __slots__ = ('keys', 'index')
+    
+    def __init__(self, keys: Tuple[str, ...]):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+
+
+_schemas: Dict[Tuple[str, ...], _Schema] = {}
+
+
+def _schema_for(keys: Tuple[str, ...]) -> _Schema:
+    """Esquema único para una tupla de claves"""
+    schema = _schemas.get(keys)
+    if schema is None:
+        keys = tuple(_intern(key) for key in keys)
+        schema = _schemas[keys] = _Schema(keys)
+    return schema
+
+
+_EMPTY_SCHEMA = _schema_for(())
+_MISSING = object()
 
 
 class Point:
-    """Representa un punto en el espacio 2D con atributos adicionales"""
+    """
+    Representa un punto en el espacio 2D con atributos adicionales.
+    Los atributos se guardan como una tupla de valores más un esquema de
+    claves compartido entre puntos; point.attributes retorna un dict nuevo,
+    así que modificarlo no cambia el punto (use QuadTree.update_attributes,
+    que además mantiene los resúmenes de los nodos).
+    timestamp (opcional, en segundos) permite consultas por ventana de tiempo
+    y expiración por antigüedad.
+    """
+    __slots__ = ('x', 'y', 'timestamp', '_schema', '_values')
     
-    def __init__(self, x: float, y: float, attributes: Dict[str, Any] = None):
+    def __init__(self, x: float, y: float, attributes: Dict[str, Any] = None,
+                 timestamp: Optional[float] = None):
         self.x = x
         self.y = y
-        self.attributes = attributes if attributes is not None else {}
+        self.timestamp = timestamp
+        self.attributes = attributes
+    
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """Copia de los atributos como dict (de solo lectura para el punto)"""
+        return dict(zip(self._schema.keys, self._values))
+    
+    @attributes.setter
+    def attributes(self, attributes: Optional[Dict[str, Any]]):
+        if not attributes:
+            self._schema = _EMPTY_SCHEMA
+            self._values = ()
+        else:
+            self._schema = _schema_for(tuple(attributes))
+            self._values = tuple(_intern(value) for value in attributes.values())
+    
+    def get_attribute(self, name: str, default: Any = None) -> Any:
+        """Valor de un atributo sin copiar todos los atributos"""
+        i = self._schema.index.get(name)
+        return default if i is None else self._values[i]
     
     def distance_to(self, other: 'Point') -> float:
         """Calcula la distancia euclidiana a otro punto"""
         return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
     
+    def __reduce__(self):
+        # Al deserializar, el esquema y los strings se vuelven a compartir
+        return (Point, (self.x, self.y, self.attributes, self.timestamp))
+    
     def __repr__(self):
+        if self.timestamp is not None:
+            return f"Point({self.x}, {self.y}, {self.attributes}, timestamp={self.timestamp})"
         return f"Point({self.x}, {self.y}, {self.attributes})"
 
 
 class Rectangle:
-    """Representa un rectángulo (bounding box)"""
+    """Representa un rectángulo (bounding box) con sus bordes precalculados"""
+    __slots__ = ('x', 'y', 'width', 'height', 'half_width', 'half_height',
+                 'min_x', 'min_y', 'max_x', 'max_y')
     
     def __init__(self, x: float, y: float, width: float, height: float):
         self.x = x  # Centro x
@@ -32,57 +116,180 @@ class Rectangle:
         self.height = height
         self.half_width = width / 2
         self.half_height = height / 2
+        self.min_x = x - self.half_width
+        self.max_x = x + self.half_width
+        self.min_y = y - self.half_height
+        self.max_y = y + self.half_height
+    
+    def __reduce__(self):
+        # Los bordes viajan tal cual: los de un cuadrante no siempre coinciden
+        # con los que se recalcularían desde el centro
+        return (_rectangle_with_edges, (self.x, self.y, self.width, self.height,
+                                        self.min_x, self.min_y, self.max_x, self.max_y))
     
     def contains(self, point: Point) -> bool:
         """Verifica si un punto está dentro del rectángulo"""
-        return (self.x - self.half_width <= point.x <= self.x + self.half_width and
-                self.y - self.half_height <= point.y <= self.y + self.half_height)
+        return self.min_x <= point.x <= self.max_x and self.min_y <= point.y <= self.max_y
     
     def intersects(self, other: 'Rectangle') -> bool:
         """Verifica si este rectángulo intersecta con otro"""
-        return not (other.x - other.half_width > self.x + self.half_width or
-                   other.x + other.half_width < self.x - self.half_width or
-                   other.y - other.half_height > self.y + self.half_height or
-                   other.y + other.half_height < self.y - self.half_height)
+        return not (other.min_x > self.max_x or other.max_x < self.min_x or
+                    other.min_y > self.max_y or other.max_y < self.min_y)
+    
+    def contains_rect(self, other: 'Rectangle') -> bool:
+        """Verifica si otro rectángulo está completamente dentro de este"""
+        return (self.min_x <= other.min_x and other.max_x <= self.max_x and
+                self.min_y <= other.min_y and other.max_y <= self.max_y)
     
     def distance_to_point(self, point: Point) -> float:
         """Calcula la distancia mínima desde el punto al rectángulo"""
-        dx = max(self.x - self.half_width - point.x, 0, point.x - (self.x + self.half_width))
-        dy = max(self.y - self.half_height - point.y, 0, point.y - (self.y + self.half_height))
+        dx = max(self.min_x - point.x, 0, point.x - self.max_x)
+        dy = max(self.min_y - point.y, 0, point.y - self.max_y)
         return math.sqrt(dx * dx + dy * dy)
 
 
+# Atributo cuya distribución se resume en cada nodo
+SUMMARY_ATTRIBUTE = 'category'
+
+
+def can_split(rect: Rectangle) -> bool:
+    """
+    Un rectángulo se puede dividir mientras su centro quede estrictamente
+    dentro: con coordenadas grandes la resolución de float se agota mucho
+    antes que cualquier lado mínimo fijo
+    """
+    return rect.min_x < rect.x < rect.max_x and rect.min_y < rect.y < rect.max_y
+
+
+def _attributes_match(where: Dict[str, Any]) -> Callable[[Point], bool]:
+    """Crea un predicado que exige que los atributos coincidan con where"""
+    items = list(where.items())
+    
+    def predicate(point: Point) -> bool:
+        return all(point.get_attribute(name, _MISSING) == value for name, value in items)
+    
+    return predicate
+
+
+def _same_point(a: Point, b: Point) -> bool:
+    """Dos puntos son el mismo si son el mismo objeto o coinciden en todo"""
+    if a is b:
+        return True
+    if a.x != b.x or a.y != b.y or a.timestamp != b.timestamp:
+        return False
+    if a._schema is b._schema:
+        return a._values == b._values
+    return a.attributes == b.attributes
+
+
+def _in_window(point: Point, since: Optional[float], until: Optional[float]) -> bool:
+    """Verifica si el timestamp del punto cae en [since, until] (extremos opcionales)"""
+    ts = point.timestamp
+    return ts is not None and (since is None or ts >= since) and (until is None or ts <= until)
+
+
+def _node_in_window(node: 'QuadTreeNode', since: Optional[float], until: Optional[float]) -> bool:
+    """Verifica si el subárbol puede tener puntos en la ventana de tiempo"""
+    return (node.max_time is not None and (since is None or node.max_time >= since)
+            and (until is None or node.min_time <= until))
+
+
+def _rectangle_with_edges(x: float, y: float, width: float, height: float,
+                          min_x: float, min_y: float, max_x: float, max_y: float) -> Rectangle:
+    """Rectángulo con bordes dados (que pueden diferir del centro en el último bit)"""
+    rect = Rectangle(x, y, width, height)
+    rect.min_x, rect.min_y, rect.max_x, rect.max_y = min_x, min_y, max_x, max_y
+    return rect
+
+
+def quadrants(boundary: Rectangle) -> Tuple[Rectangle, Rectangle, Rectangle, Rectangle]:
+    """
+    Cuadrantes NW, NE, SW, SE de un rectángulo (los hijos de un nodo). Los
+    bordes se toman del padre y de su centro, así los cuatro cubren el padre
+    exactamente aunque x ± w/2 redondee distinto
+    """
+    x = boundary.x
+    y = boundary.y
+    w = boundary.half_width
+    h = boundary.half_height
+    min_x, min_y, max_x, max_y = boundary.min_x, boundary.min_y, boundary.max_x, boundary.max_y
+    return (_rectangle_with_edges(x - w/2, y - h/2, w, h, min_x, min_y, x, y),
+            _rectangle_with_edges(x + w/2, y - h/2, w, h, x, min_y, max_x, y),
+            _rectangle_with_edges(x - w/2, y + h/2, w, h, min_x, y, x, max_y),
+            _rectangle_with_edges(x + w/2, y + h/2, w, h, x, y, max_x, max_y))
+
+
 class QuadTreeNode:
     """Nodo del QuadTree"""
+    __slots__ = ('boundary', 'capacity', 'points', 'divided',
+                 'size', 'sum_x', 'sum_y', 'categories',
+                 'indexed_attributes', 'maxima', 'min_time', 'max_time',
+                 'northwest', 'northeast', 'southwest', 'southeast')
     
-    def __init__(self, boundary: Rectangle, capacity: int = 4):
+    def __init__(self, boundary: Rectangle, capacity: int = 4,
+                 indexed_attributes: Tuple[str, ...] = ()):
         self.boundary = boundary
         self.capacity = capacity
         self.points: List[Point] = []
         self.divided = False
         
+        # Resumen del subárbol para vistas agregadas
+        self.size = 0  # Puntos en todo el subárbol
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.categories: Dict[Any, int] = {}
+        
+        # Máximo de cada atributo numérico indexado dentro del subárbol
+        self.indexed_attributes = indexed_attributes
+        self.maxima: Dict[str, float] = {}
+        
+        # Cotas de los timestamps del subárbol (None si ningún punto tiene)
+        self.min_time: Optional[float] = None
+        self.max_time: Optional[float] = None
+        
         # Subdivisiones
         self.northwest: Optional['QuadTreeNode'] = None
         self.northeast: Optional['QuadTreeNode'] = None
         self.southwest: Optional['QuadTreeNode'] = None
         self.southeast: Optional['QuadTreeNode'] = None
     
+    def can_subdivide(self) -> bool:
+        """Verifica si el nodo todavía se puede dividir con la resolución de float"""
+        return can_split(self.boundary)
+    
+    def keeps(self, point: Point) -> bool:
+        """
+        Una hoja guarda el punto sin dividirse si tiene lugar, si ya no se
+        puede dividir o si todos sus puntos están en la misma posición que
+        point (dividir no separaría duplicados)
+        """
+        points = self.points
+        if len(points) < self.capacity:
+            return True
+        if not self.can_subdivide():
+            return True
+        if len(points) > self.capacity:
+            # Pasada la capacidad una hoja divisible solo guarda duplicados
+            first = points[0]
+            return first.x == point.x and first.y == point.y
+        return all(p.x == point.x and p.y == point.y for p in points)
+    
+    def push_down(self):
+        """
+        Divide la hoja y baja sus puntos a los hijos. Un punto que ningún
+        hijo acepta (por redondeo en los bordes) queda en este nodo.
+        """
+        self.subdivide()
+        self.points = [p for p in self.points if not self._insert_to_children(p)]
+    
     def subdivide(self):
         """Divide el nodo en 4 cuadrantes"""
-        x = self.boundary.x
-        y = self.boundary.y
-        w = self.boundary.half_width
-        h = self.boundary.half_height
-        
-        nw = Rectangle(x - w/2, y - h/2, w, h)
-        ne = Rectangle(x + w/2, y - h/2, w, h)
-        sw = Rectangle(x - w/2, y + h/2, w, h)
-        se = Rectangle(x + w/2, y + h/2, w, h)
+        nw, ne, sw, se = quadrants(self.boundary)
         
-        self.northwest = QuadTreeNode(nw, self.capacity)
-        self.northeast = QuadTreeNode(ne, self.capacity)
-        self.southwest = QuadTreeNode(sw, self.capacity)
-        self.southeast = QuadTreeNode(se, self.capacity)
+        self.northwest = QuadTreeNode(nw, self.capacity, self.indexed_attributes)
+        self.northeast = QuadTreeNode(ne, self.capacity, self.indexed_attributes)
+        self.southwest = QuadTreeNode(sw, self.capacity, self.indexed_attributes)
+        self.southeast = QuadTreeNode(se, self.capacity, self.indexed_attributes)
         
         self.divided = True
     
@@ -92,21 +299,118 @@ class QuadTreeNode:
         if not self.boundary.contains(point):
             return False
         
-        # Si hay capacidad y no está dividido, agregar aquí
-        if len(self.points) < self.capacity and not self.divided:
+        if self.indexed_attributes:
+            self._update_maxima(point)
+        
+        # Si no está dividido y la hoja lo guarda, agregar aquí
+        if not self.divided and self.keeps(point):
             self.points.append(point)
+            self._summarize(point, 1)
             return True
         
-        # Si no está dividido, subdividir
+        # Si no está dividido, subdividir y redistribuir los puntos existentes
         if not self.divided:
-            self.subdivide()
-            # Redistribuir puntos existentes
-            for p in self.points:
-                self._insert_to_children(p)
-            self.points.clear()
+            self.push_down()
         
-        # Insertar en hijo apropiado
-        return self._insert_to_children(point)
+        # Insertar en hijo apropiado; si ninguno lo acepta queda en este nodo
+        if not self._insert_to_children(point):
+            self.points.append(point)
+        self._summarize(point, 1)
+        return True
+    
+    def _update_maxima(self, point: Point):
+        """Actualiza los máximos de atributos indexados con un punto nuevo"""
+        for name in self.indexed_attributes:
+            value = point.get_attribute(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if name not in self.maxima or value > self.maxima[name]:
+                    self.maxima[name] = value
+    
+    def _summarize(self, point: Point, sign: int):
+        """Suma (sign=1) o resta (sign=-1) un punto del resumen del subárbol"""
+        self.size += sign
+        self.sum_x += sign * point.x
+        self.sum_y += sign * point.y
+        # Al restar, las cotas de tiempo quedan anchas (siguen siendo válidas)
+        ts = point.timestamp
+        if ts is not None and sign > 0:
+            if self.min_time is None or ts < self.min_time:
+                self.min_time = ts
+            if self.max_time is None or ts > self.max_time:
+                self.max_time = ts
+        category = point.get_attribute(SUMMARY_ATTRIBUTE)
+        if category is not None:
+            n = self.categories.get(category, 0) + sign
+            if n:
+                self.categories[category] = n
+            else:
+                del self.categories[category]
+    
+    def centroid(self) -> Optional[Point]:
+        """Centroide de los puntos del subárbol"""
+        if self.size == 0:
+            return None
+        return Point(self.sum_x / self.size, self.sum_y / self.size)
+    
+    def refresh_stats(self):
+        """
+        Recalcula de abajo hacia arriba los datos agregados del subárbol.
+        Necesario tras armar nodos sin pasar por insert; tras remove los
+        máximos solo pueden quedar altos, lo que sigue siendo una cota válida.
+        """
+        self.maxima = {}
+        self.size = 0
+        self.sum_x = self.sum_y = 0.0
+        self.categories = {}
+        self.min_time = self.max_time = None
+        for point in self.points:
+            self._update_maxima(point)
+            self._summarize(point, 1)
+        if self.divided:
+            for child in (self.northwest, self.northeast, self.southwest, self.southeast):
+                child.refresh_stats()
+                self.size += child.size
+                self.sum_x += child.sum_x
+                self.sum_y += child.sum_y
+                for category, n in child.categories.items():
+                    self.categories[category] = self.categories.get(category, 0) + n
+                for name, value in child.maxima.items():
+                    if name not in self.maxima or value > self.maxima[name]:
+                        self.maxima[name] = value
+                self._merge_time_bounds(child)
+    
+    def _merge_time_bounds(self, child: 'QuadTreeNode'):
+        """Amplía las cotas de tiempo con las de un hijo"""
+        if child.min_time is not None and (self.min_time is None or child.min_time < self.min_time):
+            self.min_time = child.min_time
+        if child.max_time is not None and (self.max_time is None or child.max_time > self.max_time):
+            self.max_time = child.max_time
+    
+    def tighten_time_bounds(self, older_than: float):
+        """
+        Recalcula las cotas de tiempo de los nodos que tenían puntos más
+        antiguos que older_than (los únicos que una expiración pudo vaciar).
+        Solo depende del contenido del nodo, así que es seguro sobre nodos
+        compartidos entre versiones.
+        """
+        if self.min_time is None or self.min_time >= older_than:
+            return
+        low = high = None
+        for point in self.points:
+            ts = point.timestamp
+            if ts is not None:
+                if low is None or ts < low:
+                    low = ts
+                if high is None or ts > high:
+                    high = ts
+        if self.divided:
+            for child in (self.northwest, self.northeast, self.southwest, self.southeast):
+                child.tighten_time_bounds(older_than)
+                if child.min_time is not None and (low is None or child.min_time < low):
+                    low = child.min_time
+                if child.max_time is not None and (high is None or child.max_time > high):
+                    high = child.max_time
+        self.min_time, self.max_time = low, high
     
     def _insert_to_children(self, point: Point) -> bool:
         """Inserta el punto en el hijo apropiado"""
@@ -120,8 +424,43 @@ class QuadTreeNode:
             return True
         return False
     
-    def query_range(self, range_rect: Rectangle, found: List[Point] = None) -> List[Point]:
-        """Consulta todos los puntos dentro de un rango rectangular"""
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto del QuadTree (por identidad, o por coordenadas y atributos)"""
+        if not self.boundary.contains(point):
+            return False
+        
+        for i, p in enumerate(self.points):
+            if _same_point(p, point):
+                del self.points[i]
+                self._summarize(p, -1)
+                return True
+        
+        if not self.divided:
+            return False
+        
+        removed = (self.northwest.remove(point) or self.northeast.remove(point) or
+                   self.southwest.remove(point) or self.southeast.remove(point))
+        if removed:
+            self._summarize(point, -1)
+            self._try_merge()
+        return removed
+    
+    def _try_merge(self):
+        """Colapsa los hijos si son hojas y sus puntos caben en este nodo"""
+        children = (self.northwest, self.northeast, self.southwest, self.southeast)
+        if any(child.divided for child in children):
+            return
+        if len(self.points) + sum(len(child.points) for child in children) > self.capacity:
+            return
+        
+        for child in children:
+            self.points.extend(child.points)
+        self.northwest = self.northeast = self.southwest = self.southeast = None
+        self.divided = False
+    
+    def query_range(self, range_rect: Rectangle, found: List[Point] = None,
+                    since: Optional[float] = None, until: Optional[float] = None) -> List[Point]:
+        """Consulta todos los puntos dentro de un rango rectangular (y ventana de tiempo)"""
         if found is None:
             found = []
         
@@ -129,17 +468,21 @@ class QuadTreeNode:
         if not self.boundary.intersects(range_rect):
             return found
         
+        timed = since is not None or until is not None
+        if timed and not _node_in_window(self, since, until):
+            return found
+        
         # Verificar puntos en este nodo
         for point in self.points:
-            if range_rect.contains(point):
+            if range_rect.contains(point) and (not timed or _in_window(point, since, until)):
                 found.append(point)
         
         # Si está dividido, consultar hijos
         if self.divided:
-            self.northwest.query_range(range_rect, found)
-            self.northeast.query_range(range_rect, found)
-            self.southwest.query_range(range_rect, found)
-            self.southeast.query_range(range_rect, found)
+            self.northwest.query_range(range_rect, found, since, until)
+            self.northeast.query_range(range_rect, found, since, until)
+            self.southwest.query_range(range_rect, found, since, until)
+            self.southeast.query_range(range_rect, found, since, until)
         
         return found
     
@@ -174,6 +517,23 @@ class QuadTreeNode:
         
         return best
     
+    def point_at(self, index: int) -> Point:
+        """
+        Punto número index del subárbol (0 <= index < size) en un orden fijo:
+        primero los puntos propios y luego los hijos. Baja eligiendo el hijo
+        por los tamaños, en O(profundidad).
+        """
+        node = self
+        while True:
+            if index < len(node.points):
+                return node.points[index]
+            index -= len(node.points)
+            for child in (node.northwest, node.northeast, node.southwest, node.southeast):
+                if index < child.size:
+                    node = child
+                    break
+                index -= child.size
+    
     def count_points(self) -> int:
         """Cuenta el número total de puntos en el árbol"""
         count = len(self.points)
@@ -203,33 +563,626 @@ class QuadTreeNode:
 class QuadTree:
     """Estructura QuadTree para búsqueda espacial eficiente"""
     
-    def __init__(self, boundary: Rectangle, capacity: int = 4):
-        self.root = QuadTreeNode(boundary, capacity)
+    def __init__(self, boundary: Rectangle, capacity: int = 4,
+                 indexed_attributes: Tuple[str, ...] = (),
+                 id_attribute: Optional[str] = None):
+        self.root = QuadTreeNode(boundary, capacity, tuple(indexed_attributes))
         self.boundary = boundary
+        # Funciones listener(evento, punto, posición_anterior) avisadas tras cada cambio
+        self.listeners: List[Callable[[str, Point, Optional[Tuple[float, float]]], None]] = []
+        
+        # Índice id -> punto (se mantiene con los mismos eventos que los listeners)
+        self.id_attribute = id_attribute
+        self.by_id: Dict[Any, Point] = {}
+        if id_attribute is not None:
+            self.add_listener(self._index_id)
+    
+    def add_listener(self, listener: Callable[[str, Point, Optional[Tuple[float, float]]], None]):
+        """Registra una función a avisar en cada insert, remove o move exitoso"""
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[str, Point, Optional[Tuple[float, float]]], None]):
+        """Deja de avisar a una función registrada"""
+        self.listeners.remove(listener)
+    
+    def _notify(self, event: str, point: Point, old_position: Optional[Tuple[float, float]] = None):
+        for listener in list(self.listeners):
+            listener(event, point, old_position)
+    
+    def _index_id(self, event: str, point: Point, old_position: Optional[Tuple[float, float]]):
+        key = point.get_attribute(self.id_attribute)
+        if key is None:
+            return
+        if event == 'remove':
+            # El punto recibido puede ser una copia igual al guardado (p. ej.
+            # al reproducir un registro)
+            current = self.by_id.get(key)
+            if current is not None and _same_point(current, point):
+                del self.by_id[key]
+        else:
+            # insert, update y move: el objeto recibido es el que queda en el árbol
+            self.by_id[key] = point
+    
+    def rebuild_id_index(self):
+        """Reconstruye el índice por id (tras armar nodos sin pasar por insert)"""
+        self.by_id = {}
+        if self.id_attribute is not None:
+            for point in self.root.get_all_points():
+                key = point.get_attribute(self.id_attribute)
+                if key is not None:
+                    self.by_id[key] = point
+    
+    def get(self, key: Any) -> Optional[Point]:
+        """Punto con el id dado (requiere id_attribute)"""
+        return self.by_id.get(key)
     
     def insert(self, point: Point) -> bool:
         """Inserta un punto en el QuadTree"""
-        return self.root.insert(point)
+        inserted = self.root.insert(point)
+        if inserted and self.listeners:
+            self._notify('insert', point)
+        return inserted
+    
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto del QuadTree"""
+        removed = self.root.remove(point)
+        if removed and self.listeners:
+            self._notify('remove', point)
+        return removed
+    
+    def move(self, point: Point, new_x: float, new_y: float,
+             timestamp: Optional[float] = None) -> bool:
+        """
+        Mueve un punto a nuevas coordenadas (y opcionalmente actualiza su
+        timestamp); si no cabe, queda donde estaba
+        """
+        if not self.root.remove(point):
+            return False
+        
+        old_x, old_y, old_time = point.x, point.y, point.timestamp
+        point.x, point.y = new_x, new_y
+        if timestamp is not None:
+            point.timestamp = timestamp
+        if self.root.insert(point):
+            if self.listeners:
+                self._notify('move', point, (old_x, old_y))
+            return True
+        
+        point.x, point.y, point.timestamp = old_x, old_y, old_time
+        self.root.insert(point)
+        return False
+    
+    def expire(self, older_than: float, max_points: Optional[int] = None) -> int:
+        """
+        Elimina los puntos con timestamp anterior a older_than. Solo visita los
+        subárboles cuyo timestamp mínimo es más antiguo; con max_points se
+        elimina como mucho esa cantidad, para expirar de a pasos sin detener
+        a los demás usuarios del árbol. Retorna cuántos puntos se eliminaron.
+        """
+        removed = sum(1 for point in self._expired_points(older_than, max_points)
+                      if self.remove(point))
+        self.root.tighten_time_bounds(older_than)
+        return removed
+    
+    def update_attributes(self, point: Point, attributes: Dict[str, Any]) -> Point:
+        """
+        Reemplaza los atributos de un punto. Si no cambian los atributos que
+        se resumen en los nodos (categoría e indexados) se actualiza en el
+        lugar; si cambian, el punto se reinserta. En ambos casos se avisa un
+        solo evento 'update' con el punto vigente, que se retorna.
+        """
+        summarized = (SUMMARY_ATTRIBUTE,) + self.root.indexed_attributes
+        if all(point.get_attribute(name) == attributes.get(name) for name in summarized):
+            self._drop_old_id(point, attributes)
+            point.attributes = attributes
+            if self.listeners:
+                self._notify('update', point)
+            return point
+        
+        replacement = Point(point.x, point.y, attributes, point.timestamp)
+        if not self.root.remove(point):
+            return point
+        self.root.insert(replacement)
+        self._drop_old_id(point, attributes)
+        if self.listeners:
+            self._notify('update', replacement)
+        return replacement
+    
+    def _drop_old_id(self, point: Point, attributes: Dict[str, Any]):
+        """
+        Quita del índice la clave vieja de un punto al que update_attributes
+        le cambia el id (el evento 'update' solo registra la nueva)
+        """
+        if self.id_attribute is None:
+            return
+        key = point.get_attribute(self.id_attribute)
+        if key is not None and key != attributes.get(self.id_attribute) and self.by_id.get(key) is point:
+            del self.by_id[key]
+    
+    def upsert(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Inserta o actualiza registros con x, y e id_attribute. Un id nuevo se
+        inserta; uno existente se mueve y/o actualiza solo si cambió.
+        Retorna la cantidad de registros por resultado.
+        """
+        if self.id_attribute is None:
+            raise ValueError("upsert requiere crear el QuadTree con id_attribute")
+        stats = {'inserted': 0, 'moved': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+        for record in records:
+            if 'x' not in record or 'y' not in record:
+                stats['rejected'] += 1
+                continue
+            x, y = record['x'], record['y']
+            attributes = {k: v for k, v in record.items() if k not in ['x', 'y']}
+            key = attributes.get(self.id_attribute)
+            current = self.by_id.get(key) if key is not None else None
+            
+            if current is None:
+                stats['inserted' if self.insert(Point(x, y, attributes)) else 'rejected'] += 1
+                continue
+            
+            if (current.x != x or current.y != y) and not self.boundary.contains(Point(x, y)):
+                # Se valida antes de tocar los atributos: un registro
+                # rechazado no deja el punto a medio actualizar
+                stats['rejected'] += 1
+                continue
+            changed = False
+            if current.attributes != attributes:
+                current = self.update_attributes(current, attributes)
+                stats['updated'] += 1
+                changed = True
+            if current.x != x or current.y != y:
+                stats['moved' if self.move(current, x, y) else 'rejected'] += 1
+                changed = True
+            if not changed:
+                stats['unchanged'] += 1
+        return stats
     
-    def query_range(self, range_rect: Rectangle) -> List[Point]:
-        """Consulta de rango rectangular"""
-        return self.root.query_range(range_rect)
+    def sync(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Lleva el árbol a una nueva versión del conjunto de datos: aplica
+        upsert y elimina los ids que ya no están. Solo los registros que
+        cambiaron tocan el árbol.
+        """
+        records = list(records)
+        stats = self.upsert(records)
+        present = {record.get(self.id_attribute) for record in records}
+        stale = [point for key, point in self.by_id.items() if key not in present]
+        stats['removed'] = sum(1 for point in stale if self.remove(point))
+        return stats
     
-    def nearest_neighbor(self, query_point: Point) -> Optional[Point]:
-        """Encuentra el vecino más cercano"""
+    def _expired_points(self, older_than: float, max_points: Optional[int] = None) -> List[Point]:
+        """Puntos con timestamp anterior a older_than (como mucho max_points)"""
+        expired: List[Point] = []
+        stack = [self.root]
+        while stack and (max_points is None or len(expired) < max_points):
+            node = stack.pop()
+            if node.min_time is None or node.min_time >= older_than:
+                continue
+            for point in node.points:
+                if point.timestamp is not None and point.timestamp < older_than:
+                    expired.append(point)
+            if node.divided:
+                stack.extend((node.northwest, node.northeast, node.southwest, node.southeast))
+        return expired if max_points is None else expired[:max_points]
+    
+    def query_range(self, range_rect: Rectangle, since: Optional[float] = None,
+                    until: Optional[float] = None) -> List[Point]:
+        """Consulta de rango rectangular, opcionalmente dentro de una ventana de tiempo"""
+        return self.root.query_range(range_rect, None, since, until)
+    
+    def query_ranges(self, ranges: List[Rectangle], since: Optional[float] = None,
+                     until: Optional[float] = None) -> List[List[Point]]:
+        """
+        Varias consultas de rango en un solo recorrido: cada nodo se visita
+        una vez con los rangos que todavía lo intersectan. Retorna una lista
+        de resultados por rango, en el mismo orden.
+        """
+        results: List[List[Point]] = [[] for _ in ranges]
+        timed = since is not None or until is not None
+        stack = [(self.root, range(len(ranges)))]
+        while stack:
+            node, active = stack.pop()
+            active = [i for i in active if node.boundary.intersects(ranges[i])]
+            if not active or (timed and not _node_in_window(node, since, until)):
+                continue
+            for point in node.points:
+                if timed and not _in_window(point, since, until):
+                    continue
+                for i in active:
+                    if ranges[i].contains(point):
+                        results[i].append(point)
+            if node.divided:
+                stack.extend((child, active) for child in
+                             (node.southeast, node.southwest, node.northeast, node.northwest))
+        return results
+    
+    def nearest_neighbor(self, query_point: Point, where: Dict[str, Any] = None,
+                         since: Optional[float] = None, until: Optional[float] = None) -> Optional[Point]:
+        """
+        Encuentra el vecino más cercano (opcionalmente con atributos dados en
+        where y timestamp en [since, until])
+        """
+        if where or since is not None or until is not None:
+            return next(self.iter_nearest(query_point, None, since, until, where), None)
         result = self.root.nearest_neighbor(query_point)
         return result[0] if result else None
     
-    def filter_by_attribute(self, attribute_name: str, attribute_value: Any) -> List[Point]:
-        """Filtra puntos por un atributo específico"""
-        all_points = self.root.get_all_points()
+    # Métrica usada por iter_nearest; las subclases (por ejemplo, la geográfica)
+    # la reemplazan manteniendo box_distance como cota inferior de point_distance
+    @staticmethod
+    def _point_distance(a: Point, b: Point) -> float:
+        return a.distance_to(b)
+    
+    @staticmethod
+    def _box_distance(rect: Rectangle, point: Point) -> float:
+        return rect.distance_to_point(point)
+    
+    def iter_nearest(self, query_point: Point,
+                     predicate: Callable[[Point], bool] = None,
+                     since: Optional[float] = None, until: Optional[float] = None,
+                     where: Dict[str, Any] = None) -> Iterator[Point]:
+        """
+        Recorre los puntos en orden creciente de distancia al punto de consulta.
+        Los nodos se expanden de forma perezosa desde una cola de prioridad, así
+        que detenerse tras los primeros resultados solo visita los nodos cercanos.
+        Con since/until solo se recorren puntos y subárboles de esa ventana.
+        where exige esos atributos (además de predicate); si fija la categoría,
+        se saltan los subárboles sin puntos de esa categoría.
+        """
+        timed = since is not None or until is not None
+        category = None
+        if where:
+            match = _attributes_match(where)
+            if predicate is None:
+                predicate = match
+            else:
+                extra = predicate
+                predicate = lambda point: match(point) and extra(point)
+            category = where.get(SUMMARY_ATTRIBUTE)
+            try:
+                hash(category)
+            except TypeError:
+                category = None  # Sin resumen posible: solo se filtra por punto
+        tiebreak = count()
+        # Entradas: (distancia, desempate, es_nodo, nodo o punto)
+        point_distance, box_distance = self._point_distance, self._box_distance
+        heap = [(box_distance(self.root.boundary, query_point), next(tiebreak), True, self.root)]
+        
+        while heap:
+            dist, _, is_node, item = heapq.heappop(heap)
+            
+            if not is_node:
+                yield item
+                continue
+            
+            if timed and not _node_in_window(item, since, until):
+                continue
+            if category is not None and not item.categories.get(category):
+                continue
+            
+            for point in item.points:
+                if point is query_point:  # No comparar consigo mismo
+                    continue
+                if timed and not _in_window(point, since, until):
+                    continue
+                if predicate is None or predicate(point):
+                    heapq.heappush(heap, (point_distance(query_point, point), next(tiebreak), False, point))
+            
+            if item.divided:
+                for child in (item.northwest, item.northeast, item.southwest, item.southeast):
+                    heapq.heappush(heap, (box_distance(child.boundary, query_point),
+                                          next(tiebreak), True, child))
+    
+    def top_n_in_range(self, range_rect: Rectangle, key: str = 'rating', n: int = 10,
+                       where: Dict[str, Any] = None) -> List[Point]:
+        """
+        Retorna los n puntos del rango con mayor valor en el atributo key,
+        ordenados de mayor a menor. Si key está indexado, los nodos se visitan
+        por su máximo y se descartan los que no pueden superar al n-ésimo mejor.
+        """
+        if n <= 0:
+            return []
+        predicate = _attributes_match(where) if where else None
+        
+        def candidate(point: Point) -> bool:
+            value = point.get_attribute(key)
+            return (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and range_rect.contains(point)
+                    and (predicate is None or predicate(point)))
+        
+        if key not in self.root.indexed_attributes:
+            found = [p for p in self.query_range(range_rect) if candidate(p)]
+            return heapq.nlargest(n, found, key=lambda p: p.get_attribute(key))
+        
+        tiebreak = count()
+        best: List[Tuple[float, int, Point]] = []  # min-heap con los n mejores
+        nodes = []  # max-heap de nodos por su máximo
+        if key in self.root.maxima and self.root.boundary.intersects(range_rect):
+            nodes.append((-self.root.maxima[key], next(tiebreak), self.root))
+        
+        while nodes:
+            neg_max, _, node = heapq.heappop(nodes)
+            if len(best) == n and -neg_max <= best[0][0]:
+                break  # Ningún nodo restante puede mejorar el resultado
+            
+            for point in node.points:
+                if candidate(point):
+                    entry = (point.get_attribute(key), next(tiebreak), point)
+                    if len(best) < n:
+                        heapq.heappush(best, entry)
+                    elif entry[0] > best[0][0]:
+                        heapq.heapreplace(best, entry)
+            
+            if node.divided:
+                for child in (node.northwest, node.northeast, node.southwest, node.southeast):
+                    if key in child.maxima and child.boundary.intersects(range_rect):
+                        heapq.heappush(nodes, (-child.maxima[key], next(tiebreak), child))
+        
+        return [point for _, _, point in sorted(best, key=lambda e: (-e[0], e[1]))]
+    
+    def histogram2d(self, bounds: Rectangle, nx: int, ny: int, by: str = None):
+        """
+        Cuenta puntos en una grilla de nx x ny celdas sobre bounds con un solo
+        recorrido del árbol. Un nodo que cae entero dentro de una celda suma su
+        tamaño sin descender; los puntos de las hojas restantes se agrupan con
+        NumPy. Igual que numpy.histogram2d, el resultado tiene forma (nx, ny) y
+        el último borde de cada eje es inclusivo.
+        
+        Sin by retorna un arreglo de conteos; con by retorna un diccionario
+        {valor del atributo: arreglo} (los puntos sin el atributo se omiten).
+        Con by='category' también se usan los resúmenes de nodos completos.
+        """
+        import numpy as np
+        
+        if nx <= 0 or ny <= 0:
+            raise ValueError("nx y ny deben ser positivos")
+        if bounds.width <= 0 or bounds.height <= 0:
+            raise ValueError("bounds debe tener área positiva")
+        
+        min_x = bounds.x - bounds.half_width
+        min_y = bounds.y - bounds.half_height
+        scale_x = nx / bounds.width
+        scale_y = ny / bounds.height
+        
+        def cell(x: float, y: float) -> Tuple[int, int]:
+            # Misma fórmula que la vectorizada de abajo (monótona en x e y)
+            return (min(int(math.floor((x - min_x) * scale_x)), nx - 1),
+                    min(int(math.floor((y - min_y) * scale_y)), ny - 1))
+        
+        counts = np.zeros((nx, ny), dtype=np.int64)
+        whole_nodes: List[Tuple[int, int, Dict[Any, int]]] = []
+        xs: List[float] = []
+        ys: List[float] = []
+        values: List[Any] = []
+        
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            b = node.boundary
+            if node.size == 0 or not b.intersects(bounds):
+                continue
+            
+            if (by is None or by == SUMMARY_ATTRIBUTE) and bounds.contains_rect(b):
+                ix0, iy0 = cell(b.x - b.half_width, b.y - b.half_height)
+                ix1, iy1 = cell(b.x + b.half_width, b.y + b.half_height)
+                if ix0 == ix1 and iy0 == iy1:
+                    if by is None:
+                        counts[ix0, iy0] += node.size
+                    else:
+                        whole_nodes.append((ix0, iy0, node.categories))
+                    continue
+            
+            if node.divided:
+                stack.extend((node.northwest, node.northeast, node.southwest, node.southeast))
+            for point in node.points:
+                if by is not None:
+                    value = point.get_attribute(by)
+                    if value is None:
+                        continue
+                    values.append(value)
+                xs.append(point.x)
+                ys.append(point.y)
+        
+        px = np.asarray(xs, dtype=np.float64)
+        py = np.asarray(ys, dtype=np.float64)
+        inside = ((px >= min_x) & (px <= min_x + bounds.width) &
+                  (py >= min_y) & (py <= min_y + bounds.height))
+        ix = np.minimum(np.floor((px[inside] - min_x) * scale_x).astype(np.int64), nx - 1)
+        iy = np.minimum(np.floor((py[inside] - min_y) * scale_y).astype(np.int64), ny - 1)
+        flat = ix * ny + iy
+        
+        if by is None:
+            counts += np.bincount(flat, minlength=nx * ny).reshape(nx, ny)
+            return counts
+        
+        kept = [v for v, keep in zip(values, inside) if keep]
+        codes: Dict[Any, int] = {}
+        code = np.fromiter((codes.setdefault(v, len(codes)) for v in kept),
+                           dtype=np.int64, count=len(kept))
+        for _, _, categories in whole_nodes:
+            for value in categories:
+                codes.setdefault(value, len(codes))
+        
+        per_value = np.bincount(code * (nx * ny) + flat, minlength=len(codes) * nx * ny)
+        per_value = per_value.reshape(len(codes), nx, ny)
+        for cx, cy, categories in whole_nodes:
+            for value, n in categories.items():
+                per_value[codes[value], cx, cy] += n
+        return {value: per_value[i] for value, i in codes.items()}
+    
+    def clusters_in_view(self, view: Rectangle, max_markers: int = 100) -> List[Point]:
+        """
+        Retorna marcadores para dibujar la vista sin enviar todos los puntos.
+        Parte de la raíz y va abriendo el nodo más poblado mientras el total de
+        marcadores no supere max_markers. Cada marcador es un Point en el
+        centroide del nodo con atributos {'cluster': True, 'count', 'categories'};
+        las hojas abiertas aportan sus puntos originales. Un cluster que cruza el
+        borde de la vista cuenta todos los puntos de su nodo. El trabajo depende
+        del presupuesto de marcadores, no de la cantidad de puntos.
+        """
+        if max_markers <= 0 or self.root.size == 0 or not self.root.boundary.intersects(view):
+            return []
+        
+        tiebreak = count()
+        # Frontera: max-heap de nodos por tamaño; raw: puntos ya abiertos
+        frontier = [(-self.root.size, next(tiebreak), self.root)]
+        raw: List[Point] = []
+        
+        while frontier:
+            _, _, node = frontier[0]
+            # Un nodo dividido puede guardar puntos que ningún hijo aceptó
+            own = [p for p in node.points if view.contains(p)]
+            children = []
+            if node.divided:
+                children = [c for c in (node.northwest, node.northeast, node.southwest, node.southeast)
+                            if c.size > 0 and c.boundary.intersects(view)]
+            added = len(own) + len(children)
+            
+            if len(frontier) - 1 + len(raw) + added > max_markers:
+                break
+            
+            heapq.heappop(frontier)
+            raw.extend(own)
+            for child in children:
+                heapq.heappush(frontier, (-child.size, next(tiebreak), child))
+        
+        markers = list(raw)
+        for _, _, node in frontier:
+            if node.size == 1 and not node.divided and node.points and view.contains(node.points[0]):
+                markers.append(node.points[0])
+                continue
+            center = node.centroid()
+            markers.append(Point(center.x, center.y, {
+                'cluster': True,
+                'count': node.size,
+                'categories': dict(node.categories),
+            }))
+        return markers
+    
+    def estimate_count(self, range_rect: Rectangle, max_error: float = 0,
+                       relative_error: float = 0) -> Tuple[float, float]:
+        """
+        Estima cuántos puntos hay en el rango a partir de los tamaños de los
+        subárboles. Un nodo dentro del rango suma su tamaño exacto; uno que lo
+        cruza aporta su tamaño por la fracción de área cubierta, con un error
+        de a lo sumo max(fracción, 1 - fracción) * tamaño. Se abre siempre el
+        nodo de mayor error hasta que la suma de errores no supere max_error
+        ni relative_error por la estimación en curso, así que el trabajo
+        depende de la cota y del borde del rango, no de la cantidad de puntos.
+        Retorna (estimación, cota del error absoluto); con las dos cotas en 0
+        el conteo es exacto.
+        """
+        root = self.root
+        exact = 0
+        estimate = 0.0
+        error = 0.0
+        tiebreak = count()
+        partial = []  # max-heap de nodos que cruzan el borde, por su error
+        
+        def classify(node: QuadTreeNode):
+            nonlocal exact, estimate, error
+            b = node.boundary
+            if node.size == 0 or not b.intersects(range_rect):
+                return
+            if range_rect.contains_rect(b):
+                exact += node.size
+                return
+            overlap_w = min(b.max_x, range_rect.max_x) - max(b.min_x, range_rect.min_x)
+            overlap_h = min(b.max_y, range_rect.max_y) - max(b.min_y, range_rect.min_y)
+            area = b.width * b.height
+            fraction = overlap_w * overlap_h / area if area > 0 else 0.5
+            node_error = max(fraction, 1 - fraction) * node.size
+            estimate += fraction * node.size
+            error += node_error
+            heapq.heappush(partial, (-node_error, next(tiebreak), fraction, node))
+        
+        classify(root)
+        while partial and error > max(max_error, relative_error * (exact + estimate)):
+            neg_error, _, fraction, node = heapq.heappop(partial)
+            estimate -= fraction * node.size
+            error += neg_error
+            exact += sum(1 for p in node.points if range_rect.contains(p))
+            if node.divided:
+                for child in (node.northwest, node.northeast, node.southwest, node.southeast):
+                    classify(child)
+        
+        # Evitar restos de redondeo al sumar y restar fracciones
+        if not partial:
+            estimate = error = 0.0
+        return exact + estimate, max(error, 0.0)
+    
+    def sample_range(self, range_rect: Rectangle, n: int, seed: Optional[int] = None) -> List[Point]:
+        """
+        Muestra aleatoria uniforme (sin reemplazo) de n puntos del rango, sin
+        enumerarlo. Se cubre el rango con los nodos que caen enteros dentro
+        (más los puntos sueltos de las hojas del borde), se eligen n índices
+        al azar sobre el total y cada índice se resuelve bajando por los
+        tamaños de los hijos. El trabajo es O(borde + n * profundidad).
+        Con seed el resultado es reproducible.
+        """
+        if n <= 0:
+            return []
+        # Cobertura del rango: nodos completos y puntos sueltos del borde
+        covers: List[QuadTreeNode] = []
+        loose: List[Point] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            b = node.boundary
+            if node.size == 0 or not b.intersects(range_rect):
+                continue
+            if range_rect.contains_rect(b):
+                covers.append(node)
+                continue
+            loose.extend(p for p in node.points if range_rect.contains(p))
+            if node.divided:
+                stack.extend((node.northwest, node.northeast, node.southwest, node.southeast))
+        
+        offsets = []  # índice inicial de cada nodo de la cobertura
+        total = len(loose)
+        for node in covers:
+            offsets.append(total)
+            total += node.size
+        
+        rng = random.Random(seed)
+        sample: List[Point] = []
+        for index in rng.sample(range(total), min(n, total)):
+            if index < len(loose):
+                sample.append(loose[index])
+            else:
+                i = bisect.bisect_right(offsets, index) - 1
+                sample.append(covers[i].point_at(index - offsets[i]))
+        return sample
+    
+    def filter_by_attribute(self, attribute_name: str, attribute_value: Any,
+                            since: Optional[float] = None, until: Optional[float] = None) -> List[Point]:
+        """Filtra puntos por un atributo específico (opcionalmente en una ventana de tiempo)"""
+        if since is not None or until is not None:
+            all_points = self.points_in_window(since, until)
+        else:
+            all_points = self.root.get_all_points()
         return [p for p in all_points 
-                if attribute_name in p.attributes 
-                and p.attributes[attribute_name] == attribute_value]
+                if p.get_attribute(attribute_name, _MISSING) == attribute_value]
     
-    def count_by_attribute(self, attribute_name: str, attribute_value: Any) -> int:
+    def count_by_attribute(self, attribute_name: str, attribute_value: Any,
+                           since: Optional[float] = None, until: Optional[float] = None) -> int:
         """Cuenta puntos con un atributo específico"""
-        return len(self.filter_by_attribute(attribute_name, attribute_value))
+        return len(self.filter_by_attribute(attribute_name, attribute_value, since, until))
+    
+    def points_in_window(self, since: Optional[float] = None,
+                         until: Optional[float] = None) -> List[Point]:
+        """Puntos con timestamp en [since, until]; poda los subárboles fuera de la ventana"""
+        found: List[Point] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not _node_in_window(node, since, until):
+                continue
+            found.extend(p for p in node.points if _in_window(p, since, until))
+            if node.divided:
+                stack.extend((node.northwest, node.northeast, node.southwest, node.southeast))
+        return found
     
     def count_points(self) -> int:
         """Cuenta el total de puntos en el árbol"""
@@ -0,0 +1,306 @@
+"""
+QuadTree con coordenadas cuantizadas a enteros de 16 o 32 bits
+Las coordenadas se guardan como enteros relativos al boundary en arreglos
+compactos (array 'H' o 'I') por hoja. La pertenencia y la poda se resuelven
+con comparaciones enteras exactas; las coordenadas en punto flotante solo se
+reconstruyen al devolver resultados.
+
+Garantía de precisión: con N = 2^bits - 1 pasos por eje,
+
+    paso_x = boundary.width / N
+    |x - x_guardado| <= paso_x / 2    (ídem en y)
+
+Por ejemplo, en un boundary de 1000 unidades: 16 bits -> error <= 0.0077,
+32 bits -> error <= 1.2e-7. Las consultas son exactas respecto de las
+coordenadas guardadas (las que se devuelven).
+"""
+import heapq
+import math
+from array import array
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from quadtree import Point, Rectangle, _attributes_match
+
+TYPECODES = {16: 'H', 32: 'I'}
+
+
+def _make_point(x: float, y: float, schema, values: tuple) -> Point:
+    """Crea un Point reutilizando el esquema y la tupla de valores guardados"""
+    point = Point(x, y)
+    point._schema = schema
+    point._values = values
+    return point
+
+
+class _QNode:
+    """Nodo sobre el rango entero [x0, x1) x [y0, y1)"""
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'xs', 'ys', 'schemas', 'values', 'children', 'size')
+
+    def __init__(self, x0: int, y0: int, x1: int, y1: int, typecode: str):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.xs = array(typecode)
+        self.ys = array(typecode)
+        self.schemas: list = []
+        self.values: List[tuple] = []
+        self.children: Optional[List['_QNode']] = None
+        self.size = 0
+
+    def child_index(self, qx: int, qy: int) -> int:
+        """Índice del hijo (NW, NE, SW, SE) que contiene la celda"""
+        return (qx >= (self.x0 + self.x1) // 2) + 2 * (qy >= (self.y0 + self.y1) // 2)
+
+
+class QuantizedQuadTree:
+    """QuadTree con coordenadas enteras cuantizadas respecto del boundary"""
+
+    def __init__(self, boundary: Rectangle, bits: int = 16, capacity: int = 16):
+        if bits not in TYPECODES:
+            raise ValueError("bits debe ser 16 o 32")
+        if boundary.width <= 0 or boundary.height <= 0:
+            raise ValueError("El boundary debe tener ancho y alto positivos")
+        self.boundary = boundary
+        self.bits = bits
+        self.capacity = capacity
+        self.typecode = TYPECODES[bits]
+        if array(self.typecode).itemsize * 8 < bits:
+            raise ValueError(f"Esta plataforma no tiene enteros de {bits} bits sin signo")
+
+        self.max_q = (1 << bits) - 1
+        self.min_x = boundary.min_x
+        self.min_y = boundary.min_y
+        self.step_x = boundary.width / self.max_q
+        self.step_y = boundary.height / self.max_q
+        # Máximo error absoluto por eje entre la coordenada original y la guardada
+        self.precision = (self.step_x / 2, self.step_y / 2)
+
+        self.root = _QNode(0, 0, self.max_q + 1, self.max_q + 1, self.typecode)
+
+    # ---- Cuantización ----
+
+    def quantize(self, x: float, y: float) -> Tuple[int, int]:
+        """Celda entera más cercana a (x, y)"""
+        qx = min(max(int(round((x - self.min_x) / self.step_x)), 0), self.max_q)
+        qy = min(max(int(round((y - self.min_y) / self.step_y)), 0), self.max_q)
+        return qx, qy
+
+    def dequantize(self, qx: int, qy: int) -> Tuple[float, float]:
+        """Coordenadas guardadas de una celda"""
+        return self.min_x + qx * self.step_x, self.min_y + qy * self.step_y
+
+    def _int_range(self, low: float, high: float, origin: float, step: float) -> Tuple[int, int]:
+        """Celdas cuyo valor guardado cae en [low, high] (inclusive)"""
+        lo = min(max(int(math.ceil((low - origin) / step)), 0), self.max_q + 1)
+        hi = min(max(int(math.floor((high - origin) / step)), -1), self.max_q)
+        # Corregir el redondeo para que el rango sea exacto respecto de dequantize
+        while lo > 0 and origin + (lo - 1) * step >= low:
+            lo -= 1
+        while lo <= self.max_q and origin + lo * step < low:
+            lo += 1
+        while hi < self.max_q and origin + (hi + 1) * step <= high:
+            hi += 1
+        while hi >= 0 and origin + hi * step > high:
+            hi -= 1
+        return lo, hi
+
+    def _point(self, node: _QNode, i: int) -> Point:
+        x, y = self.dequantize(node.xs[i], node.ys[i])
+        return _make_point(x, y, node.schemas[i], node.values[i])
+
+    # ---- Modificación ----
+
+    def insert(self, point: Point) -> bool:
+        """Inserta un punto (se guarda con su posición cuantizada)"""
+        if not self.boundary.contains(point):
+            return False
+        qx, qy = self.quantize(point.x, point.y)
+
+        node = self.root
+        while True:
+            node.size += 1
+            if node.children is None:
+                node.xs.append(qx)
+                node.ys.append(qy)
+                node.schemas.append(point._schema)
+                node.values.append(point._values)
+                if len(node.xs) > self.capacity and (node.x1 - node.x0 > 1 or node.y1 - node.y0 > 1):
+                    self._split(node)
+                return True
+            node = node.children[node.child_index(qx, qy)]
+
+    def insert_many(self, points: List[Point]) -> int:
+        """Inserta varios puntos. Retorna cuántos quedaron dentro del boundary"""
+        return sum(1 for p in points if self.insert(p))
+
+    def _split(self, node: _QNode):
+        """Reparte los puntos de una hoja en cuatro hijos"""
+        mx = (node.x0 + node.x1) // 2
+        my = (node.y0 + node.y1) // 2
+        node.children = [
+            _QNode(node.x0, node.y0, mx, my, self.typecode),
+            _QNode(mx, node.y0, node.x1, my, self.typecode),
+            _QNode(node.x0, my, mx, node.y1, self.typecode),
+            _QNode(mx, my, node.x1, node.y1, self.typecode),
+        ]
+        for i in range(len(node.xs)):
+            child = node.children[node.child_index(node.xs[i], node.ys[i])]
+            child.xs.append(node.xs[i])
+            child.ys.append(node.ys[i])
+            child.schemas.append(node.schemas[i])
+            child.values.append(node.values[i])
+            child.size += 1
+        node.xs = array(self.typecode)
+        node.ys = array(self.typecode)
+        node.schemas = []
+        node.values = []
+
+        # Si todo cayó en un mismo hijo, seguir dividiendo ese hijo
+        for child in node.children:
+            if len(child.xs) > self.capacity and (child.x1 - child.x0 > 1 or child.y1 - child.y0 > 1):
+                self._split(child)
+
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto (por posición cuantizada y atributos)"""
+        if not self.boundary.contains(point):
+            return False
+        qx, qy = self.quantize(point.x, point.y)
+        attributes = point.attributes
+
+        path = []
+        node = self.root
+        while node.children is not None:
+            path.append(node)
+            node = node.children[node.child_index(qx, qy)]
+
+        for i in range(len(node.xs)):
+            if node.xs[i] != qx or node.ys[i] != qy:
+                continue
+            if node.schemas[i] is point._schema:
+                same = node.values[i] == point._values
+            else:
+                same = dict(zip(node.schemas[i].keys, node.values[i])) == attributes
+            if same:
+                del node.xs[i]
+                del node.ys[i]
+                del node.schemas[i]
+                del node.values[i]
+                node.size -= 1
+                for ancestor in path:
+                    ancestor.size -= 1
+                return True
+        return False
+
+    # ---- Consultas ----
+
+    def _collect(self, node: _QNode, found: List[Point]):
+        """Agrega todos los puntos del subárbol"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(node.children)
+            else:
+                found.extend(self._point(node, i) for i in range(len(node.xs)))
+
+    def query_range(self, range_rect: Rectangle) -> List[Point]:
+        """Consulta de rango con comparaciones enteras"""
+        qx0, qx1 = self._int_range(range_rect.min_x, range_rect.max_x, self.min_x, self.step_x)
+        qy0, qy1 = self._int_range(range_rect.min_y, range_rect.max_y, self.min_y, self.step_y)
+        found: List[Point] = []
+        if qx0 > qx1 or qy0 > qy1:
+            return found
+
+        min_x, min_y, step_x, step_y = self.min_x, self.min_y, self.step_x, self.step_y
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if (node.size == 0 or node.x0 > qx1 or node.x1 - 1 < qx0
+                    or node.y0 > qy1 or node.y1 - 1 < qy0):
+                continue
+            if qx0 <= node.x0 and node.x1 - 1 <= qx1 and qy0 <= node.y0 and node.y1 - 1 <= qy1:
+                self._collect(node, found)
+            elif node.children is not None:
+                stack.extend(node.children)
+            else:
+                ys = node.ys
+                for i, qx in enumerate(node.xs):
+                    qy = ys[i]
+                    if qx0 <= qx <= qx1 and qy0 <= qy <= qy1:
+                        found.append(_make_point(min_x + qx * step_x, min_y + qy * step_y,
+                                                 node.schemas[i], node.values[i]))
+        return found
+
+    def _node_distance(self, node: _QNode, x: float, y: float) -> float:
+        """Distancia mínima desde (x, y) a las posiciones guardables del nodo"""
+        min_x, min_y = self.dequantize(node.x0, node.y0)
+        max_x, max_y = self.dequantize(node.x1 - 1, node.y1 - 1)
+        dx = max(min_x - x, 0, x - max_x)
+        dy = max(min_y - y, 0, y - max_y)
+        return math.sqrt(dx * dx + dy * dy)
+
+    def nearest_neighbor(self, query_point: Point, where: Dict[str, Any] = None) -> Optional[Point]:
+        """Vecino más cercano (best-first); where filtra por atributos"""
+        predicate = _attributes_match(where) if where else None
+        x, y = query_point.x, query_point.y
+        tiebreak = count()
+        heap = [(self._node_distance(self.root, x, y), next(tiebreak), self.root)]
+        best: Optional[Tuple[float, Point]] = None
+
+        while heap:
+            dist, _, node = heapq.heappop(heap)
+            if best is not None and dist > best[0]:
+                break
+            if node.children is not None:
+                for child in node.children:
+                    if child.size:
+                        heapq.heappush(heap, (self._node_distance(child, x, y), next(tiebreak), child))
+                continue
+            for i in range(len(node.xs)):
+                px, py = self.dequantize(node.xs[i], node.ys[i])
+                d = math.sqrt((px - x) ** 2 + (py - y) ** 2)
+                if best is None or d < best[0]:
+                    point = _make_point(px, py, node.schemas[i], node.values[i])
+                    if predicate is None or predicate(point):
+                        best = (d, point)
+        return best[1] if best else None
+
+    def filter_by_attribute(self, attribute_name: str, attribute_value: Any) -> List[Point]:
+        """Filtra puntos por un atributo específico"""
+        found: List[Point] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(node.children)
+                continue
+            for i, schema in enumerate(node.schemas):
+                j = schema.index.get(attribute_name)
+                if j is not None and node.values[i][j] == attribute_value:
+                    found.append(self._point(node, i))
+        return found
+
+    def count_by_attribute(self, attribute_name: str, attribute_value: Any) -> int:
+        """Cuenta puntos con un atributo específico"""
+        return len(self.filter_by_attribute(attribute_name, attribute_value))
+
+    def count_points(self) -> int:
+        """Total de puntos"""
+        return self.root.size
+
+    def get_all_points(self) -> List[Point]:
+        """Todos los puntos, con sus coordenadas guardadas"""
+        found: List[Point] = []
+        self._collect(self.root, found)
+        return found
+
+    def coordinate_bytes(self) -> int:
+        """Bytes usados por las coordenadas cuantizadas"""
+        total = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(node.children)
+            else:
+                total += node.xs.itemsize * (len(node.xs) + len(node.ys))
+        return total
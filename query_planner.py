@@ -0,0 +1,247 @@
+"""
+Planificador de consultas por costo sobre un QuadTree
+
+Para cada consulta (rango y/o atributos) se estima cuántos puntos resultan y
+se elige el plan más barato:
+  - tree_walk:        recorrido del árbol (QuadTree.query_range)
+  - flat_scan:        máscara de NumPy sobre arreglos planos de x e y
+  - attribute_index:  candidatos desde un índice valor -> puntos del atributo
+                      más selectivo; luego se verifica el rango y el resto
+  - spatial_first:    candidatos del rango (por tree_walk o flat_scan, lo que
+                      sea más barato) y luego el filtro de atributos
+
+Estimaciones:
+  - puntos en el rango: QuadTree.estimate_count (tamaños de subárboles), con
+    un error relativo a la propia estimación del rango
+  - atributos: conteo exacto si el índice del atributo está al día o si es
+    la categoría (resumen de la raíz); si no, DEFAULT_SELECTIVITY
+
+Los arreglos planos y los índices se construyen a demanda y quedan
+desactualizados con cualquier cambio del árbol (se escucha con un listener);
+reconstruirlos forma parte del costo del plan que los usa, así que con muchas
+actualizaciones el planificador prefiere el árbol. explain() muestra el plan
+elegido con las estimaciones y el costo de cada alternativa.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from quadtree import QuadTree, Point, Rectangle, SUMMARY_ATTRIBUTE, _attributes_match, _MISSING
+
+# Costos en segundos por unidad de trabajo (medidos con 200k puntos)
+DEFAULT_COSTS = {
+    'tree_node': 2e-6,        # nodo visitado en el recorrido del árbol
+    'tree_result': 1.5e-6,    # punto devuelto por el recorrido del árbol
+    'scan_point': 2e-9,       # punto evaluado por la máscara de NumPy
+    'scan_result': 2.5e-7,    # punto devuelto por la máscara
+    'scan_build': 1e-6,       # punto copiado a los arreglos planos
+    'index_build': 5e-7,      # punto agregado a un índice de atributo
+    'contains': 4e-7,         # verificación de rango en Python
+    'filter': 1.5e-6,         # verificación de atributos en Python
+}
+
+# Fracción supuesta de puntos que cumple una condición sin estadísticas
+DEFAULT_SELECTIVITY = 0.1
+
+# Error admitido al estimar los puntos de un rango, relativo a la estimación
+# (con al menos un punto de margen para los rangos casi vacíos)
+RANGE_ESTIMATE_ERROR = 0.2
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class QueryPlanner:
+    """Elige entre recorrido del árbol, escaneo vectorizado o índice de atributos"""
+
+    def __init__(self, quadtree: QuadTree, costs: Optional[Dict[str, float]] = None):
+        self.quadtree = quadtree
+        self.costs = dict(DEFAULT_COSTS, **(costs or {}))
+        self.last_plan: Optional[Dict[str, Any]] = None
+
+        self._version = 0
+        # Arreglos planos: (versión, puntos, xs, ys)
+        self._flat: Optional[Tuple[int, List[Point], np.ndarray, np.ndarray]] = None
+        # Índices por atributo: nombre -> (versión, {valor: [puntos]})
+        self._indexes: Dict[str, Tuple[int, Dict[Any, List[Point]]]] = {}
+        quadtree.add_listener(self._on_change)
+
+    def close(self):
+        """Deja de escuchar los cambios del árbol"""
+        self.quadtree.remove_listener(self._on_change)
+
+    def _on_change(self, event: str, point: Point, old_position: Optional[Tuple[float, float]]):
+        self._version += 1
+
+    # ---- Estructuras auxiliares ----
+
+    def _flat_fresh(self) -> bool:
+        return self._flat is not None and self._flat[0] == self._version
+
+    def _flat_arrays(self) -> Tuple[List[Point], np.ndarray, np.ndarray]:
+        """Puntos y sus coordenadas en arreglos de NumPy (se reconstruyen si cambió el árbol)"""
+        if not self._flat_fresh():
+            points = self.quadtree.get_all_points()
+            xs = np.fromiter((p.x for p in points), dtype=np.float64, count=len(points))
+            ys = np.fromiter((p.y for p in points), dtype=np.float64, count=len(points))
+            self._flat = (self._version, points, xs, ys)
+        return self._flat[1], self._flat[2], self._flat[3]
+
+    def _index_fresh(self, name: str) -> bool:
+        entry = self._indexes.get(name)
+        return entry is not None and entry[0] == self._version
+
+    def attribute_index(self, name: str) -> Dict[Any, List[Point]]:
+        """Índice valor -> puntos de un atributo (los valores no hashables se omiten)"""
+        if not self._index_fresh(name):
+            index: Dict[Any, List[Point]] = {}
+            points = self._flat[1] if self._flat_fresh() else self.quadtree.get_all_points()
+            for point in points:
+                value = point.get_attribute(name, _MISSING)
+                if value is _MISSING:
+                    continue
+                try:
+                    index.setdefault(value, []).append(point)
+                except TypeError:
+                    pass
+            self._indexes[name] = (self._version, index)
+        return self._indexes[name][1]
+
+    # ---- Estimaciones ----
+
+    def _estimate_range(self, rect: Rectangle) -> Tuple[float, float]:
+        """(puntos estimados en el rango, cota del error)"""
+        return self.quadtree.estimate_count(rect, 1.0, RANGE_ESTIMATE_ERROR)
+
+    def _estimate_attribute(self, name: str, value: Any, n: int) -> Tuple[float, str]:
+        """(puntos estimados con name == value, fuente de la estimación)"""
+        if not _hashable(value):
+            return DEFAULT_SELECTIVITY * n, 'default'
+        if self._index_fresh(name):
+            return float(len(self._indexes[name][1].get(value, ()))), 'index'
+        if name == SUMMARY_ATTRIBUTE:
+            return float(self.quadtree.root.categories.get(value, 0)), 'summary'
+        return DEFAULT_SELECTIVITY * n, 'default'
+
+    def _tree_nodes(self, rect: Rectangle, rows: float, n: int) -> float:
+        """Nodos que visita el recorrido: los del resultado más los del borde del rango"""
+        root = self.quadtree.root
+        leaf_points = max(1, root.capacity)
+        depth = math.log(max(n / leaf_points, 1), 4) + 1
+        inside = min(rect.width, root.boundary.width) + min(rect.height, root.boundary.height)
+        perimeter = 2 * inside / max(root.boundary.width, root.boundary.height, 1e-12)
+        border = perimeter * math.sqrt(max(n / leaf_points, 1))
+        return rows / leaf_points * 4 / 3 + border + 4 * depth
+
+    # ---- Planificación ----
+
+    def _plan(self, rect: Optional[Rectangle], where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        c = self.costs
+        n = self.quadtree.root.size
+        plans: Dict[str, float] = {}
+        estimates: Dict[str, Any] = {'points': n}
+
+        scan_build = 0.0 if self._flat_fresh() else c['scan_build'] * n
+        if rect is not None:
+            rows, error = self._estimate_range(rect)
+            estimates['range_rows'] = round(rows, 1)
+            estimates['range_error'] = round(error, 1)
+            access = {
+                'tree_walk': c['tree_node'] * self._tree_nodes(rect, rows, n) + c['tree_result'] * rows,
+                'flat_scan': scan_build + c['scan_point'] * n + c['scan_result'] * rows,
+            }
+        else:
+            rows = float(n)
+            access = {'flat_scan': scan_build + c['scan_result'] * n}
+
+        if not where:
+            plans.update(access)
+            best = min(plans, key=plans.get)
+            return {'plan': best, 'access': best, 'estimated_rows': round(rows, 1),
+                    'estimates': estimates, 'costs': plans}
+
+        # Selectividad de cada condición (se suponen independientes)
+        conditions = {}
+        selectivity = 1.0
+        for name, value in where.items():
+            count, source = self._estimate_attribute(name, value, n)
+            conditions[name] = {'rows': round(count, 1), 'source': source}
+            selectivity *= count / n if n else 0.0
+        estimates['where'] = conditions
+
+        best_access = min(access, key=access.get)
+        plans['spatial_first'] = access[best_access] + c['filter'] * rows
+        # El índice parte del atributo más selectivo (con valor hashable)
+        indexable = [name for name, value in where.items() if _hashable(value)]
+        if indexable:
+            lookup = min(indexable, key=lambda name: conditions[name]['rows'])
+            candidates = conditions[lookup]['rows']
+            build = 0.0 if self._index_fresh(lookup) else c['index_build'] * n
+            check = c['filter'] * candidates if len(where) > 1 else 0.0
+            if rect is not None:
+                check += c['contains'] * candidates
+            plans['attribute_index'] = build + check
+
+        best = min(plans, key=plans.get)
+        plan = {'plan': best, 'estimated_rows': round(rows * selectivity, 1),
+                'estimates': estimates, 'costs': plans}
+        if best == 'spatial_first':
+            plan['access'] = best_access
+        else:
+            plan['index'] = lookup
+        return plan
+
+    def explain(self, rect: Optional[Rectangle] = None,
+                where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Plan elegido sin ejecutarlo: {'plan', 'access' o 'index',
+        'estimated_rows', 'estimates', 'costs'} con el costo estimado (en
+        segundos) de cada alternativa considerada
+        """
+        return self._plan(rect, where)
+
+    # ---- Ejecución ----
+
+    def _range(self, access: str, rect: Optional[Rectangle]) -> List[Point]:
+        if access == 'tree_walk':
+            return self.quadtree.query_range(rect)
+        points, xs, ys = self._flat_arrays()
+        if rect is None:
+            return list(points)
+        mask = (xs >= rect.min_x) & (xs <= rect.max_x) & (ys >= rect.min_y) & (ys <= rect.max_y)
+        return [points[i] for i in np.flatnonzero(mask)]
+
+    def query(self, rect: Optional[Rectangle] = None,
+              where: Optional[Dict[str, Any]] = None) -> List[Point]:
+        """Puntos en el rango (opcional) que cumplen where (opcional), con el plan más barato"""
+        plan = self._plan(rect, where)
+        self.last_plan = plan
+        if plan['plan'] in ('tree_walk', 'flat_scan'):
+            return self._range(plan['access'], rect)
+
+        predicate = _attributes_match(where)
+        if plan['plan'] == 'spatial_first':
+            return [p for p in self._range(plan['access'], rect) if predicate(p)]
+
+        name = plan['index']
+        candidates = self.attribute_index(name).get(where[name], [])
+        if len(where) > 1:
+            candidates = [p for p in candidates if predicate(p)]
+        if rect is not None:
+            candidates = [p for p in candidates if rect.contains(p)]
+        return list(candidates)
+
+    def query_range(self, rect: Rectangle, where: Optional[Dict[str, Any]] = None) -> List[Point]:
+        """Consulta de rango planificada"""
+        return self.query(rect, where)
+
+    def filter_by_attribute(self, attribute_name: str, attribute_value: Any,
+                            rect: Optional[Rectangle] = None) -> List[Point]:
+        """Filtrado por atributo planificado (opcionalmente dentro de un rango)"""
+        return self.query(rect, {attribute_name: attribute_value})
@@ -0,0 +1,271 @@
+"""
+Servidor asyncio que expone un QuadTree por TCP o socket Unix
+Protocolo: cada mensaje es un entero de 4 bytes (big-endian) con la longitud
+seguido de un objeto JSON compacto.
+
+Peticiones:  {"id": 1, "op": "range", "x": 500, "y": 500, "w": 200, "h": 200}
+             {"id": 2, "op": "nearest", "x": 400, "y": 400}
+             {"id": 3, "op": "filter", "attr": "category", "value": "Hospital"}
+             {"id": 4, "op": "insert", "x": 10, "y": 20, "attributes": {...}, "timestamp": 1700000000}
+             {"id": 5, "op": "count"}
+range, nearest y filter aceptan además "since" / "until" (ventana de tiempo).
+Con ttl, los puntos insertados sin timestamp reciben la hora actual y una
+tarea de fondo expira periódicamente los que superan esa antigüedad.
+Respuestas:  {"id": 1, "ok": true, "result": ...} o {"id": 1, "ok": false, "error": "..."}
+
+Las peticiones concurrentes se agrupan en lotes que se resuelven juntos sobre
+una misma instantánea del árbol; las consultas range de un lote con la misma
+ventana de tiempo se resuelven en un solo recorrido (QuadTree.query_ranges).
+"""
+import asyncio
+import json
+import struct
+import time
+from typing import Any, List, Optional, Tuple
+
+from quadtree import Point, Rectangle
+from concurrent_quadtree import ConcurrentQuadTree
+
+HEADER = struct.Struct('>I')
+MAX_MESSAGE = 16 * 1024 * 1024
+
+
+def point_to_dict(point: Point) -> dict:
+    """Convierte un Point a diccionario para la respuesta"""
+    data = {'x': point.x, 'y': point.y, **point.attributes}
+    if point.timestamp is not None:
+        data['timestamp'] = point.timestamp
+    return data
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Lee un mensaje enmarcado; retorna None si el otro extremo cerró (aun a mitad de un mensaje)"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE:
+        raise ValueError(f"Mensaje demasiado grande: {length} bytes")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        # Cerró a mitad del mensaje: no hay petición que responder
+        return None
+    return json.loads(payload)
+
+
+def encode_message(message: dict) -> bytes:
+    """Serializa un mensaje con su cabecera de longitud"""
+    payload = json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return HEADER.pack(len(payload)) + payload
+
+
+def _request_rect(request: dict) -> Rectangle:
+    """Rectángulo de una petición range"""
+    return Rectangle(float(request['x']), float(request['y']),
+                     float(request['w']), float(request['h']))
+
+
+def _request_id(request) -> Any:
+    """Id de una petición (None si no es un objeto)"""
+    return request.get('id') if isinstance(request, dict) else None
+
+
+class QuadTreeServer:
+    """Servidor con un índice caliente compartido por todos los clientes"""
+
+    def __init__(self, quadtree: ConcurrentQuadTree, max_batch: int = 256,
+                 ttl: Optional[float] = None, expire_every: float = 1.0,
+                 expire_batch: int = 10000):
+        self.quadtree = quadtree
+        self.max_batch = max_batch
+        # Expiración: antigüedad máxima (segundos), período y tope por pasada
+        self.ttl = ttl
+        self.expire_every = expire_every
+        self.expire_batch = expire_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._expirer: Optional[asyncio.Task] = None
+
+    def _execute_batch(self, batch: List[Tuple[dict, asyncio.Future]]) -> List[dict]:
+        """
+        Resuelve un lote: escrituras primero, luego lecturas sobre una
+        instantánea. Los range con la misma ventana de tiempo comparten un
+        recorrido del árbol; el resto se resuelve de a una petición.
+        """
+        responses = [None] * len(batch)
+
+        for i, (request, _) in enumerate(batch):
+            if request.get('op') == 'insert':
+                responses[i] = self._handle(request, self.quadtree)
+
+        snapshot = self.quadtree.snapshot()
+        groups = {}
+        for i, (request, _) in enumerate(batch):
+            if request.get('op') != 'range':
+                continue
+            try:
+                rect = _request_rect(request)
+                window = (request.get('since'), request.get('until'))
+                groups.setdefault(window, []).append((i, rect))
+            except (KeyError, TypeError, ValueError):
+                # Petición inválida: _handle responde el error
+                continue
+        for (since, until), group in groups.items():
+            try:
+                results = snapshot.query_ranges([rect for _, rect in group], since, until)
+            except (TypeError, ValueError):
+                continue
+            for (i, _), found in zip(group, results):
+                responses[i] = {'id': batch[i][0].get('id'), 'ok': True,
+                                'result': [point_to_dict(p) for p in found]}
+
+        for i, (request, _) in enumerate(batch):
+            if responses[i] is None:
+                responses[i] = self._handle(request, snapshot)
+        return responses
+
+    def _handle(self, request: dict, tree) -> dict:
+        """Ejecuta una petición individual"""
+        op = request.get('op')
+        try:
+            since, until = request.get('since'), request.get('until')
+            if op == 'range':
+                result = [point_to_dict(p) for p in tree.query_range(_request_rect(request),
+                                                                     since, until)]
+            elif op == 'nearest':
+                nearest = tree.nearest_neighbor(Point(float(request['x']), float(request['y'])),
+                                                since=since, until=until)
+                result = point_to_dict(nearest) if nearest else None
+            elif op == 'filter':
+                result = [point_to_dict(p)
+                          for p in tree.filter_by_attribute(request['attr'], request['value'],
+                                                            since, until)]
+            elif op == 'insert':
+                timestamp = request.get('timestamp')
+                if timestamp is None and self.ttl is not None:
+                    timestamp = time.time()
+                point = Point(float(request['x']), float(request['y']),
+                              request.get('attributes') or {}, timestamp)
+                result = tree.insert(point)
+            elif op == 'count':
+                result = tree.count_points()
+            else:
+                raise ValueError(f"Operación desconocida: {op}")
+        except (KeyError, TypeError, ValueError) as e:
+            return {'id': request.get('id'), 'ok': False, 'error': str(e)}
+        return {'id': request.get('id'), 'ok': True, 'result': result}
+
+    async def _run_batches(self):
+        """Agrupa las peticiones pendientes y las resuelve en un hilo aparte"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                responses = await loop.run_in_executor(None, self._execute_batch, batch)
+            except Exception as e:
+                # Un lote fallido responde error a sus peticiones; el lote
+                # siguiente se atiende igual
+                responses = [{'id': _request_id(req), 'ok': False, 'error': str(e)}
+                             for req, _ in batch]
+
+            for (_, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    async def _run_expiry(self):
+        """Expira de a pasos acotados los puntos más antiguos que ttl"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.expire_every)
+            removed = self.expire_batch
+            # Si la pasada llenó el tope, seguir sin esperar al próximo período
+            while removed >= self.expire_batch:
+                removed = await loop.run_in_executor(
+                    None, self.quadtree.expire, time.time() - self.ttl, self.expire_batch)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Atiende a un cliente: cada petición se responde en cuanto termina su lote"""
+        loop = asyncio.get_running_loop()
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def reply(future):
+            response = await future
+            async with write_lock:
+                writer.write(encode_message(response))
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (ValueError, json.JSONDecodeError) as e:
+                    async with write_lock:
+                        writer.write(encode_message({'id': None, 'ok': False, 'error': str(e)}))
+                        await writer.drain()
+                    break
+                if request is None:
+                    break
+                if not isinstance(request, dict):
+                    # Marco válido pero no es una petición: se rechaza sin encolar
+                    async with write_lock:
+                        writer.write(encode_message({'id': None, 'ok': False,
+                                                     'error': "La petición debe ser un objeto JSON"}))
+                        await writer.drain()
+                    continue
+
+                future = loop.create_future()
+                await self._queue.put((request, future))
+                task = asyncio.ensure_future(reply(future))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765,
+                    unix_path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Inicia el servidor TCP (o Unix si se indica unix_path)"""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        if self.ttl is not None:
+            self._expirer = asyncio.ensure_future(self._run_expiry())
+        if unix_path:
+            return await asyncio.start_unix_server(self._handle_client, path=unix_path)
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def serve_forever(self, host: str = '127.0.0.1', port: int = 8765,
+                            unix_path: Optional[str] = None):
+        """Inicia el servidor y atiende hasta ser interrumpido"""
+        server = await self.start(host, port, unix_path)
+        async with server:
+            await server.serve_forever()
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, message: dict) -> dict:
+    """Cliente mínimo: envía una petición y espera su respuesta"""
+    writer.write(encode_message(message))
+    await writer.drain()
+    return await read_message(reader)
+
+
+def build_tree_from_records(data: List[dict], boundary: Rectangle = None,
+                            capacity: int = 4) -> ConcurrentQuadTree:
+    """Construye el índice del servidor a partir de registros con x, y"""
+    if boundary is None:
+        boundary = Rectangle(500, 500, 1000, 1000)
+    qt = ConcurrentQuadTree(boundary, capacity)
+    qt.insert_many([
+        Point(item['x'], item['y'], {k: v for k, v in item.items() if k not in ['x', 'y']})
+        for item in data if 'x' in item and 'y' in item
+    ])
+    return qt
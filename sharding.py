@@ -0,0 +1,287 @@
+"""
+Índice espacial particionado en shards atendidos por procesos locales
+El boundary se divide en una grilla de 2^depth x 2^depth celdas (los
+cuadrantes del nivel depth); cada celda es un QuadTree independiente que vive
+en su propio proceso. Un enrutador envía cada inserción al shard dueño y
+reparte las consultas solo entre los shards cuyo boundary intersecta.
+
+Los puntos viajan entre procesos por copia (pickle): los resultados son
+copias, y remove/move identifican el punto por coordenadas y atributos.
+"""
+import heapq
+import multiprocessing
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from quadtree import QuadTree, Point, Rectangle
+
+
+def _shard_call(qt: QuadTree, op: str, args: tuple):
+    """Ejecuta una operación sobre el QuadTree de un shard"""
+    if op == 'insert_many':
+        return sum(1 for p in args[0] if qt.insert(p))
+    if op == 'k_nearest':
+        query_point, k, where = args
+        return [(query_point.distance_to(p), p)
+                for p in islice(qt.iter_nearest(query_point, where=where), k)]
+    return getattr(qt, op)(*args)
+
+
+def _shard_worker(conn, boundary: Rectangle, capacity: int, indexed_attributes: tuple):
+    """Loop de un proceso shard: recibe (op, args) y responde (ok, resultado)"""
+    qt = QuadTree(boundary, capacity, indexed_attributes)
+    while True:
+        try:
+            op, args = conn.recv()
+        except EOFError:
+            break
+        if op == 'close':
+            break
+        try:
+            conn.send((True, _shard_call(qt, op, args)))
+        except Exception as e:
+            conn.send((False, e))
+    conn.close()
+
+
+class _LocalShard:
+    """Shard en el mismo proceso (misma interfaz, útil para pruebas y depuración)"""
+
+    def __init__(self, boundary: Rectangle, capacity: int, indexed_attributes: tuple):
+        self.quadtree = QuadTree(boundary, capacity, indexed_attributes)
+        self._result = None
+
+    def send(self, op: str, args: tuple):
+        # Igual que un proceso: el error se entrega al recibir la respuesta
+        try:
+            self._result = (True, _shard_call(self.quadtree, op, args))
+        except Exception as e:
+            self._result = (False, e)
+
+    def recv(self):
+        ok, result = self._result
+        self._result = None
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """Shard atendido por un proceso propio"""
+
+    def __init__(self, boundary: Rectangle, capacity: int, indexed_attributes: tuple, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_shard_worker,
+                                   args=(child_conn, boundary, capacity, indexed_attributes),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def send(self, op: str, args: tuple):
+        self.conn.send((op, args))
+
+    def recv(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        try:
+            self.conn.send(('close', ()))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ShardedQuadTree:
+    """Enrutador sobre 4^depth shards de QuadTree"""
+
+    def __init__(self, boundary: Rectangle, depth: int = 1, capacity: int = 4,
+                 indexed_attributes: Tuple[str, ...] = (), use_processes: bool = True):
+        if depth < 0:
+            raise ValueError("depth no puede ser negativo")
+        self.boundary = boundary
+        self.side = 2 ** depth
+        self.min_x = boundary.x - boundary.half_width
+        self.min_y = boundary.y - boundary.half_height
+        self.cell_width = boundary.width / self.side
+        self.cell_height = boundary.height / self.side
+
+        ctx = multiprocessing.get_context() if use_processes else None
+        self.shard_bounds: List[Rectangle] = []
+        self.shards = []
+        for iy in range(self.side):
+            for ix in range(self.side):
+                rect = Rectangle(self.min_x + (ix + 0.5) * self.cell_width,
+                                 self.min_y + (iy + 0.5) * self.cell_height,
+                                 self.cell_width, self.cell_height)
+                self.shard_bounds.append(rect)
+                if use_processes:
+                    self.shards.append(_ProcessShard(rect, capacity, tuple(indexed_attributes), ctx))
+                else:
+                    self.shards.append(_LocalShard(rect, capacity, tuple(indexed_attributes)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Detiene los procesos de los shards"""
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+    def shard_for(self, point: Point) -> Optional[int]:
+        """Índice del shard dueño del punto (None si está fuera del boundary)"""
+        if not self.boundary.contains(point):
+            return None
+        ix = min(int((point.x - self.min_x) / self.cell_width), self.side - 1)
+        iy = min(int((point.y - self.min_y) / self.cell_height), self.side - 1)
+        if self.shard_bounds[iy * self.side + ix].contains(point):
+            return iy * self.side + ix
+        # Redondeo justo en un borde de celda: probar las vecinas
+        for jy in (iy - 1, iy, iy + 1):
+            for jx in (ix - 1, ix, ix + 1):
+                if 0 <= jx < self.side and 0 <= jy < self.side:
+                    if self.shard_bounds[jy * self.side + jx].contains(point):
+                        return jy * self.side + jx
+        return None
+
+    def _gather(self, indices: List[int]) -> List[Any]:
+        """
+        Recibe la respuesta de cada shard. Se leen todas antes de propagar un
+        error: una sin leer quedaría en el canal y la recibiría la llamada
+        siguiente.
+        """
+        results = []
+        error = None
+        for i in indices:
+            try:
+                results.append(self.shards[i].recv())
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+        return results
+
+    def _fan_out(self, indices: List[int], op: str, args: tuple) -> List[Any]:
+        """Envía la operación a varios shards a la vez y junta las respuestas"""
+        for i in indices:
+            self.shards[i].send(op, args)
+        return self._gather(indices)
+
+    def _call(self, index: int, op: str, args: tuple):
+        return self._fan_out([index], op, args)[0]
+
+    def insert(self, point: Point) -> bool:
+        """Inserta un punto en su shard"""
+        index = self.shard_for(point)
+        if index is None:
+            return False
+        return self._call(index, 'insert', (point,))
+
+    def insert_many(self, points: List[Point]) -> int:
+        """Inserta varios puntos enviando un lote por shard"""
+        batches: Dict[int, List[Point]] = {}
+        for point in points:
+            index = self.shard_for(point)
+            if index is not None:
+                batches.setdefault(index, []).append(point)
+        indices = list(batches)
+        for i in indices:
+            self.shards[i].send('insert_many', (batches[i],))
+        return sum(self._gather(indices))
+
+    def remove(self, point: Point) -> bool:
+        """Elimina un punto (por coordenadas y atributos)"""
+        index = self.shard_for(point)
+        if index is None:
+            return False
+        return self._call(index, 'remove', (point,))
+
+    def move(self, point: Point, new_x: float, new_y: float,
+             timestamp: Optional[float] = None) -> bool:
+        """Mueve un punto, cambiándolo de shard si hace falta"""
+        old_index = self.shard_for(point)
+        moved = Point(new_x, new_y, point.attributes,
+                      point.timestamp if timestamp is None else timestamp)
+        new_index = self.shard_for(moved)
+        if old_index is None or new_index is None:
+            return False
+        if old_index == new_index:
+            return self._call(old_index, 'move', (point, new_x, new_y, timestamp))
+        if not self._call(old_index, 'remove', (point,)):
+            return False
+        return self._call(new_index, 'insert', (moved,))
+
+    def _shards_intersecting(self, rect: Rectangle) -> List[int]:
+        return [i for i, b in enumerate(self.shard_bounds) if b.intersects(rect)]
+
+    def query_range(self, range_rect: Rectangle, since: Optional[float] = None,
+                    until: Optional[float] = None) -> List[Point]:
+        """Consulta de rango repartida solo entre los shards que intersectan"""
+        found: List[Point] = []
+        for part in self._fan_out(self._shards_intersecting(range_rect), 'query_range',
+                                  (range_rect, since, until)):
+            found.extend(part)
+        return found
+
+    def expire(self, older_than: float, max_points: Optional[int] = None) -> int:
+        """Expira puntos antiguos en todos los shards a la vez (max_points por shard)"""
+        return sum(self._fan_out(list(range(len(self.shards))), 'expire', (older_than, max_points)))
+
+    def k_nearest(self, query_point: Point, k: int,
+                  where: Dict[str, Any] = None) -> List[Point]:
+        """
+        Los k vecinos más cercanos. Primero se consulta el shard más cercano;
+        luego, en paralelo, solo los shards cuya distancia mínima no supera la
+        k-ésima mejor distancia encontrada.
+        """
+        if k <= 0:
+            return []
+        order = sorted(range(len(self.shards)),
+                       key=lambda i: self.shard_bounds[i].distance_to_point(query_point))
+        candidates = self._call(order[0], 'k_nearest', (query_point, k, where))
+
+        def bound():
+            if len(candidates) < k:
+                return float('inf')
+            return max(d for d, _ in candidates)
+
+        limit = bound()
+        rest = [i for i in order[1:]
+                if self.shard_bounds[i].distance_to_point(query_point) <= limit]
+        for part in self._fan_out(rest, 'k_nearest', (query_point, k, where)):
+            candidates.extend(part)
+
+        return [p for _, p in heapq.nsmallest(k, candidates, key=lambda c: c[0])]
+
+    def nearest_neighbor(self, query_point: Point, where: Dict[str, Any] = None) -> Optional[Point]:
+        """Vecino más cercano sobre todos los shards"""
+        result = self.k_nearest(query_point, 1, where)
+        return result[0] if result else None
+
+    def filter_by_attribute(self, attribute_name: str, attribute_value: Any) -> List[Point]:
+        """Filtra puntos por atributo en todos los shards"""
+        found: List[Point] = []
+        for part in self._fan_out(list(range(len(self.shards))), 'filter_by_attribute',
+                                  (attribute_name, attribute_value)):
+            found.extend(part)
+        return found
+
+    def count_by_attribute(self, attribute_name: str, attribute_value: Any) -> int:
+        """Cuenta puntos con un atributo en todos los shards"""
+        return sum(self._fan_out(list(range(len(self.shards))), 'count_by_attribute',
+                                 (attribute_name, attribute_value)))
+
+    def count_points(self) -> int:
+        """Total de puntos en todos los shards"""
+        return sum(self._fan_out(list(range(len(self.shards))), 'count_points', ()))
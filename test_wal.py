@@ -0,0 +1,98 @@
+"""
+Pruebas del registro de actualizaciones (wal.py)
+
+Ejecutar con: python -m unittest test_wal
+"""
+import os
+import tempfile
+import unittest
+
+from quadtree import Point
+from wal import DurableQuadTree, LOG_FILE
+
+
+class TestUpdateLogRecovery(unittest.TestCase):
+
+    def test_torn_tail_does_not_hide_later_writes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, LOG_FILE)
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            for i in range(3):
+                dqt.insert(Point(100 + i, 100, {'id': i}))
+            dqt.close()
+
+            # Caída a mitad de una operación: línea sin terminar
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write('{"op":"insert","point":[1')
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            self.assertEqual(dqt.count_points(), 3)
+            for i in range(3, 6):
+                dqt.insert(Point(100 + i, 100, {'id': i}))
+            dqt.close()
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            self.assertEqual(dqt.count_points(), 6)
+            self.assertEqual(dqt.replayed, 6)
+            dqt.close()
+
+    def test_invalid_line_is_cut_on_open(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, LOG_FILE)
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            dqt.insert(Point(10, 10, {'id': 1}))
+            dqt.close()
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write('no es json\n')
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            dqt.insert(Point(20, 20, {'id': 2}))
+            dqt.close()
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            self.assertEqual(dqt.count_points(), 2)
+            dqt.close()
+
+
+
+class TestLogBeforeApply(unittest.TestCase):
+
+    def test_unserializable_attribute_leaves_tree_unchanged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            with self.assertRaises(ValueError):
+                dqt.insert(Point(1, 1, {'tags': {'a', 'b'}}))
+            self.assertEqual(dqt.count_points(), 0)
+            dqt.close()
+
+    def test_tuple_attribute_is_rejected_before_it_diverges_from_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            with self.assertRaises(ValueError):
+                dqt.insert(Point(2, 2, {'t': (1, 2)}))
+            self.assertTrue(dqt.insert(Point(2, 2, {'t': [1, 2]})))
+            dqt.close()
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            self.assertTrue(dqt.remove(Point(2, 2, {'t': [1, 2]})))
+            self.assertEqual(dqt.count_points(), 0)
+            dqt.close()
+
+    def test_failed_update_keeps_the_original_point(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            point = Point(3, 3, {'id': 1})
+            dqt.insert(point)
+            with self.assertRaises(ValueError):
+                dqt.update_attributes(point, {'id': 1, 'bad': object()})
+            dqt.close()
+
+            dqt = DurableQuadTree(directory, snapshot_every=None)
+            self.assertEqual([p.attributes['id'] for p in dqt.get_all_points()], [1])
+            dqt.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
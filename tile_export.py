@@ -0,0 +1,449 @@
+"""
+Exportación de una pirámide de teselas (tiles) a partir de un QuadTree
+
+En el zoom z el boundary se divide en 2^z x 2^z teselas: la tesela (z, tx, ty)
+es exactamente el nodo de profundidad z con esos índices, así que la
+asignación de puntos sale de la forma del árbol:
+  - una hoja de profundidad >= z cae entera en su ancestro de profundidad z
+    (se asigna en bloque, sin mirar sus puntos);
+  - los puntos de una hoja menos profunda se reparten con aritmética entera
+    dentro de las teselas que cubre. En un borde compartido el punto queda
+    al oeste/norte, igual que al insertarlo en el árbol.
+
+El árbol se recorre una sola vez para juntar las hojas; el trabajo se reparte
+en tareas (zoom, región) que un pool de procesos resuelve en paralelo. Cada
+tesela se escribe en <directorio>/<z>/<tx>/<ty>.qtt con el formato binario de
+encode_tile.
+
+Un manifest.json guarda por tesela una firma de las hojas que la forman y el
+hash de su contenido. En la siguiente exportación una tesela con la misma
+firma no se vuelve a armar ni codificar; si la firma cambió pero el contenido
+no, tampoco se reescribe. Las teselas que quedaron vacías se borran, solo
+dentro del rango de zoom exportado.
+"""
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from quadtree import QuadTree, Point, Rectangle
+
+MANIFEST_FILE = 'manifest.json'
+TILE_SUFFIX = '.qtt'
+FORMAT_VERSION = 1
+MAGIC = b'QTT1'
+
+# magic, zoom, tx, ty, puntos, claves, valores
+TILE_HEADER = struct.Struct('<4sBIIIHI')
+LENGTH = struct.Struct('<H')
+EXTENT = 65535  # Coordenadas dentro de la tesela: enteros de 0 a EXTENT
+
+# (x, y, claves, valores): forma compacta de un punto para enviar a los procesos
+Record = Tuple[float, float, Tuple[str, ...], tuple]
+# (profundidad, ix, iy, registros, firma) de cada hoja
+Leaf = Tuple[int, int, int, List[Record], bytes]
+
+COORDS = struct.Struct('<dd')
+
+
+def tile_bounds(boundary: Rectangle, z: int, tx: int, ty: int) -> Rectangle:
+    """Rectángulo de la tesela (z, tx, ty)"""
+    n = 1 << z
+    w = boundary.width / n
+    h = boundary.height / n
+    return Rectangle(boundary.min_x + (tx + 0.5) * w, boundary.min_y + (ty + 0.5) * h, w, h)
+
+
+# ---- Formato binario ----
+
+@lru_cache(maxsize=1 << 16, typed=True)
+def _encode_hashable(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _encode_value(value: Any) -> str:
+    """JSON de un valor de atributo (los valores repetidos se codifican una vez)"""
+    try:
+        return _encode_hashable(value)
+    except TypeError:  # listas, diccionarios
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _pack_strings(strings: List[str], kind: str) -> bytes:
+    parts = []
+    for s in strings:
+        raw = s.encode('utf-8')
+        if len(raw) > 0xFFFF:
+            raise ValueError(f"Una tesela admite {kind} de como mucho 65535 bytes en UTF-8 "
+                             f"({len(raw)} bytes: {s[:40]!r}...)")
+        parts.append(LENGTH.pack(len(raw)))
+        parts.append(raw)
+    return b''.join(parts)
+
+
+def encode_tile(z: int, tx: int, ty: int, bounds: Rectangle, records: List[Record]) -> bytes:
+    """
+    Codifica una tesela (little-endian):
+      cabecera   TILE_HEADER (magic, z, tx, ty, n, claves, valores)
+      claves     por cada una: uint16 largo + UTF-8
+      valores    por cada uno: uint16 largo + JSON en UTF-8
+      coords     n pares uint16 (x, y) relativos a la tesela, de 0 a EXTENT
+      atributos  por punto: uint16 cantidad + pares (uint16 clave, uint32 valor
+                 guardado como dos uint16, parte baja primero)
+    Claves y valores repetidos se guardan una sola vez por tesela. Lanza
+    ValueError si algo no entra en esos anchos (más de 65535 claves distintas
+    o atributos en un punto, 2^32 - 1 valores distintos, o una clave o valor de
+    más de 65535 bytes).
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[str, int] = {}
+    coords = array('H')
+    props = array('H')
+    sx = EXTENT / bounds.width if bounds.width else 0.0
+    sy = EXTENT / bounds.height if bounds.height else 0.0
+    for x, y, names, vals in records:
+        coords.append(min(max(int(round((x - bounds.min_x) * sx)), 0), EXTENT))
+        coords.append(min(max(int(round((y - bounds.min_y) * sy)), 0), EXTENT))
+        if len(names) > 0xFFFF:
+            raise ValueError("Una tesela admite como mucho 65535 atributos por punto")
+        props.append(len(names))
+        for name, value in zip(names, vals):
+            key = keys.setdefault(name, len(keys))
+            if key >= 0xFFFF:  # la cabecera guarda la cantidad en un uint16
+                raise ValueError("Una tesela admite como mucho 65535 claves distintas")
+            index = values.setdefault(_encode_value(value), len(values))
+            if index >= 0xFFFFFFFF:
+                raise ValueError("Una tesela admite menos de 2^32 valores distintos")
+            props.append(key)
+            props.append(index & 0xFFFF)  # uint32 como dos uint16
+            props.append(index >> 16)
+    if sys.byteorder != 'little':
+        coords.byteswap()
+        props.byteswap()
+    return b''.join([
+        TILE_HEADER.pack(MAGIC, z, tx, ty, len(records), len(keys), len(values)),
+        _pack_strings(list(keys), 'claves'),
+        _pack_strings(list(values), 'valores'),
+        coords.tobytes(),
+        props.tobytes(),
+    ])
+
+
+def decode_tile(data: bytes, boundary: Rectangle) -> Tuple[int, int, int, List[Point]]:
+    """Decodifica una tesela. Retorna (z, tx, ty, puntos) con coordenadas reconstruidas"""
+    magic, z, tx, ty, n, n_keys, n_values = TILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("No es una tesela QTT1")
+    offset = TILE_HEADER.size
+
+    def strings(count: int) -> List[str]:
+        nonlocal offset
+        found = []
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            found.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        return found
+
+    keys = strings(n_keys)
+    values = [json.loads(v) for v in strings(n_values)]
+    coords = array('H')
+    coords.frombytes(data[offset:offset + 4 * n])
+    offset += 4 * n
+    props = array('H')
+    props.frombytes(data[offset:])
+    if sys.byteorder != 'little':
+        coords.byteswap()
+        props.byteswap()
+
+    bounds = tile_bounds(boundary, z, tx, ty)
+    sx = bounds.width / EXTENT
+    sy = bounds.height / EXTENT
+    points = []
+    i = 0
+    for j in range(n):
+        count = props[i]
+        i += 1
+        attributes = {}
+        for _ in range(count):
+            attributes[keys[props[i]]] = values[props[i + 1] | (props[i + 2] << 16)]
+            i += 3
+        points.append(Point(bounds.min_x + coords[2 * j] * sx,
+                            bounds.min_y + coords[2 * j + 1] * sy, attributes))
+    return z, tx, ty, points
+
+
+def read_tile(path: str, boundary: Rectangle) -> Tuple[int, int, int, List[Point]]:
+    """Lee un archivo de tesela"""
+    with open(path, 'rb') as f:
+        return decode_tile(f.read(), boundary)
+
+
+# ---- Recorrido del árbol ----
+
+def _leaf_signature(depth: int, ix: int, iy: int, records: List[Record]) -> bytes:
+    """Firma estable (entre procesos y ejecuciones) de la posición y el contenido de una hoja"""
+    h = hashlib.blake2b(f"{depth}/{ix}/{iy}".encode('ascii'), digest_size=16)
+    for x, y, names, vals in records:
+        h.update(COORDS.pack(x, y))
+        h.update('\x00'.join([*names, *map(_encode_value, vals)]).encode('utf-8'))
+        h.update(b'\x01')
+    return h.digest()
+
+
+def collect_leaves(qt: QuadTree) -> List[Leaf]:
+    """Un recorrido del árbol: nodos con puntos, con su profundidad, índices y firma"""
+    leaves: List[Leaf] = []
+    stack = [(qt.root, 0, 0, 0)]
+    while stack:
+        node, depth, ix, iy = stack.pop()
+        if node.size == 0:
+            continue
+        if node.points:
+            records = [(p.x, p.y, p._schema.keys, p._values) for p in node.points]
+            leaves.append((depth, ix, iy, records, _leaf_signature(depth, ix, iy, records)))
+        if node.divided:
+            d, x2, y2 = depth + 1, 2 * ix, 2 * iy
+            stack.append((node.northwest, d, x2, y2))
+            stack.append((node.northeast, d, x2 + 1, y2))
+            stack.append((node.southwest, d, x2, y2 + 1))
+            stack.append((node.southeast, d, x2 + 1, y2 + 1))
+    return leaves
+
+
+def _regions_of(depth: int, ix: int, iy: int, split_depth: int) -> List[Tuple[int, int]]:
+    """Regiones de profundidad split_depth que toca el nodo (depth, ix, iy)"""
+    if depth >= split_depth:
+        shift = depth - split_depth
+        return [(ix >> shift, iy >> shift)]
+    span = 1 << (split_depth - depth)
+    return [(rx, ry) for rx in range(ix * span, (ix + 1) * span)
+            for ry in range(iy * span, (iy + 1) * span)]
+
+
+def _tile_index(value: float, origin: float, size: float, lo: int, hi: int) -> int:
+    """Tesela que contiene value; en un borde exacto gana la de índice menor"""
+    return min(max(int(math.ceil((value - origin) / size)) - 1, lo), hi)
+
+
+# ---- Trabajo de cada proceso ----
+
+_state: Dict[str, Any] = {}
+
+
+def _init_worker(boundary: Rectangle, leaves: List[Leaf], split_depth: int,
+                 directory: str, previous: Dict[str, Tuple[str, str]], max_points: Optional[int]):
+    """
+    Guarda en el proceso las hojas (agrupadas por región) y, de la exportación
+    anterior, {clave: (hash, firma)} de cada tesela
+    """
+    regions: Dict[Tuple[int, int], List[Leaf]] = {}
+    for leaf in leaves:
+        # Una hoja poco profunda cubre varias regiones
+        for region in _regions_of(leaf[0], leaf[1], leaf[2], split_depth):
+            regions.setdefault(region, []).append(leaf)
+    _state.update(boundary=boundary, regions=regions, split_depth=split_depth,
+                  directory=directory, previous=previous, max_points=max_points,
+                  folders=set())
+
+
+def _region_leaves(depth: int, rx: int, ry: int) -> List[Leaf]:
+    """Hojas que tocan la región (depth, rx, ry), sin repetir"""
+    s = _state['split_depth']
+    span = 1 << (s - depth)
+    found: Dict[int, Leaf] = {}
+    for cx in range(rx * span, (rx + 1) * span):
+        for cy in range(ry * span, (ry + 1) * span):
+            for leaf in _state['regions'].get((cx, cy), ()):
+                found[id(leaf)] = leaf
+    return list(found.values())
+
+
+def _export_task(task: Tuple[int, int, int, int]) -> Dict[str, Tuple[str, str, bool, bool]]:
+    """
+    Genera las teselas del zoom z dentro de la región (depth, rx, ry).
+    Retorna {clave: (hash, firma, codificada, escrita)} de cada tesela no vacía.
+    """
+    z, depth, rx, ry = task
+    boundary: Rectangle = _state['boundary']
+    n = 1 << z
+    tile_w = boundary.width / n
+    tile_h = boundary.height / n
+    shift = z - depth
+
+    # Por tesela: hojas que aportan puntos (en orden) y sus registros. Las
+    # hojas de una tesela determinan su contenido, así que su firma alcanza
+    # para reconocer una tesela sin cambios antes de codificarla
+    sources: Dict[Tuple[int, int], List[bytes]] = {}
+    tiles: Dict[Tuple[int, int], List[Record]] = {}
+    for leaf_depth, ix, iy, records, signature in _region_leaves(depth, rx, ry):
+        if leaf_depth >= z:
+            # La hoja entera cae en su ancestro de profundidad z
+            k = leaf_depth - z
+            tile = (ix >> k, iy >> k)
+            sources.setdefault(tile, []).append(signature)
+            tiles.setdefault(tile, []).extend(records)
+            continue
+        k = z - leaf_depth
+        x_lo, y_lo = ix << k, iy << k
+        x_hi, y_hi = x_lo + (1 << k) - 1, y_lo + (1 << k) - 1
+        for record in records:
+            tx = _tile_index(record[0], boundary.min_x, tile_w, x_lo, x_hi)
+            ty = _tile_index(record[1], boundary.min_y, tile_h, y_lo, y_hi)
+            if leaf_depth < depth and (tx >> shift != rx or ty >> shift != ry):
+                continue  # Otra región se encarga de este punto
+            tile_sources = sources.setdefault((tx, ty), [])
+            if not tile_sources or tile_sources[-1] != signature:
+                tile_sources.append(signature)
+            tiles.setdefault((tx, ty), []).append(record)
+
+    results: Dict[str, Tuple[str, str, bool, bool]] = {}
+    for (tx, ty), records in tiles.items():
+        key = f"{z}/{tx}/{ty}"
+        h = hashlib.blake2b(f"{key}/{_state['max_points']}".encode('ascii'), digest_size=16)
+        for signature in sources[(tx, ty)]:
+            h.update(signature)
+        signature = h.hexdigest()
+        path = os.path.join(_state['directory'], str(z), str(tx), f"{ty}{TILE_SUFFIX}")
+        old_digest, old_signature = _state['previous'].get(key, (None, None))
+        if old_signature == signature and os.path.exists(path):
+            results[key] = (old_digest, signature, False, False)
+            continue
+
+        records.sort(key=lambda r: (r[0], r[1]))
+        if _state['max_points'] and len(records) > _state['max_points']:
+            # Muestra reproducible: el mismo contenido da la misma tesela
+            records = random.Random(key).sample(records, _state['max_points'])
+        data = encode_tile(z, tx, ty, tile_bounds(boundary, z, tx, ty), records)
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        written = old_digest != digest or not os.path.exists(path)
+        if written:
+            folder = os.path.dirname(path)
+            if folder not in _state['folders']:
+                os.makedirs(folder, exist_ok=True)
+                _state['folders'].add(folder)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        results[key] = (digest, signature, True, written)
+    return results
+
+
+# ---- Exportación ----
+
+def _load_manifest(directory: str, boundary: Rectangle) -> Dict[str, Any]:
+    """Manifiesto de la exportación anterior (vacío si cambió el boundary o el formato)"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if (manifest.get('format') != FORMAT_VERSION or
+            manifest.get('boundary') != [boundary.x, boundary.y, boundary.width, boundary.height]):
+        return {}
+    return manifest
+
+
+def _zoom_of(key: str) -> int:
+    return int(key.split('/', 1)[0])
+
+
+def export_tiles(qt: QuadTree, directory: str, min_zoom: int = 0, max_zoom: int = 12,
+                 processes: Optional[int] = None, split_depth: int = 2,
+                 max_points: Optional[int] = None) -> Dict[str, int]:
+    """
+    Exporta las teselas de min_zoom a max_zoom. El trabajo se divide en una
+    tarea por zoom y región de profundidad min(zoom, split_depth); con
+    processes=0 se ejecuta en este mismo proceso. max_points limita los
+    puntos por tesela con una muestra reproducible. Las teselas de otros
+    zooms de una exportación anterior se conservan. Retorna la cantidad de
+    teselas generadas, codificadas, escritas, sin cambios y borradas.
+    """
+    if not 0 <= min_zoom <= max_zoom <= 32:
+        raise ValueError("Se requiere 0 <= min_zoom <= max_zoom <= 32")
+    boundary = qt.boundary
+    os.makedirs(directory, exist_ok=True)
+    manifest = _load_manifest(directory, boundary)
+    old_tiles: Dict[str, str] = manifest.get('tiles', {})
+    old_signatures: Dict[str, str] = manifest.get('signatures', {})
+    # Solo cuenta lo anterior dentro del rango de zoom que se exporta
+    previous = {key: (digest, old_signatures.get(key)) for key, digest in old_tiles.items()
+                if min_zoom <= _zoom_of(key) <= max_zoom}
+    leaves = collect_leaves(qt)
+
+    # Solo regiones con puntos
+    occupied = set()
+    for depth, ix, iy, _, _ in leaves:
+        occupied.update(_regions_of(depth, ix, iy, split_depth))
+    tasks = []
+    for z in range(min_zoom, max_zoom + 1):
+        depth = min(z, split_depth)
+        shift = split_depth - depth
+        for rx, ry in sorted({(rx >> shift, ry >> shift) for rx, ry in occupied}):
+            tasks.append((z, depth, rx, ry))
+
+    initargs = (boundary, leaves, split_depth, directory, previous, max_points)
+    if processes == 0:
+        _init_worker(*initargs)
+        try:
+            results = [_export_task(task) for task in tasks]
+        finally:
+            _state.clear()
+    else:
+        with multiprocessing.get_context().Pool(processes, _init_worker, initargs) as pool:
+            results = list(pool.imap_unordered(_export_task, tasks))
+
+    # Las teselas de otros zooms siguen en disco y en el manifiesto
+    tiles = {key: digest for key, digest in old_tiles.items() if key not in previous}
+    signatures = {key: old_signatures[key] for key in tiles if key in old_signatures}
+    exported = encoded = written = 0
+    for result in results:
+        for key, (digest, signature, was_encoded, was_written) in result.items():
+            tiles[key] = digest
+            signatures[key] = signature
+            exported += 1
+            encoded += was_encoded
+            written += was_written
+
+    # Teselas del rango exportado que ya no tienen puntos
+    removed = 0
+    for key in previous:
+        if key not in tiles:
+            z, tx, ty = key.split('/')
+            path = os.path.join(directory, z, tx, f"{ty}{TILE_SUFFIX}")
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+
+    if old_tiles:
+        min_zoom = min(min_zoom, manifest.get('min_zoom', min_zoom))
+        max_zoom = max(max_zoom, manifest.get('max_zoom', max_zoom))
+    manifest = {
+        'format': FORMAT_VERSION,
+        'boundary': [boundary.x, boundary.y, boundary.width, boundary.height],
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'tiles': tiles,
+        'signatures': signatures,
+    }
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    return {
+        'tiles': exported,
+        'encoded': encoded,
+        'written': written,
+        'unchanged': exported - written,
+        'removed': removed,
+    }
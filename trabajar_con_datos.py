@@ -3,6 +3,9 @@ Script para trabajar con datos de entrada y salida del QuadTree
 Carga datos desde input_data/, realiza consultas, y guarda resultados en output_data/
 """
 from quadtree import QuadTree, Point, Rectangle
+from parallel_build import build_parallel
+from profiling import Profiler, stage
+import argparse
 import json
 import os
 from datetime import datetime
@@ -15,7 +18,7 @@ def cargar_datos_desde_archivo(filename):
     print(f"Cargando datos desde {filepath}...")
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
+        with stage('carga_json'), open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         print(f"{len(data)} registros cargados exitosamente\n")
         return data
@@ -27,26 +30,39 @@ def cargar_datos_desde_archivo(filename):
         return []
 
 
-def crear_quadtree_con_datos(data):
-    """Crea un QuadTree e inserta los datos"""
+def crear_quadtree_con_datos(data, processes=None):
+    """
+    Crea un QuadTree e inserta los datos. Con processes (0: sin procesos
+    extra) el árbol se arma en paralelo por cuadrantes (ver parallel_build.py)
+    """
     print("Creando QuadTree e insertando puntos...")
     
-    # Crear QuadTree con boundary de 1000x1000
+    # Crear QuadTree con boundary de 1000x1000 (rating indexado para rankings,
+    # id como clave para actualizaciones posteriores)
     boundary = Rectangle(500, 500, 1000, 1000)
-    qt = QuadTree(boundary, capacity=4)
-    
-    # Insertar cada punto
-    insertados = 0
-    for item in data:
-        if 'x' in item and 'y' in item:
-            # Crear punto con todos los atributos del registro
-            attributes = {k: v for k, v in item.items() if k not in ['x', 'y']}
-            point = Point(item['x'], item['y'], attributes)
-            
-            if qt.insert(point):
-                insertados += 1
+    
+    # Crear un punto por registro con todos sus atributos
+    points = []
+    with stage('creacion_puntos'):
+        for item in data:
+            if 'x' in item and 'y' in item:
+                attributes = {k: v for k, v in item.items() if k not in ['x', 'y']}
+                points.append(Point(item['x'], item['y'], attributes))
+            else:
+                print(f"Advertencia: Registro sin coordenadas x,y: {item}")
+    
+    with stage('construccion_arbol'):
+        if processes is None:
+            # Insertar cada punto
+            qt = QuadTree(boundary, capacity=4, indexed_attributes=('rating',), id_attribute='id')
+            insertados = 0
+            for point in points:
+                if qt.insert(point):
+                    insertados += 1
         else:
-            print(f"Advertencia: Registro sin coordenadas x,y: {item}")
+            qt = build_parallel(points, boundary, capacity=4, indexed_attributes=('rating',),
+                                id_attribute='id', processes=processes)
+            insertados = qt.count_points()
     
     print(f"{insertados} puntos insertados en el QuadTree")
     print(f"Árbol subdividido: {'Sí' if qt.root.divided else 'No'}\n")
@@ -54,6 +70,20 @@ def crear_quadtree_con_datos(data):
     return qt
 
 
+def sincronizar_con_datos(qt, data):
+    """
+    Aplica una nueva versión del conjunto de datos sobre un árbol existente:
+    solo se insertan, mueven, actualizan o eliminan los registros que cambiaron
+    """
+    print("Sincronizando QuadTree con la nueva versión de los datos...")
+    with stage('sincronizacion'):
+        cambios = qt.sync(data)
+    print(f"   Insertados: {cambios['inserted']}, movidos: {cambios['moved']}, "
+          f"actualizados: {cambios['updated']}, eliminados: {cambios['removed']}, "
+          f"sin cambios: {cambios['unchanged']}\n")
+    return cambios
+
+
 def realizar_consulta_rango(qt, center_x, center_y, width, height, descripcion=""):
     """Realiza una consulta de rango rectangular"""
     print(f"Consulta de Rango: {descripcion}")
@@ -137,7 +167,7 @@ def guardar_resultados(data, filename):
     print(f"Guardando resultados en {filepath}...")
     
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with stage('guardado'), open(filepath, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
         print(f"Resultados guardados exitosamente\n")
         return True
@@ -158,8 +188,27 @@ def puntos_a_dict(points):
     ]
 
 
-def main():
-    """Función principal"""
+def main(profile=False, profile_output='output_data/perfil', processes=None, sync_file=None):
+    """
+    Función principal (con profile=True se genera un reporte de perfil por
+    etapa; con processes el árbol se construye en paralelo; con sync_file el
+    árbol se sincroniza con esa nueva versión de los datos antes de consultar)
+    """
+    profiler = Profiler() if profile else None
+    if profiler:
+        profiler.start()
+    try:
+        ejecutar_pipeline(processes, sync_file)
+    finally:
+        if profiler:
+            profiler.stop()
+            profiler.print_summary()
+            for path in profiler.write_report(profile_output):
+                print(f"Reporte de perfil: {path}")
+
+
+def ejecutar_pipeline(processes=None, sync_file=None):
+    """Carga, construcción, consultas y guardado de resultados"""
     print("\n" + "="*70)
     print("  TRABAJAR CON DATOS DE ENTRADA Y SALIDA - QuadTree")
     print("="*70 + "\n")
@@ -172,7 +221,12 @@ def main():
         return
     
     # ========== 2. CREAR QUADTREE ==========
-    qt = crear_quadtree_con_datos(data)
+    qt = crear_quadtree_con_datos(data, processes)
+    
+    if sync_file:
+        nuevos_datos = cargar_datos_desde_archivo(sync_file)
+        if nuevos_datos:
+            sincronizar_con_datos(qt, nuevos_datos)
     
     # ========== 3. REALIZAR CONSULTAS ==========
     print("-"*70)
@@ -180,29 +234,31 @@ def main():
     print("-"*70 + "\n")
     
     # Consulta 1: Rango en el centro
-    puntos_centro = realizar_consulta_rango(
-        qt, 500, 500, 300, 300, 
-        "Centro de la ciudad"
-    )
+    with stage('consulta_rango'):
+        puntos_centro = realizar_consulta_rango(
+            qt, 500, 500, 300, 300, 
+            "Centro de la ciudad"
+        )
     
     # Consulta 2: Vecino más cercano
-    nearest, distance = realizar_vecino_mas_cercano(
-        qt, 400, 400,
-        "Desde coordenada (400, 400)"
-    )
-    
-    # Consulta 3: Filtrar restaurantes
-    restaurantes = filtrar_por_categoria(qt, 'Restaurant')
+    with stage('vecino_mas_cercano'):
+        nearest, distance = realizar_vecino_mas_cercano(
+            qt, 400, 400,
+            "Desde coordenada (400, 400)"
+        )
     
-    # Consulta 4: Filtrar hospitales
-    hospitales = filtrar_por_categoria(qt, 'Hospital')
+    # Consulta 3 y 4: Filtrar restaurantes y hospitales
+    with stage('filtrado_atributos'):
+        restaurantes = filtrar_por_categoria(qt, 'Restaurant')
+        hospitales = filtrar_por_categoria(qt, 'Hospital')
     
     # ========== 4. GENERAR ESTADÍSTICAS ==========
     print("-"*70)
     print("  ESTADÍSTICAS")
     print("-"*70 + "\n")
     
-    estadisticas = generar_estadisticas(qt)
+    with stage('estadisticas'):
+        estadisticas = generar_estadisticas(qt)
     
     # ========== 5. GUARDAR RESULTADOS ==========
     print("-"*70)
@@ -287,5 +343,15 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Trabajar con datos de entrada y salida del QuadTree')
+    parser.add_argument('--profile', action='store_true',
+                        help='Perfilar el pipeline (tiempos, memoria y llamadas por etapa)')
+    parser.add_argument('--profile-output', type=str, default='output_data/perfil',
+                        help='Prefijo de los reportes de perfil (.json y .folded)')
+    parser.add_argument('--processes', type=int,
+                        help='Construir el árbol en paralelo con estos procesos (0: sin procesos extra)')
+    parser.add_argument('--sync', type=str, metavar='ARCHIVO',
+                        help='Nueva versión de los datos (en input_data/) a sincronizar antes de consultar')
+    args = parser.parse_args()
+    main(args.profile, args.profile_output, args.processes, args.sync)
 
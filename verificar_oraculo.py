@@ -0,0 +1,447 @@
+"""
+Verificación diferencial de los motores de consulta contra un oráculo de
+fuerza bruta vectorizado (NumPy)
+
+Genera conjuntos de datos y consultas aleatorios (con semilla) que incluyen
+los casos de borde del árbol: puntos sobre los bordes de los cuadrantes y de
+los rectángulos consultados (Rectangle.contains es inclusivo), puntos
+duplicados (también con coordenadas del orden de 1e7), datos agrupados y rectángulos de ancho cero o más grandes que el
+boundary. Cada resultado de cada motor se compara con el oráculo y se reporta
+la aceleración respecto de él por motor, tipo de consulta y tamaño.
+
+Tipos de consulta:
+  - range:   ids de los puntos dentro del rectángulo
+  - nearest: la distancia del punto devuelto debe ser la mínima
+  - knn:     las k distancias devueltas deben ser las k menores
+  - count:   conteo exacto del rango (estimate_count con max_error=0)
+
+Con empates cualquier punto a la misma distancia es válido; las distancias se
+comparan salvo redondeo en la última cifra (DISTANCE_RTOL). El oráculo de
+rango devuelve los mismos Point que los motores, así la aceleración compara
+el mismo trabajo.
+
+Los motores cuantizados quedan fuera: son aproximados por diseño.
+
+Uso:
+    python verificar_oraculo.py
+    python verificar_oraculo.py --sizes 1000 100000 --queries 200 --engines quadtree linear
+    python verificar_oraculo.py --require-speedup 1.0 --output output_data/verificacion.json
+
+Sale con código 1 si algún resultado difiere del oráculo o si, con
+--require-speedup, algún motor no alcanza esa aceleración.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from quadtree import QuadTree, Point, Rectangle
+from concurrent_quadtree import ConcurrentQuadTree
+from linear_quadtree import LinearQuadTree
+from parallel_build import build_parallel
+from query_planner import QueryPlanner
+from sharding import ShardedQuadTree
+
+BOUNDARY = Rectangle(500, 500, 1000, 1000)
+CAPACITY = 8
+K = 10
+DISTANCE_RTOL = 1e-12
+
+DATASETS = ('uniform', 'clustered', 'duplicates', 'grid', 'edges', 'far_duplicates')
+
+# Conjuntos con un boundary propio: coordenadas del orden de 1e7, donde la
+# resolución de float se agota antes de separar los puntos repetidos
+DATASET_BOUNDARIES = {'far_duplicates': Rectangle(5e6, 5e6, 1e7, 1e7)}
+QUERY_TYPES = ('range', 'nearest', 'knn', 'count')
+
+
+# ---- Datos ----
+
+def generate_dataset(kind: str, n: int, rng: np.random.Generator,
+                     boundary: Rectangle = BOUNDARY) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas (xs, ys) de n puntos dentro de boundary"""
+    min_x, max_x = boundary.min_x, boundary.max_x
+    min_y, max_y = boundary.min_y, boundary.max_y
+    if kind == 'uniform':
+        xs = rng.uniform(min_x, max_x, n)
+        ys = rng.uniform(min_y, max_y, n)
+    elif kind == 'clustered':
+        # Grupos gaussianos estrechos: hojas muy profundas en pocas zonas
+        centers = rng.uniform(min_x, max_x, (8, 2))
+        which = rng.integers(0, len(centers), n)
+        spread = boundary.width * rng.uniform(0.001, 0.02, len(centers))
+        xs = np.clip(centers[which, 0] + rng.normal(0, 1, n) * spread[which], min_x, max_x)
+        ys = np.clip(centers[which, 1] + rng.normal(0, 1, n) * spread[which], min_y, max_y)
+    elif kind == 'duplicates':
+        # Cada ubicación se repite ~20 veces (más que la capacidad de una hoja)
+        unique = max(1, n // 20)
+        base_x = rng.uniform(min_x, max_x, unique)
+        base_y = rng.uniform(min_y, max_y, unique)
+        which = rng.integers(0, unique, n)
+        xs, ys = base_x[which], base_y[which]
+    elif kind == 'grid':
+        # Coordenadas diádicas: caen exactamente sobre los bordes de los cuadrantes
+        cells = 64
+        xs = min_x + rng.integers(0, cells + 1, n) * (boundary.width / cells)
+        ys = min_y + rng.integers(0, cells + 1, n) * (boundary.height / cells)
+    elif kind == 'edges':
+        # Uniforme con un tercio de los puntos sobre el borde del boundary
+        xs = rng.uniform(min_x, max_x, n)
+        ys = rng.uniform(min_y, max_y, n)
+        on_edge = rng.random(n) < 1 / 3
+        side = rng.integers(0, 4, n)
+        xs = np.where(on_edge & (side == 0), min_x, np.where(on_edge & (side == 1), max_x, xs))
+        ys = np.where(on_edge & (side == 2), min_y, np.where(on_edge & (side == 3), max_y, ys))
+    elif kind == 'far_duplicates':
+        # Pocas ubicaciones repetidas muchas veces; en la mitad de las copias
+        # la coordenada se corre un ulp (vecinos que solo el redondeo separa)
+        unique = max(1, n // 50)
+        base_x = rng.uniform(min_x, max_x, unique)
+        base_y = rng.uniform(min_y, max_y, unique)
+        which = rng.integers(0, unique, n)
+        xs, ys = base_x[which], base_y[which]
+        nudged = rng.random(n) < 0.5
+        xs = np.where(nudged, np.nextafter(xs, max_x), xs)
+        ys = np.where(nudged, np.nextafter(ys, max_y), ys)
+    else:
+        raise ValueError(f"Conjunto de datos desconocido: {kind}")
+    return xs.astype(np.float64), ys.astype(np.float64)
+
+
+def generate_rectangles(xs: np.ndarray, ys: np.ndarray, count: int,
+                        rng: np.random.Generator, boundary: Rectangle = BOUNDARY) -> List[Rectangle]:
+    """Rectángulos de consulta, mezclando tamaños aleatorios y casos de borde"""
+    rects = []
+    n = len(xs)
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            # Aleatorio, de muy chico a casi todo el boundary
+            side = boundary.width * 10 ** float(rng.uniform(-3, 0))
+            rects.append(Rectangle(float(rng.uniform(boundary.min_x, boundary.max_x)),
+                                   float(rng.uniform(boundary.min_y, boundary.max_y)),
+                                   side, side * float(rng.uniform(0.5, 2))))
+        elif kind == 1:
+            # Bordes diádicos (representación exacta): alineados con cuadrantes
+            cells = 64
+            x0, x1 = sorted(rng.integers(0, cells + 1, 2).tolist())
+            y0, y1 = sorted(rng.integers(0, cells + 1, 2).tolist())
+            step_x, step_y = boundary.width / cells, boundary.height / cells
+            rects.append(Rectangle(boundary.min_x + (x0 + x1) / 2 * step_x,
+                                   boundary.min_y + (y0 + y1) / 2 * step_y,
+                                   (x1 - x0) * step_x, (y1 - y0) * step_y))
+        elif kind == 2:
+            # Ancho y alto cero sobre un punto existente
+            j = rng.integers(0, n)
+            rects.append(Rectangle(float(xs[j]), float(ys[j]), 0, 0))
+        elif kind == 3:
+            # Bordes sobre las coordenadas de dos puntos existentes
+            a, b = rng.integers(0, n, 2)
+            x0, x1 = sorted((float(xs[a]), float(xs[b])))
+            y0, y1 = sorted((float(ys[a]), float(ys[b])))
+            rects.append(Rectangle((x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0))
+        else:
+            # Más grande que el boundary, o fuera de él
+            if rng.random() < 0.5:
+                rects.append(Rectangle(boundary.x, boundary.y,
+                                       boundary.width * 1.5, boundary.height * 1.5))
+            else:
+                rects.append(Rectangle(boundary.max_x + 100, boundary.y, 50, 50))
+    return rects
+
+
+def generate_targets(xs: np.ndarray, ys: np.ndarray, count: int,
+                     rng: np.random.Generator, boundary: Rectangle = BOUNDARY) -> List[Point]:
+    """Puntos de consulta para vecinos: aleatorios, sobre datos y fuera del boundary"""
+    targets = []
+    n = len(xs)
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            targets.append(Point(float(rng.uniform(boundary.min_x, boundary.max_x)),
+                                 float(rng.uniform(boundary.min_y, boundary.max_y))))
+        elif kind == 1:
+            j = rng.integers(0, n)
+            targets.append(Point(float(xs[j]), float(ys[j])))
+        else:
+            angle = float(rng.uniform(0, 2 * np.pi))
+            targets.append(Point(boundary.x + math.cos(angle) * boundary.width,
+                                 boundary.y + math.sin(angle) * boundary.height))
+    return targets
+
+
+# ---- Oráculo ----
+
+class Oracle:
+    """Respuestas exactas por fuerza bruta sobre arreglos de NumPy"""
+
+    def __init__(self, points: List[Point], xs: np.ndarray, ys: np.ndarray):
+        self.points = points
+        self.xs = xs
+        self.ys = ys
+
+    def _mask(self, rect: Rectangle) -> np.ndarray:
+        xs, ys = self.xs, self.ys
+        return (xs >= rect.min_x) & (xs <= rect.max_x) & (ys >= rect.min_y) & (ys <= rect.max_y)
+
+    def distances(self, target: Point) -> np.ndarray:
+        return np.sqrt((self.xs - target.x) ** 2 + (self.ys - target.y) ** 2)
+
+    def range(self, rect: Rectangle) -> List[Point]:
+        points = self.points
+        return [points[i] for i in np.flatnonzero(self._mask(rect))]
+
+    def count(self, rect: Rectangle) -> int:
+        return int(np.count_nonzero(self._mask(rect)))
+
+    def nearest(self, target: Point) -> float:
+        return float(self.distances(target).min())
+
+    def knn(self, target: Point, k: int) -> np.ndarray:
+        d = self.distances(target)
+        if k < len(d):
+            d = np.partition(d, k - 1)[:k]
+        return np.sort(d)
+
+
+# ---- Motores ----
+
+def _tree_operations(qt) -> Dict[str, Callable]:
+    return {
+        'range': qt.query_range,
+        'nearest': qt.nearest_neighbor,
+        'knn': lambda target: list(islice(qt.iter_nearest(target), K)),
+        'count': lambda rect: int(qt.estimate_count(rect, 0)[0]),
+    }
+
+
+def build_quadtree(points: List[Point], boundary: Rectangle = BOUNDARY):
+    qt = QuadTree(boundary, CAPACITY)
+    for point in points:
+        qt.insert(point)
+    return qt, _tree_operations(qt)
+
+
+def build_concurrent(points: List[Point], boundary: Rectangle = BOUNDARY):
+    qt = ConcurrentQuadTree(boundary, CAPACITY)
+    qt.insert_many(points)
+    return qt, _tree_operations(qt)
+
+
+def build_parallel_tree(points: List[Point], boundary: Rectangle = BOUNDARY):
+    qt = build_parallel(points, boundary, CAPACITY, processes=2)
+    return qt, _tree_operations(qt)
+
+
+def build_linear(points: List[Point], boundary: Rectangle = BOUNDARY):
+    lqt = LinearQuadTree(boundary)
+    lqt.bulk_load(points)
+    return lqt, {'range': lqt.query_range}
+
+
+def build_planner(points: List[Point], boundary: Rectangle = BOUNDARY):
+    qt, _ = build_quadtree(points, boundary)
+    planner = QueryPlanner(qt)
+    return planner, {'range': planner.query_range}
+
+
+def build_sharded(points: List[Point], boundary: Rectangle = BOUNDARY):
+    sharded = ShardedQuadTree(boundary, depth=1, capacity=CAPACITY, use_processes=False)
+    sharded.insert_many(points)
+    return sharded, {
+        'range': sharded.query_range,
+        'nearest': sharded.nearest_neighbor,
+        'knn': lambda target: sharded.k_nearest(target, K),
+    }
+
+
+ENGINES: Dict[str, Callable] = {
+    'quadtree': build_quadtree,
+    'concurrent': build_concurrent,
+    'parallel': build_parallel_tree,
+    'linear': build_linear,
+    'planner': build_planner,
+    'sharded': build_sharded,
+}
+
+
+# ---- Comparación ----
+
+def _ids(points: List[Point]) -> List[int]:
+    return sorted(p.get_attribute('id') for p in points)
+
+
+def _same_distances(a: List[float], b: np.ndarray) -> bool:
+    """
+    Distancias iguales salvo redondeo: las operaciones vectorizadas de NumPy
+    pueden diferir en la última cifra de las escalares del árbol
+    """
+    return len(a) == len(b) and bool(np.allclose(a, b, rtol=DISTANCE_RTOL, atol=0))
+
+
+def _check(op: str, result: Any, expected: Any, query, xs: np.ndarray, ys: np.ndarray) -> bool:
+    """Verifica un resultado del motor contra la respuesta del oráculo"""
+    if op == 'range':
+        return _ids(result) == _ids(expected)
+    if op == 'count':
+        return result == expected
+    points = [result] if op == 'nearest' else result
+    if op == 'nearest' and result is None:
+        return False
+    # Los puntos devueltos deben ser datos reales, sin repetir, con sus coordenadas
+    ids = [p.get_attribute('id') for p in points]
+    if len(set(ids)) != len(ids):
+        return False
+    for point, i in zip(points, ids):
+        if i is None or point.x != xs[i] or point.y != ys[i]:
+            return False
+    distances = sorted(p.distance_to(query) for p in points)
+    if op == 'nearest':
+        expected = np.array([expected])
+    return _same_distances(distances, expected)
+
+
+def _timed(fn: Callable, queries: list) -> Tuple[list, float]:
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, time.perf_counter() - start
+
+
+def run(sizes: List[int], datasets: List[str], engines: List[str], query_count: int,
+        seed: int, log: Callable[[str], None] = print) -> List[Dict[str, Any]]:
+    """
+    Ejecuta la verificación completa y devuelve una fila por conjunto de
+    datos, tamaño, motor y tipo de consulta
+    """
+    rows = []
+    for size in sizes:
+        for dataset in datasets:
+            rng = np.random.default_rng([seed, size, DATASETS.index(dataset)])
+            boundary = DATASET_BOUNDARIES.get(dataset, BOUNDARY)
+            xs, ys = generate_dataset(dataset, size, rng, boundary)
+            points = [Point(float(x), float(y), {'id': i}) for i, (x, y) in enumerate(zip(xs, ys))]
+            oracle = Oracle(points, xs, ys)
+            queries = {
+                'range': generate_rectangles(xs, ys, query_count, rng, boundary),
+                'nearest': generate_targets(xs, ys, query_count, rng, boundary),
+            }
+            queries['count'] = queries['range']
+            queries['knn'] = queries['nearest']
+
+            oracle_ops = {
+                'range': oracle.range,
+                'count': oracle.count,
+                'nearest': oracle.nearest,
+                'knn': lambda target: oracle.knn(target, K),
+            }
+            expected: Dict[str, Tuple[list, float]] = {}
+
+            for engine in engines:
+                start = time.perf_counter()
+                index, operations = ENGINES[engine](points, boundary)
+                build_time = time.perf_counter() - start
+                try:
+                    for op in QUERY_TYPES:
+                        if op not in operations:
+                            continue
+                        if op not in expected:
+                            expected[op] = _timed(oracle_ops[op], queries[op])
+                        answers, oracle_time = expected[op]
+                        results, engine_time = _timed(operations[op], queries[op])
+                        mismatches = sum(
+                            not _check(op, result, answer, query, xs, ys)
+                            for result, answer, query in zip(results, answers, queries[op]))
+                        row = {
+                            'dataset': dataset,
+                            'size': size,
+                            'engine': engine,
+                            'query': op,
+                            'queries': len(queries[op]),
+                            'mismatches': mismatches,
+                            'build_ms': round(build_time * 1000, 2),
+                            'engine_ms': round(engine_time * 1000, 3),
+                            'oracle_ms': round(oracle_time * 1000, 3),
+                            'speedup': oracle_time / engine_time if engine_time else float('inf'),
+                        }
+                        rows.append(row)
+                        log(f"{dataset:<11}{size:>9}  {engine:<11}{op:<8}"
+                            f"{row['engine_ms']:>11.2f}{row['oracle_ms']:>11.2f}"
+                            f"{row['speedup']:>9.2f}x  "
+                            f"{'OK' if not mismatches else f'{mismatches} ERRORES'}")
+                finally:
+                    if hasattr(index, 'close'):
+                        index.close()
+    return rows
+
+
+def summarize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aceleración mínima y media geométrica por motor, tipo de consulta y tamaño"""
+    groups: Dict[Tuple[str, str, int], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row['engine'], row['query'], row['size']), []).append(row)
+    summary = []
+    for (engine, op, size), group in groups.items():
+        speedups = [r['speedup'] for r in group]
+        summary.append({
+            'engine': engine,
+            'query': op,
+            'size': size,
+            'mismatches': sum(r['mismatches'] for r in group),
+            'min_speedup': round(min(speedups), 3),
+            'mean_speedup': round(float(np.exp(np.mean(np.log(speedups)))), 3),
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Verificación de los motores de consulta contra un oráculo de NumPy')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Cantidades de puntos de cada conjunto de datos')
+    parser.add_argument('--queries', type=int, default=50,
+                        help='Consultas por tipo y conjunto de datos')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Semilla de los datos y las consultas')
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS),
+                        help='Conjuntos de datos a generar')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=list(ENGINES),
+                        help='Motores a verificar')
+    parser.add_argument('--require-speedup', type=float,
+                        help='Aceleración mínima exigida a cada motor por tipo de consulta y tamaño')
+    parser.add_argument('--output', type=str,
+                        help='Guardar filas y resumen en un archivo JSON')
+    args = parser.parse_args()
+
+    print(f"{'datos':<11}{'puntos':>9}  {'motor':<11}{'consulta':<8}"
+          f"{'motor ms':>11}{'oráculo ms':>11}{'acel.':>10}")
+    rows = run(args.sizes, args.datasets, args.engines, args.queries, args.seed)
+    summary = summarize(rows)
+
+    print("\nResumen (aceleración sobre el oráculo):")
+    failed = False
+    for entry in summary:
+        slow = args.require_speedup is not None and entry['min_speedup'] < args.require_speedup
+        failed = failed or slow or entry['mismatches'] > 0
+        status = 'OK'
+        if entry['mismatches']:
+            status = f"{entry['mismatches']} ERRORES"
+        elif slow:
+            status = f"por debajo de {args.require_speedup}x"
+        print(f"  {entry['engine']:<11}{entry['query']:<8}{entry['size']:>9}  "
+              f"mín {entry['min_speedup']:>8.2f}x  media {entry['mean_speedup']:>8.2f}x  {status}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'seed': args.seed, 'rows': rows, 'summary': summary}, f, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
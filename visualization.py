@@ -1,6 +1,8 @@
 """
 Interfaz gráfica con pygame para visualizar y demostrar el QuadTree
 """
+import json
+import math
 import pygame
 import random
 from quadtree import QuadTree, Point, Rectangle, QuadTreeNode
@@ -18,6 +20,22 @@ LIGHT_BLUE = (173, 216, 230)
 DARK_GREEN = (0, 150, 0)
 ORANGE = (255, 165, 0)
 
+# Radio con el que se dibujan los puntos
+POINT_RADIUS = 5
+
+# Con más puntos visibles que esto se dibujan marcadores agregados
+MAX_VISIBLE_POINTS = 3000
+
+# Radio máximo (en píxeles) de un marcador agregado
+MAX_CLUSTER_RADIUS = 30
+
+# Los nodos más pequeños que esto (en píxeles) no se dibujan ni se recorren
+MIN_NODE_PIXELS = 4
+
+# Límites del zoom (píxeles por unidad del mundo, relativo al zoom inicial)
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4096
+
 # Categorías de puntos
 CATEGORIES = ['Restaurant', 'Hospital', 'School', 'Park', 'Store']
 CATEGORY_COLORS = {
@@ -32,7 +50,7 @@ CATEGORY_COLORS = {
 class QuadTreeVisualizer:
     """Visualizador interactivo del QuadTree"""
     
-    def __init__(self, width=1000, height=800):
+    def __init__(self, width=1000, height=800, data_file=None):
         pygame.init()
         self.width = width
         self.height = height
@@ -49,76 +67,280 @@ class QuadTreeVisualizer:
         self.offset_y = 50
         
         # QuadTree
-        boundary = Rectangle(self.vis_width/2, self.vis_height/2, 
-                           self.vis_width, self.vis_height)
+        data = self.load_data(data_file) if data_file else None
+        if data:
+            boundary = self.boundary_for(data)
+        else:
+            boundary = Rectangle(self.vis_width/2, self.vis_height/2, 
+                               self.vis_width, self.vis_height)
         self.quadtree = QuadTree(boundary, capacity=4)
         
+        # Vista: esquina superior izquierda en el mundo y escala (píxeles por unidad)
+        self.base_scale = min(self.vis_width / boundary.width, self.vis_height / boundary.height)
+        self.scale = self.base_scale
+        self.view_x = boundary.x - boundary.half_width
+        self.view_y = boundary.y - boundary.half_height
+        self.pan_start = None
+        self.viewport = self.visible_world()
+        
+        # Capa estática (grilla + puntos) dibujada fuera de pantalla
+        self.static_layer = pygame.Surface((self.vis_width, self.vis_height))
+        self.layer_valid = False
+        self.dirty_regions = []
+        
+        # Panel de UI en caché, se vuelve a dibujar solo si cambia su estado
+        self.ui_cache = None
+        self.ui_cache_key = None
+        self.overlay_cache = {}
+        
         # Estado de la aplicación
         self.mode = "insert"  # insert, range_query, nearest_neighbor, filter
         self.range_start = None
         self.range_rect = None
         self.query_point = None
         self.nearest_point = None
+        self.range_results = []
         self.filtered_points = []
         self.selected_category = None
         
-        # Generar puntos de ejemplo
-        self.generate_random_points(30)
+        if data:
+            self.insert_records(data)
+        else:
+            # Generar puntos de ejemplo
+            self.generate_random_points(30)
+    
+    @staticmethod
+    def load_data(filename):
+        """Carga registros con x, y desde un archivo JSON"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            return [item for item in json.load(f) if 'x' in item and 'y' in item]
+    
+    @staticmethod
+    def boundary_for(data):
+        """Boundary cuadrado que cubre todos los registros (con un pequeño margen)"""
+        min_x = min(item['x'] for item in data)
+        max_x = max(item['x'] for item in data)
+        min_y = min(item['y'] for item in data)
+        max_y = max(item['y'] for item in data)
+        side = max(max_x - min_x, max_y - min_y, 1.0) * 1.01
+        return Rectangle((min_x + max_x) / 2, (min_y + max_y) / 2, side, side)
+    
+    def insert_records(self, data):
+        """Inserta registros cargados de un archivo"""
+        for item in data:
+            attributes = {k: v for k, v in item.items() if k not in ['x', 'y']}
+            self.quadtree.insert(Point(item['x'], item['y'], attributes))
+        self.invalidate()
     
     def generate_random_points(self, count):
         """Genera puntos aleatorios con categorías"""
+        b = self.quadtree.boundary
+        margin = 10 / self.base_scale
         for _ in range(count):
-            x = random.uniform(10, self.vis_width - 10)
-            y = random.uniform(10, self.vis_height - 10)
+            x = random.uniform(b.x - b.half_width + margin, b.x + b.half_width - margin)
+            y = random.uniform(b.y - b.half_height + margin, b.y + b.half_height - margin)
             category = random.choice(CATEGORIES)
             point = Point(x, y, {'category': category, 'id': random.randint(1000, 9999)})
             self.quadtree.insert(point)
+        self.invalidate()
+    
+    def invalidate(self):
+        """Marca toda la capa estática para redibujar"""
+        self.layer_valid = False
+        self.dirty_regions = []
+        self.overlay_cache = {}
+    
+    def visible_world(self):
+        """Rectángulo del mundo visible en el área de visualización"""
+        w = self.vis_width / self.scale
+        h = self.vis_height / self.scale
+        return Rectangle(self.view_x + w / 2, self.view_y + h / 2, w, h)
+    
+    def set_view(self, view_x, view_y, scale):
+        """Cambia la vista (pan/zoom) y redibuja solo lo visible"""
+        self.view_x, self.view_y, self.scale = view_x, view_y, scale
+        self.viewport = self.visible_world()
+        self.invalidate()
+    
+    def zoom_at(self, screen_x, screen_y, factor):
+        """Hace zoom manteniendo fijo el punto del mundo bajo el cursor"""
+        new_scale = min(max(self.scale * factor, self.base_scale * MIN_ZOOM),
+                        self.base_scale * MAX_ZOOM)
+        world_x, world_y = self.screen_to_world(screen_x, screen_y)
+        self.set_view(world_x - (screen_x - self.offset_x) / new_scale,
+                      world_y - (screen_y - self.offset_y) / new_scale,
+                      new_scale)
+    
+    def pan_by(self, dx_pixels, dy_pixels):
+        """Desplaza la vista según un arrastre en píxeles"""
+        self.set_view(self.view_x - dx_pixels / self.scale,
+                      self.view_y - dy_pixels / self.scale,
+                      self.scale)
+    
+    def in_vis_area(self, screen_x, screen_y):
+        """Verifica si una posición de pantalla cae en el área de visualización"""
+        return (self.offset_x <= screen_x < self.offset_x + self.vis_width and
+                self.offset_y <= screen_y < self.offset_y + self.vis_height)
+    
+    def visible_subset(self, points):
+        """Puntos de una lista que caen en la vista (calculado una vez por vista)"""
+        cached = self.overlay_cache.get(id(points))
+        if cached is None or cached[0] is not points or cached[1] != len(points):
+            visible = [p for p in points if self.viewport.contains(p)]
+            cached = (points, len(points), visible[:MAX_VISIBLE_POINTS])
+            self.overlay_cache[id(points)] = cached
+        return cached[2]
+    
+    def mark_dirty(self, region: Rectangle):
+        """Marca una región del mundo para redibujar en la capa estática"""
+        if self.layer_valid:
+            self.dirty_regions.append(region)
+    
+    def leaf_containing(self, x, y):
+        """Retorna la hoja del árbol que contiene la coordenada"""
+        probe = Point(x, y)
+        node = self.quadtree.root
+        while node.divided:
+            for child in (node.northwest, node.northeast, node.southwest, node.southeast):
+                if child.boundary.contains(probe):
+                    node = child
+                    break
+            else:
+                break
+        return node
     
     def world_to_screen(self, x, y):
         """Convierte coordenadas del mundo a coordenadas de pantalla"""
-        return (int(x + self.offset_x), int(y + self.offset_y))
+        return (int((x - self.view_x) * self.scale + self.offset_x),
+                int((y - self.view_y) * self.scale + self.offset_y))
+    
+    def world_to_layer(self, x, y):
+        """Convierte coordenadas del mundo a coordenadas de la capa estática"""
+        sx, sy = self.world_to_screen(x, y)
+        return (sx - self.offset_x, sy - self.offset_y)
     
     def screen_to_world(self, screen_x, screen_y):
         """Convierte coordenadas de pantalla a coordenadas del mundo"""
-        return (screen_x - self.offset_x, screen_y - self.offset_y)
+        return ((screen_x - self.offset_x) / self.scale + self.view_x,
+                (screen_y - self.offset_y) / self.scale + self.view_y)
     
-    def draw_rectangle(self, rect: Rectangle, color, width=1):
-        """Dibuja un rectángulo en la pantalla"""
-        x, y = self.world_to_screen(rect.x - rect.half_width, rect.y - rect.half_height)
-        pygame.draw.rect(self.screen, color, 
-                        (x, y, rect.width, rect.height), width)
+    def draw_rectangle(self, rect: Rectangle, color, width=1, surface=None):
+        """Dibuja un rectángulo en la pantalla (o en la capa estática)"""
+        to_surface = self.world_to_screen if surface is None else self.world_to_layer
+        x, y = to_surface(rect.x - rect.half_width, rect.y - rect.half_height)
+        pygame.draw.rect(surface or self.screen, color, 
+                        (x, y, rect.width * self.scale, rect.height * self.scale), width)
     
-    def draw_quadtree_node(self, node: QuadTreeNode):
-        """Dibuja recursivamente el QuadTree"""
+    def draw_quadtree_node(self, node: QuadTreeNode, surface=None, region: Rectangle = None):
+        """Dibuja recursivamente el QuadTree (solo los nodos que tocan region)"""
+        if region is not None and not node.boundary.intersects(region):
+            return
+        if node.boundary.width * self.scale < MIN_NODE_PIXELS:
+            return
+        
         # Dibujar boundary del nodo
-        self.draw_rectangle(node.boundary, GRAY, 1)
+        self.draw_rectangle(node.boundary, GRAY, 1, surface)
         
         # Si está dividido, dibujar hijos
         if node.divided:
-            self.draw_quadtree_node(node.northwest)
-            self.draw_quadtree_node(node.northeast)
-            self.draw_quadtree_node(node.southwest)
-            self.draw_quadtree_node(node.southeast)
+            self.draw_quadtree_node(node.northwest, surface, region)
+            self.draw_quadtree_node(node.northeast, surface, region)
+            self.draw_quadtree_node(node.southwest, surface, region)
+            self.draw_quadtree_node(node.southeast, surface, region)
     
-    def draw_point(self, point: Point, color=None, size=5):
+    def draw_point(self, point: Point, color=None, size=5, surface=None):
         """Dibuja un punto"""
         if color is None:
             category = point.attributes.get('category', 'Store')
             color = CATEGORY_COLORS.get(category, BLACK)
         
-        screen_pos = self.world_to_screen(point.x, point.y)
-        pygame.draw.circle(self.screen, color, screen_pos, size)
-        pygame.draw.circle(self.screen, BLACK, screen_pos, size, 1)
+        to_surface = self.world_to_screen if surface is None else self.world_to_layer
+        pos = to_surface(point.x, point.y)
+        pygame.draw.circle(surface or self.screen, color, pos, size)
+        pygame.draw.circle(surface or self.screen, BLACK, pos, size, 1)
+    
+    def draw_cluster(self, marker: Point, surface):
+        """Dibuja un marcador agregado: tamaño según cantidad, color de la categoría dominante"""
+        n = marker.attributes['count']
+        categories = marker.attributes['categories']
+        dominant = max(categories, key=categories.get) if categories else None
+        color = CATEGORY_COLORS.get(dominant, GRAY)
+        radius = int(min(6 + 3 * math.log10(n), MAX_CLUSTER_RADIUS))
+        
+        pos = self.world_to_layer(marker.x, marker.y)
+        pygame.draw.circle(surface, color, pos, radius)
+        pygame.draw.circle(surface, BLACK, pos, radius, 1)
+        label = self.small_font.render(str(n), True, BLACK)
+        surface.blit(label, label.get_rect(center=pos))
+    
+    def render_region(self, region: Rectangle):
+        """Redibuja en la capa estática solo la región indicada del mundo"""
+        layer = self.static_layer
+        x0, y0 = self.world_to_layer(region.x - region.half_width, region.y - region.half_height)
+        x1, y1 = self.world_to_layer(region.x + region.half_width, region.y + region.half_height)
+        layer.set_clip(pygame.Rect(x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+        layer.fill(WHITE)
+        
+        # Incluir nodos y puntos vecinos que invaden la región (con margen
+        # por el redondeo a píxeles)
+        margin = 2 * (POINT_RADIUS + 2) / self.scale
+        padded = Rectangle(region.x, region.y, region.width + margin, region.height + margin)
+        self.draw_quadtree_node(self.quadtree.root, layer, padded)
+        
+        # Presupuesto acotado: con demasiados puntos visibles llegan clusters.
+        # La decisión se toma siempre sobre la vista completa, como al armar
+        # la capa: una región chica no entra en el presupuesto y pintaría
+        # puntos sueltos donde el resto de la capa muestra un cluster
+        markers = self.quadtree.clusters_in_view(self.viewport, MAX_VISIBLE_POINTS)
+        if region is not self.viewport:
+            reach = 2 * (MAX_CLUSTER_RADIUS + 2) / self.scale
+            around = Rectangle(region.x, region.y, region.width + reach, region.height + reach)
+            markers = [m for m in markers if around.contains(m)]
+        for marker in markers:
+            if marker.get_attribute('cluster'):
+                self.draw_cluster(marker, layer)
+            else:
+                self.draw_point(marker, surface=layer)
+        layer.set_clip(None)
+    
+    def update_static_layer(self):
+        """Pone al día la capa estática: completa si es inválida, o solo lo sucio"""
+        if not self.layer_valid:
+            self.render_region(self.viewport)
+            self.layer_valid = True
+        else:
+            for region in self.dirty_regions:
+                self.render_region(region)
+        self.dirty_regions = []
+    
+    def ui_state(self):
+        """Datos que muestra el panel; si no cambian, se reutiliza el panel en caché"""
+        total = self.quadtree.root.size
+        in_range = len(self.range_results) if self.mode == "range_query" and self.range_rect else None
+        filtered = (len(self.filtered_points)
+                    if self.mode == "filter" and self.selected_category else None)
+        return (self.mode, total, in_range, filtered, self.selected_category)
     
     def draw_ui(self):
         """Dibuja la interfaz de usuario"""
-        # Panel derecho
         panel_x = self.vis_width + self.offset_x + 20
+        key = self.ui_state()
+        if self.ui_cache is None or key != self.ui_cache_key:
+            self.ui_cache = pygame.Surface((self.width - panel_x, self.height))
+            self.ui_cache.fill(WHITE)
+            self.render_ui(self.ui_cache, key)
+            self.ui_cache_key = key
+        self.screen.blit(self.ui_cache, (panel_x, 0))
+    
+    def render_ui(self, panel, state):
+        """Dibuja el panel derecho sobre su superficie propia"""
+        mode, total, in_range, filtered, _ = state
+        panel_x = 0
         y = 50
         
         # Título
         title = self.font.render("QuadTree Visualizer", True, BLACK)
-        self.screen.blit(title, (panel_x, y))
+        panel.blit(title, (panel_x, y))
         y += 40
         
         # Modos
@@ -130,6 +352,8 @@ class QuadTreeVisualizer:
             "4: Filtrar por Categoría",
             "C: Limpiar",
             "R: Generar Aleatorios",
+            "Rueda: Zoom",
+            "Clic derecho + arrastrar: Mover vista",
             "ESC: Salir"
         ]
         
@@ -138,40 +362,38 @@ class QuadTreeVisualizer:
                 surface = self.font.render(text, True, BLACK)
             else:
                 surface = self.small_font.render(text, True, BLACK)
-            self.screen.blit(surface, (panel_x, y))
+            panel.blit(surface, (panel_x, y))
             y += 25
         
         y += 20
         
         # Modo actual
-        mode_text = f"Modo Actual: {self.mode.upper()}"
+        mode_text = f"Modo Actual: {mode.upper()}"
         mode_surface = self.font.render(mode_text, True, BLUE)
-        self.screen.blit(mode_surface, (panel_x, y))
+        panel.blit(mode_surface, (panel_x, y))
         y += 35
         
         # Estadísticas
         stats_text = [
-            f"Total Puntos: {self.quadtree.count_points()}",
+            f"Total Puntos: {total}",
         ]
         
-        if self.mode == "range_query" and self.range_rect:
-            points_in_range = len(self.quadtree.query_range(self.range_rect))
-            stats_text.append(f"En Rango: {points_in_range}")
+        if in_range is not None:
+            stats_text.append(f"En Rango: {in_range}")
         
-        if self.mode == "filter" and self.selected_category:
-            count = self.quadtree.count_by_attribute('category', self.selected_category)
-            stats_text.append(f"Filtrados: {count}")
+        if filtered is not None:
+            stats_text.append(f"Filtrados: {filtered}")
         
         for text in stats_text:
             surface = self.small_font.render(text, True, BLACK)
-            self.screen.blit(surface, (panel_x, y))
+            panel.blit(surface, (panel_x, y))
             y += 25
         
         y += 20
         
         # Leyenda de categorías
         legend_title = self.font.render("Categorías:", True, BLACK)
-        self.screen.blit(legend_title, (panel_x, y))
+        panel.blit(legend_title, (panel_x, y))
         y += 30
         
         # Guardar la posición inicial de las categorías para el clic
@@ -182,14 +404,14 @@ class QuadTreeVisualizer:
             if self.mode == "filter":
                 # Dibujar rectángulo de hover/selección
                 if category == self.selected_category:
-                    pygame.draw.rect(self.screen, LIGHT_BLUE, (panel_x, y, 200, 25), 0)
+                    pygame.draw.rect(panel, LIGHT_BLUE, (panel_x, y, 200, 25), 0)
                 else:
-                    pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, y, 200, 25), 1)
+                    pygame.draw.rect(panel, (240, 240, 240), (panel_x, y, 200, 25), 1)
             
-            pygame.draw.circle(self.screen, color, (panel_x + 10, y + 8), 7)
-            pygame.draw.circle(self.screen, BLACK, (panel_x + 10, y + 8), 7, 2)
+            pygame.draw.circle(panel, color, (panel_x + 10, y + 8), 7)
+            pygame.draw.circle(panel, BLACK, (panel_x + 10, y + 8), 7, 2)
             text = self.small_font.render(category, True, BLACK)
-            self.screen.blit(text, (panel_x + 25, y))
+            panel.blit(text, (panel_x + 25, y))
             y += 25
         
         # Si estamos en modo filtro, mostrar controles
@@ -197,19 +419,25 @@ class QuadTreeVisualizer:
             y += 10
             filter_text = "Click categoría para filtrar"
             surface = self.small_font.render(filter_text, True, RED)
-            self.screen.blit(surface, (panel_x, y))
+            panel.blit(surface, (panel_x, y))
     
     def handle_insert(self, world_x, world_y):
         """Maneja la inserción de un punto"""
-        if 0 <= world_x <= self.vis_width and 0 <= world_y <= self.vis_height:
+        if self.quadtree.boundary.contains(Point(world_x, world_y)):
             category = random.choice(CATEGORIES)
             point = Point(world_x, world_y, 
                          {'category': category, 'id': random.randint(1000, 9999)})
-            self.quadtree.insert(point)
+            # La hoja que recibe el punto es lo único que puede cambiar (si se
+            # subdivide, lo hace dentro de su propio boundary)
+            leaf = self.leaf_containing(world_x, world_y)
+            if self.quadtree.insert(point):
+                b = leaf.boundary
+                margin = 2 * POINT_RADIUS / self.scale
+                self.mark_dirty(Rectangle(b.x, b.y, b.width + margin, b.height + margin))
     
     def handle_range_query_start(self, world_x, world_y):
         """Inicia la selección de rango"""
-        if 0 <= world_x <= self.vis_width and 0 <= world_y <= self.vis_height:
+        if self.quadtree.boundary.contains(Point(world_x, world_y)):
             self.range_start = (world_x, world_y)
     
     def handle_range_query_drag(self, world_x, world_y):
@@ -221,10 +449,11 @@ class QuadTreeVisualizer:
             center_x = (x1 + world_x) / 2
             center_y = (y1 + world_y) / 2
             self.range_rect = Rectangle(center_x, center_y, width, height)
+            self.range_results = self.quadtree.query_range(self.range_rect)
     
     def handle_nearest_neighbor(self, world_x, world_y):
         """Busca el vecino más cercano"""
-        if 0 <= world_x <= self.vis_width and 0 <= world_y <= self.vis_height:
+        if self.quadtree.boundary.contains(Point(world_x, world_y)):
             self.query_point = Point(world_x, world_y)
             self.nearest_point = self.quadtree.nearest_neighbor(self.query_point)
     
@@ -281,27 +510,46 @@ class QuadTreeVisualizer:
                         self.clear_tree()
                         self.generate_random_points(30)
                 
-                elif event.type == pygame.MOUSEBUTTONDOWN:
+                elif event.type == pygame.MOUSEWHEEL:
+                    x, y = pygame.mouse.get_pos()
+                    if self.in_vis_area(x, y):
+                        self.zoom_at(x, y, 1.25 ** event.y)
+                
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+                    # Botón derecho: arrastrar para desplazar la vista
+                    self.pan_start = event.pos
+                
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+                    self.pan_start = None
+                
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     mouse_pressed = True
                     x, y = pygame.mouse.get_pos()
                     world_x, world_y = self.screen_to_world(x, y)
                     
-                    if self.mode == "insert":
+                    if self.mode == "filter":
+                        self.handle_filter_click(x, y)
+                    elif not self.in_vis_area(x, y):
+                        pass
+                    elif self.mode == "insert":
                         self.handle_insert(world_x, world_y)
                     elif self.mode == "range_query":
                         self.handle_range_query_start(world_x, world_y)
                     elif self.mode == "nearest_neighbor":
                         self.handle_nearest_neighbor(world_x, world_y)
-                    elif self.mode == "filter":
-                        self.handle_filter_click(x, y)
                 
-                elif event.type == pygame.MOUSEBUTTONUP:
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                     mouse_pressed = False
                     if self.mode == "range_query":
                         self.range_start = None
                 
                 elif event.type == pygame.MOUSEMOTION:
-                    if mouse_pressed and self.mode == "range_query" and self.range_start:
+                    if self.pan_start:
+                        dx = event.pos[0] - self.pan_start[0]
+                        dy = event.pos[1] - self.pan_start[1]
+                        self.pan_start = event.pos
+                        self.pan_by(dx, dy)
+                    elif mouse_pressed and self.mode == "range_query" and self.range_start:
                         x, y = pygame.mouse.get_pos()
                         world_x, world_y = self.screen_to_world(x, y)
                         self.handle_range_query_drag(world_x, world_y)
@@ -309,19 +557,18 @@ class QuadTreeVisualizer:
             # Dibujar
             self.screen.fill(WHITE)
             
-            # Dibujar QuadTree
-            self.draw_quadtree_node(self.quadtree.root)
+            # QuadTree y puntos desde la capa en caché
+            self.update_static_layer()
+            self.screen.blit(self.static_layer, (self.offset_x, self.offset_y))
             
-            # Dibujar puntos
-            all_points = self.quadtree.get_all_points()
-            for point in all_points:
-                self.draw_point(point)
+            # Los resaltados no deben salirse del área de visualización
+            self.screen.set_clip(pygame.Rect(self.offset_x, self.offset_y,
+                                             self.vis_width, self.vis_height))
             
             # Dibujar elementos específicos del modo
             if self.mode == "range_query" and self.range_rect:
                 self.draw_rectangle(self.range_rect, BLUE, 2)
-                points_in_range = self.quadtree.query_range(self.range_rect)
-                for point in points_in_range:
+                for point in self.visible_subset(self.range_results):
                     self.draw_point(point, YELLOW, 7)
             
             if self.mode == "nearest_neighbor" and self.query_point:
@@ -334,9 +581,11 @@ class QuadTreeVisualizer:
                     pygame.draw.line(self.screen, GREEN, start_pos, end_pos, 2)
             
             if self.mode == "filter" and self.filtered_points:
-                for point in self.filtered_points:
+                for point in self.visible_subset(self.filtered_points):
                     self.draw_point(point, CYAN, 7)
             
+            self.screen.set_clip(None)
+            
             # Dibujar UI
             self.draw_ui()
             
@@ -350,18 +599,19 @@ class QuadTreeVisualizer:
         self.range_rect = None
         self.query_point = None
         self.nearest_point = None
+        self.range_results = []
         self.filtered_points = []
         self.selected_category = None
     
     def clear_tree(self):
         """Limpia el QuadTree"""
-        boundary = Rectangle(self.vis_width/2, self.vis_height/2, 
-                           self.vis_width, self.vis_height)
-        self.quadtree = QuadTree(boundary, capacity=4)
+        self.quadtree = QuadTree(self.quadtree.boundary, capacity=4)
         self.reset_selections()
+        self.invalidate()
 
 
 if __name__ == "__main__":
-    visualizer = QuadTreeVisualizer()
+    import sys
+    visualizer = QuadTreeVisualizer(data_file=sys.argv[1] if len(sys.argv) > 1 else None)
     visualizer.run()
 
@@ -0,0 +1,320 @@
+"""
+Persistencia incremental del QuadTree: registro de actualizaciones (WAL) e
+instantáneas compactadas.
+
+En un directorio se guardan:
+  snapshot.json  - estructura completa del árbol y el último número de secuencia
+  updates.log    - una línea JSON por operación (insert/remove/move)
+
+Al reabrir, se carga la instantánea y se reproducen solo las operaciones del
+registro con secuencia posterior a ella.
+
+Cada operación se serializa y se anexa al registro antes de tocar el árbol:
+si no se puede registrar (un atributo que no es JSON, o que volvería distinto
+al reproducirlo, como una tupla), el árbol queda igual y se lanza ValueError.
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from quadtree import QuadTree, QuadTreeNode, Point, Rectangle, _same_point
+
+SNAPSHOT_FILE = 'snapshot.json'
+LOG_FILE = 'updates.log'
+
+
+def _point_to_record(point: Point) -> list:
+    if point.timestamp is not None:
+        return [point.x, point.y, point.attributes, point.timestamp]
+    return [point.x, point.y, point.attributes]
+
+
+def _record_to_point(record: list) -> Point:
+    return Point(record[0], record[1], record[2], record[3] if len(record) > 3 else None)
+
+
+def _node_to_dict(node: QuadTreeNode) -> Dict[str, Any]:
+    """
+    Serializa un subárbol conservando su forma (no requiere reinsertar). Un
+    nodo dividido guarda en 'p' los puntos que ningún hijo aceptó, si los hay.
+    """
+    data: Dict[str, Any] = {}
+    if node.divided:
+        data['c'] = [_node_to_dict(node.northwest), _node_to_dict(node.northeast),
+                     _node_to_dict(node.southwest), _node_to_dict(node.southeast)]
+    if node.points or not node.divided:
+        data['p'] = [_point_to_record(p) for p in node.points]
+    return data
+
+
+def _dict_to_node(data: Dict[str, Any], node: QuadTreeNode) -> QuadTreeNode:
+    """Reconstruye un subárbol serializado sobre el nodo dado"""
+    if 'c' in data:
+        node.subdivide()
+        children = (node.northwest, node.northeast, node.southwest, node.southeast)
+        for child_data, child in zip(data['c'], children):
+            _dict_to_node(child_data, child)
+    node.points = [_record_to_point(r) for r in data.get('p', ())]
+    return node
+
+
+def save_snapshot(qt: QuadTree, path: str, seq: int = 0):
+    """Escribe una instantánea de forma atómica (archivo temporal + rename)"""
+    b = qt.boundary
+    data = {
+        'seq': seq,
+        'boundary': [b.x, b.y, b.width, b.height],
+        'capacity': qt.root.capacity,
+        'indexed_attributes': list(qt.root.indexed_attributes),
+        'id_attribute': qt.id_attribute,
+        'root': _node_to_dict(qt.root),
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str):
+    """Carga una instantánea. Retorna (QuadTree, seq)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    qt = QuadTree(Rectangle(*data['boundary']), capacity=data['capacity'],
+                  indexed_attributes=data.get('indexed_attributes', ()),
+                  id_attribute=data.get('id_attribute'))
+    _dict_to_node(data['root'], qt.root)
+    qt.root.refresh_stats()
+    qt.rebuild_id_index()
+    return qt, data['seq']
+
+
+class UpdateLog:
+    """Registro de solo anexado con una operación JSON por línea"""
+
+    def __init__(self, path: str, sync: bool = False):
+        self.path = path
+        self.sync = sync
+        # Una caída a mitad de una línea deja una cola incompleta: se corta
+        # antes de anexar, o las operaciones nuevas quedarían detrás de ella
+        # y read() nunca las alcanzaría
+        if os.path.exists(path):
+            valid = self._valid_length(path)
+            if valid < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+                    f.flush()
+                    os.fsync(f.fileno())
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def encode(record: Dict[str, Any]) -> str:
+        """
+        Línea JSON de una operación. Lanza ValueError si no se puede serializar
+        o si al leerla no se obtendría la misma operación (tuplas, claves que no
+        son texto, NaN)
+        """
+        try:
+            line = json.dumps(record, separators=(',', ':'), ensure_ascii=False, allow_nan=False)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"La operación no se puede registrar en JSON: {e}") from e
+        if json.loads(line) != record:
+            raise ValueError("La operación cambiaría al reproducirla desde el registro "
+                             "(use listas en lugar de tuplas y claves de texto)")
+        return line
+
+    def append(self, record: Dict[str, Any]):
+        """Agrega una operación al final del registro"""
+        self.write([self.encode(record)])
+
+    def write(self, lines: List[str]):
+        """Agrega líneas ya codificadas con encode"""
+        self._file.write(''.join(line + '\n' for line in lines))
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def truncate(self):
+        """Vacía el registro (después de compactar en una instantánea)"""
+        self._file.close()
+        self._file = open(self.path, 'w', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def _records(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(posición en bytes tras la línea, operación) hasta la primera línea incompleta o inválida"""
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    return
+                offset += len(line)
+                yield offset, record
+
+    @staticmethod
+    def _valid_length(path: str) -> int:
+        """Bytes del registro hasta el final de la última operación completa"""
+        offset = 0
+        for offset, _ in UpdateLog._records(path):
+            pass
+        return offset
+
+    @staticmethod
+    def read(path: str) -> Iterator[Dict[str, Any]]:
+        """Lee las operaciones; una última línea incompleta (caída) se ignora"""
+        if not os.path.exists(path):
+            return
+        for _, record in UpdateLog._records(path):
+            yield record
+
+
+def apply_record(qt: QuadTree, record: Dict[str, Any]) -> bool:
+    """Aplica una operación del registro sobre el árbol"""
+    op = record['op']
+    if op == 'insert':
+        return qt.insert(_record_to_point(record['point']))
+    if op == 'remove':
+        return qt.remove(_record_to_point(record['point']))
+    if op == 'move':
+        return qt.move(_record_to_point(record['point']), record['to'][0], record['to'][1],
+                       record.get('timestamp'))
+    raise ValueError(f"Operación desconocida en el registro: {op}")
+
+
+class DurableQuadTree:
+    """
+    QuadTree con registro de actualizaciones. Cada cambio se anexa al registro
+    y recién entonces se aplica en memoria; cada snapshot_every operaciones se
+    compacta.
+    """
+
+    def __init__(self, directory: str, boundary: Rectangle = None, capacity: int = 4,
+                 snapshot_every: Optional[int] = 10000, sync: bool = False,
+                 indexed_attributes: Tuple[str, ...] = (),
+                 id_attribute: Optional[str] = None):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        log_path = os.path.join(directory, LOG_FILE)
+
+        if os.path.exists(snapshot_path):
+            self.quadtree, self.seq = load_snapshot(snapshot_path)
+        else:
+            if boundary is None:
+                boundary = Rectangle(500, 500, 1000, 1000)
+            self.quadtree = QuadTree(boundary, capacity, indexed_attributes, id_attribute)
+            self.seq = 0
+
+        # Reproducir solo la cola del registro
+        self.replayed = 0
+        for record in UpdateLog.read(log_path):
+            if record['seq'] > self.seq:
+                apply_record(self.quadtree, record)
+                self.seq = record['seq']
+                self.replayed += 1
+
+        self.log = UpdateLog(log_path, sync=sync)
+        self._since_snapshot = self.replayed
+
+    def _log(self, *records: Dict[str, Any]):
+        """
+        Anexa operaciones al registro. Todas se codifican antes de escribir,
+        así que si alguna no se puede registrar no se escribe ninguna.
+        """
+        lines = []
+        for i, record in enumerate(records, 1):
+            record['seq'] = self.seq + i
+            lines.append(UpdateLog.encode(record))
+        self.log.write(lines)
+        self.seq += len(records)
+
+    def _applied(self, operations: int = 1):
+        """Cuenta operaciones ya aplicadas y compacta si corresponde"""
+        self._since_snapshot += operations
+        if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+            self.checkpoint()
+
+    def _stored(self, point: Point) -> bool:
+        """Verifica si el árbol guarda ese punto (lo que remove encontraría)"""
+        probe = Rectangle(point.x, point.y, 0, 0)
+        return any(_same_point(p, point) for p in self.quadtree.query_range(probe))
+
+    def insert(self, point: Point) -> bool:
+        """Registra la inserción de un punto y lo inserta"""
+        if not self.quadtree.boundary.contains(point):
+            return False
+        self._log({'op': 'insert', 'point': _point_to_record(point)})
+        self.quadtree.insert(point)
+        self._applied()
+        return True
+
+    def remove(self, point: Point) -> bool:
+        """Registra la eliminación de un punto y lo elimina"""
+        if not self._stored(point):
+            return False
+        self._log({'op': 'remove', 'point': _point_to_record(point)})
+        self.quadtree.remove(point)
+        self._applied()
+        return True
+
+    def move(self, point: Point, new_x: float, new_y: float,
+             timestamp: Optional[float] = None) -> bool:
+        """Registra el movimiento de un punto y lo mueve"""
+        if not self.quadtree.boundary.contains(Point(new_x, new_y)) or not self._stored(point):
+            return False
+        record = {'op': 'move', 'point': _point_to_record(point), 'to': [new_x, new_y]}
+        if timestamp is not None:
+            record['timestamp'] = timestamp
+        self._log(record)
+        self.quadtree.move(point, new_x, new_y, timestamp)
+        self._applied()
+        return True
+
+    def update_attributes(self, point: Point, attributes: Dict[str, Any]) -> Point:
+        """Reemplaza los atributos de un punto (se registra como remove + insert)"""
+        if not self._stored(point):
+            return point
+        replacement = Point(point.x, point.y, attributes, point.timestamp)
+        self._log({'op': 'remove', 'point': _point_to_record(point)},
+                  {'op': 'insert', 'point': _point_to_record(replacement)})
+        self.quadtree.remove(point)
+        self.quadtree.insert(replacement)
+        self._applied(2)
+        return replacement
+
+    # upsert y sync pasan por insert/move/update_attributes de esta clase,
+    # así que cada cambio queda registrado
+    upsert = QuadTree.upsert
+    sync = QuadTree.sync
+
+    def expire(self, older_than: float, max_points: Optional[int] = None) -> int:
+        """Expira puntos antiguos registrando cada eliminación"""
+        removed = sum(1 for point in self.quadtree._expired_points(older_than, max_points)
+                      if self.remove(point))
+        self.quadtree.root.tighten_time_bounds(older_than)
+        return removed
+
+    def checkpoint(self):
+        """Escribe una instantánea compactada y vacía el registro"""
+        save_snapshot(self.quadtree, os.path.join(self.directory, SNAPSHOT_FILE), self.seq)
+        self.log.truncate()
+        self._since_snapshot = 0
+
+    def close(self):
+        """Cierra el registro (las operaciones ya están escritas)"""
+        self.log.close()
+
+    def __getattr__(self, name):
+        # Consultas (query_range, nearest_neighbor, ...) se delegan al árbol
+        if name == 'quadtree':
+            raise AttributeError(name)
+        return getattr(self.quadtree, name)